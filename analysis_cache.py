@@ -0,0 +1,120 @@
+"""Content-hash index used to reuse completed analyses for identical uploads."""
+
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app import db
+from models import Analysis, AnalysisCacheEntry
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# Analysis fields copied from a cached analysis; they are stored already PII-restored.
+RESULT_FIELDS = (
+    "contract_type",
+    "key_terms",
+    "risks",
+    "summary",
+    "summary_detailed_en",
+    "summary_normal_en",
+    "summary_short_en",
+    "summary_detailed_hu",
+    "summary_normal_hu",
+    "summary_short_hu",
+    "legal_references",
+    "legal_reference_issues",
+)
+
+
+def is_analysis_cache_enabled() -> bool:
+    flag = (os.environ.get("ANALYSIS_CACHE_ENABLED", "true") or "true").strip().lower()
+    return flag in _TRUTHY and get_analysis_cache_ttl() > timedelta(0)
+
+
+def get_analysis_cache_ttl() -> timedelta:
+    return timedelta(hours=float(os.environ.get("ANALYSIS_CACHE_TTL_HOURS", "720")))
+
+
+def compute_file_sha256(file_path: str) -> Optional[str]:
+    """Hash the uploaded file in chunks; returns ``None`` if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except OSError as exc:
+        logging.warning("Unable to hash upload %s: %s", file_path, exc)
+        return None
+    return digest.hexdigest()
+
+
+def compute_text_sha256(text: str) -> str:
+    """Hash extracted text with whitespace collapsed so re-OCR jitter in spacing still matches."""
+    normalized = " ".join((text or "").split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def find_reusable_analysis(
+    user,
+    pipeline_version: str,
+    *,
+    pii_sanitized: bool,
+    file_sha256: Optional[str] = None,
+    text_sha256: Optional[str] = None,
+) -> Optional[Analysis]:
+    """Return the newest completed analysis with a matching fingerprint visible to ``user``."""
+    if not is_analysis_cache_enabled() or not (file_sha256 or text_sha256):
+        return None
+
+    query = AnalysisCacheEntry.query.filter(
+        AnalysisCacheEntry.pipeline_version == pipeline_version,
+        AnalysisCacheEntry.pii_sanitized == bool(pii_sanitized),
+        AnalysisCacheEntry.created_at >= datetime.utcnow() - get_analysis_cache_ttl(),
+    )
+    if file_sha256:
+        query = query.filter(AnalysisCacheEntry.file_sha256 == file_sha256)
+    else:
+        query = query.filter(AnalysisCacheEntry.text_sha256 == text_sha256)
+
+    scope = (os.environ.get("ANALYSIS_CACHE_SCOPE") or "user").strip().lower()
+    if scope == "company" and user.company_id:
+        query = query.filter(AnalysisCacheEntry.company_id == user.company_id)
+    elif scope != "global":
+        query = query.filter(AnalysisCacheEntry.user_id == user.id)
+
+    for entry in query.order_by(AnalysisCacheEntry.created_at.desc()).limit(5):
+        if entry.analysis and entry.analysis.status == "completed":
+            return entry.analysis
+    return None
+
+
+def build_cached_result(source: Analysis) -> dict:
+    """Decrypt a cached analysis into the same shape ``analyze_document`` returns."""
+    result = {field: source._resolve_field(field) for field in RESULT_FIELDS}
+    result["detected_language"] = source.detected_language or ""
+    return result
+
+
+def record_analysis_fingerprint(
+    analysis: Analysis,
+    user,
+    pipeline_version: str,
+    *,
+    pii_sanitized: bool,
+    file_sha256: Optional[str],
+    text_sha256: str,
+) -> AnalysisCacheEntry:
+    """Add (without committing) the index entry for a freshly completed analysis."""
+    entry = AnalysisCacheEntry(
+        analysis_id=analysis.id,
+        user_id=user.id,
+        company_id=user.company_id,
+        file_sha256=file_sha256,
+        text_sha256=text_sha256,
+        pipeline_version=pipeline_version,
+        pii_sanitized=bool(pii_sanitized),
+    )
+    db.session.add(entry)
+    return entry
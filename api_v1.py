@@ -8,6 +8,8 @@ from werkzeug.utils import secure_filename
 
 from app import app, db
 from models import AccessRequest, Analysis, Company, Document, User
+from ocr_cache import get_ocr_cache
+from ocr_health import provider_health_snapshot, reset_circuit_breakers
 from utils import allowed_file, get_file_type
 
 api_v1 = Blueprint("api_v1", __name__, url_prefix="/api/v1")
@@ -254,6 +256,8 @@ def analysis_status(item_id):
             "analysisId": analysis.id,
             "status": _analysis_status_for_ui(analysis),
             "rawStatus": analysis.status,
+            "pagesDone": analysis.pages_done,
+            "pagesTotal": analysis.pages_total,
             "error": analysis.error_message,
         }
     )
@@ -312,6 +316,68 @@ def admin_companies():
     )
 
 
+@api_v1.route("/admin/ocr-providers", methods=["GET"])
+def admin_ocr_providers():
+    if not _is_authenticated():
+        return _unauthorized_response()
+    if not current_user.is_admin:
+        return _forbidden_response()
+
+    cache = get_ocr_cache()
+    return jsonify(
+        {
+            "providers": [
+                {
+                    "provider": health["provider"],
+                    "state": health["state"],
+                    "calls": health["calls"],
+                    "failureRate": health["failure_rate"],
+                    "p50Ms": health["p50_ms"],
+                    "p95Ms": health["p95_ms"],
+                    "openedAt": datetime.utcfromtimestamp(health["opened_at"]).isoformat()
+                    if health["opened_at"]
+                    else None,
+                    "timesOpened": health["times_opened"],
+                    "rejectedCalls": health["rejected_calls"],
+                    "lastError": health["last_error"],
+                }
+                for health in provider_health_snapshot()
+            ],
+            "ocrCache": cache.stats() if cache else None,
+        }
+    )
+
+
+@api_v1.route("/admin/ocr-providers/reset", methods=["POST"])
+def admin_reset_ocr_providers():
+    if not _is_authenticated():
+        return _unauthorized_response()
+    if not current_user.is_admin:
+        return _forbidden_response()
+
+    from ocr_processor import reset_google_vision_configuration
+
+    payload = request.get_json(silent=True) or {}
+    provider = payload.get("provider")
+    reset_circuit_breakers(provider)
+    if provider in (None, "google_vision"):
+        # Otherwise a configuration fixed after startup keeps reopening the circuit.
+        reset_google_vision_configuration()
+    return jsonify({"providers": [health["provider"] for health in provider_health_snapshot()]})
+
+
+@api_v1.route("/admin/analyses/resume", methods=["POST"])
+def admin_resume_stalled_analyses():
+    if not _is_authenticated():
+        return _unauthorized_response()
+    if not current_user.is_admin:
+        return _forbidden_response()
+
+    from routes import resume_stalled_documents
+
+    return jsonify({"resumedDocumentIds": resume_stalled_documents()})
+
+
 @api_v1.route("/companies/<int:company_id>/members", methods=["GET"])
 def company_members(company_id):
     if not _is_authenticated():
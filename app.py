@@ -234,6 +234,9 @@ with app.app_context():
         "encrypted_summary_short_hu": {"default": "TEXT"},
         "encrypted_legal_references": {"default": "TEXT"},
         "encrypted_legal_reference_issues": {"default": "TEXT"},
+        "pages_done": {"default": "INTEGER"},
+        "pages_total": {"default": "INTEGER"},
+        "progress_at": {"sqlite": "DATETIME", "default": "TIMESTAMP"},
     }
 
     missing_analysis_columns = [
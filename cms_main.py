@@ -1,8 +1,11 @@
 import re
 import time
+import json
+import hashlib
+import logging
 import openai
 import sys
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 
 from cms_variables import (
@@ -30,421 +33,529 @@ from cms_variables import (
     m43_prompt,
     m50_prompt,
     get_model_for_stage,
+    DEFAULT_MODEL_MAP,
 )
+from llm_client import run_llm, submit_llm
+from llm_rate_limit import create_chat_completion
+from document_chunks import chunk_document, chunks_for_reference, get_chunk_max_tokens
+from stage_graph import Stage, run_stage_graph
 
 doc_lang = ""
 openai.api_key = openai_api_key
 
+_BASE_METADATA = {"docs": "sample_munkasz", "code": "batch_m2_p", "model": "4.1 - latest"}
+
+# Bump when analyze_document changes in a way that should invalidate cached analyses.
+PIPELINE_REVISION = "2"
+
+
+def get_pipeline_fingerprint() -> str:
+    """Hash the prompts, guides and stage models so cached analyses expire when any change."""
+    prompts = [
+        m10_prompt, m11_prompt, m12_prompt, m13_prompt,
+        m21_prompt, m22_prompt, m23_prompt, m24_prompt, m25_prompt,
+        m26_prompt, m27_prompt, m28_prompt,
+        m30_prompt, m31_prompt, m32_prompt,
+        m40_prompt, m41_prompt, m42_prompt, m43_prompt, m50_prompt,
+    ]
+    payload = {
+        "revision": PIPELINE_REVISION,
+        "prompts": prompts,
+        "contract_types": contract_types,
+        "guides": guides,
+        "models": {stage: get_model_for_stage(stage) for stage in DEFAULT_MODEL_MAP},
+        "chunk_max_tokens": get_chunk_max_tokens(),
+    }
+    if get_prompt_layout() != "prompt_first":
+        payload["layout"] = [get_prompt_layout(), DOCUMENT_PREFIX_PROMPT]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Shared opening of every document-bearing request in the document_first layout.
+DOCUMENT_PREFIX_PROMPT = (
+    "You are one step of a multi-step contract analysis. The contract follows; "
+    "the instructions for this step come after it."
+)
+
+
+def get_prompt_layout() -> str:
+    """``prompt_first`` (default) or ``document_first``, from ``CMS_PROMPT_LAYOUT``."""
+    layout = (os.environ.get("CMS_PROMPT_LAYOUT") or "prompt_first").strip().lower()
+    return layout if layout in ("prompt_first", "document_first") else "prompt_first"
+
+
+def stage_messages(system_prompt: str, user_content: str):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def document_messages(system_prompt: str, document_text: str, user_content: str, details: str = None):
+    """
+    Messages for a stage that reads the whole document.
+
+    ``prompt_first`` sends the stage prompt and then ``user_content``, which embeds the
+    document. ``document_first`` opens every such request with the same preamble and
+    ``Document: ...`` message, followed by the stage prompt and the stage-specific
+    ``details``, so from the second call on the provider serves the document from its
+    prompt cache.
+    """
+    if get_prompt_layout() == "prompt_first":
+        return stage_messages(system_prompt, user_content)
+    messages = [
+        {"role": "system", "content": DOCUMENT_PREFIX_PROMPT},
+        {"role": "user", "content": f"Document: {document_text}"},
+        {"role": "system", "content": system_prompt},
+    ]
+    if details:
+        messages.append({"role": "user", "content": details})
+    return messages
+
+
+def edge_words(document_text: str, count: int = 15):
+    """Return the first and last ``count`` words that m10 uses for language detection."""
+    words = document_text.split()
+    return words[:count], words[-count:]
+
+
+def stage_priority(stage: str) -> int:
+    """Queue priority of a stage's OpenAI calls: later stages first, so started documents finish."""
+    return -int(stage.lstrip("m"))
+
+
+async def run_language_detection_async(
+    first_words, last_words, *, api_key: str = None, store_conversation: bool = True
+) -> str:
+    """m10: detect the document language from its first and last words."""
+    m10_user = f"""
+    First 15 Words: {" ".join(first_words)}
+    
+    Last 15 Words: {" ".join(last_words)}
+    """
+    should_store = bool(store_conversation)
+    response_m10 = await create_chat_completion(
+        priority=stage_priority("m10"),
+        model=get_model_for_stage("m10"),
+        messages=stage_messages(m10_prompt, m10_user),
+        **({"metadata": {**_BASE_METADATA, "m": "10"}} if should_store else {}),        seed=63,
+        **({"store": True} if should_store else {}),
+        **({"api_key": api_key} if api_key else {}),
+    )
+    return response_m10['choices'][0]['message']['content'].strip()
+
+
+def run_language_detection(first_words, last_words, *, store_conversation: bool = True) -> str:
+    return run_llm(
+        run_language_detection_async(first_words, last_words, store_conversation=store_conversation)
+    )
+
+
+def start_language_detection(first_words, last_words, api_key: str, *, store_conversation: bool = True):
+    """
+    Start m10 in the background while the rest of the document is still being extracted.
 
-def analyze_document(document_text: str, api_key: str, *, store_conversation: bool = True):
-    """Run the multi-step contract analysis"""
+    Returns a future of ``(language, duration)`` that ``analyze_document`` accepts as
+    ``language_detection``; the words must match the final text's first and last words.
+    """
+    openai.api_key = api_key
+
+    async def run():
+        started = time.time()
+        language = await run_language_detection_async(
+            first_words, last_words, api_key=api_key, store_conversation=store_conversation
+        )
+        return language, time.time() - started
+
+    return submit_llm(run())
+
+
+# Declarative dependency graph of the analysis: each stage lists the stages whose
+# outputs it consumes, and the scheduler starts it as soon as those are done.
+ANALYSIS_STAGE_INPUTS = {
+    "m10": (),
+    "m11": (),
+    "m12": ("m11",),
+    "m13": (),
+    "m21": ("m12",),
+    "m22": ("m12",),
+    "m23": ("m12",),
+    "m24": ("m12",),
+    "m25": ("m12",),
+    "m26": ("m13",),
+    "m27": ("m26",),
+    "m28": ("m21", "m22", "m23", "m24", "m25"),
+    "m30": ("m28", "m27"),
+    "m31": ("m30",),
+    "m32": ("m30",),
+    "m41": ("m30",),
+    "m42": ("m31",),
+    "m43": ("m32",),
+    "m50": ("m10", "m30"),
+}
+
+
+def analyze_document(
+    document_text: str,
+    api_key: str,
+    *,
+    store_conversation: bool = True,
+    language_detection=None,
+):
+    """Run the multi-step contract analysis on the shared LLM event loop"""
+    return run_llm(
+        analyze_document_async(
+            document_text,
+            api_key,
+            store_conversation=store_conversation,
+            language_detection=language_detection,
+        )
+    )
+
+
+async def analyze_document_async(
+    document_text: str,
+    api_key: str,
+    *,
+    store_conversation: bool = True,
+    language_detection=None,
+):
+    """Run the multi-step contract analysis along ``ANALYSIS_STAGE_INPUTS``"""
     global doc_lang
     openai.api_key = api_key
 
-    contract_type_no = 99
-    contract_type = ""
     h = "Here is a specific guide for evaluating this contract: "
     request_times = []
     start_time = time.time()
 
-    base_metadata = {"docs": "sample_munkasz", "code": "batch_m2_p", "model": "4.1 - latest"}
+    base_metadata = _BASE_METADATA
 
     def log_request_time(stage: str, duration: float) -> None:
         request_times.append({"stage": stage, "duration": duration})
         print(f"[Timing] Stage {stage} completed in {duration:.2f}s")
-    
-    # M10 first and last words, lang variables set
-    first_15_words = " ".join(document_text.split()[:15])
-    last_15_words = " ".join(document_text.split()[-15:])
+
+    # Prompt, cached and completion tokens per stage, summed over its calls
+    token_usage = {}
+
+    def record_token_usage(stage: str, response) -> None:
+        usage = response.get("usage") or {}
+        details = usage.get("prompt_tokens_details") or {}
+        totals = token_usage.setdefault(
+            stage, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        )
+        totals["calls"] += 1
+        totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        totals["cached_tokens"] += details.get("cached_tokens") or 0
+        totals["completion_tokens"] += usage.get("completion_tokens") or 0
+
     doc_lang = ""
-    m10_user = f"""
-    First 15 Words: {first_15_words}
-    
-    Last 15 Words: {last_15_words}
-    """
-    m12_user = f"""Document: {document_text}"""
-    
-    m2x_prompts = [m21_prompt, m22_prompt, m23_prompt, m24_prompt, m25_prompt]
-    
-    # M10 model execution
-    start_request = time.time()
     should_store = bool(store_conversation)
     store_option = {"store": True} if should_store else {}
 
-    response_m10 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m10"),
-        messages=[
-            {"role": "system", "content": m10_prompt},
-            {"role": "user", "content": m10_user}
-        ],
-        **({"metadata": {**base_metadata, "m": "10"}} if should_store else {}),        seed=63,
-        **store_option
-    )
-    log_request_time("m10", time.time() - start_request)
-    output_m10 = response_m10['choices'][0]['message']['content']
-    elapsed_time = time.time() - start_request
-    doc_lang = output_m10.strip()
-    #print("m10 - Detected Document Language:\n", output_m10)
-    #print(f"m10 - Done ({elapsed_time:.2f} seconds)")
-    #print("\n\n")
-    
-    # M11 model execution
-    m11_user = f"""Document: {document_text}"""
-    
-    start_request = time.time()
-    response_m11 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m11"),
-        messages=[
-            {"role": "system", "content": m11_prompt},
-            {"role": "user", "content": m11_user}
-        ],
-        **({"metadata": {**base_metadata, "m": "11"}} if should_store else {}),        **store_option
-    )
-    log_request_time("m11", time.time() - start_request)
-    output_m11 = response_m11['choices'][0]['message']['content']
-    elapsed_time = time.time() - start_request
-    
-    # Adjust contract type indexing (m11 might return 0-indexed values)
-    contract_type_value = output_m11.strip()
-    if not re.fullmatch(r"[0-5]", contract_type_value):
-        contract_type_no = 5
-    else:
-        contract_type_no = int(contract_type_value)
-
-    if not 0 <= contract_type_no < len(contract_types):
-        contract_type_no = 5
-
-    contract_type = contract_types[contract_type_no]
-    
-    #print("m11 - Recognized Contract Type Number:\n", contract_type_no)
-    #print("m11 - Recognized Contract Type:\n", contract_type)
-    
-    # M12 model execution
-    start_request = time.time()
-    response_m12 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m12"),
-        messages=[
-            {"role": "system", "content": f"{m12_prompt}\n{h}{guides[contract_type][0]}"},
-            {"role": "user", "content": m12_user}
-        ],
-        seed=63,
-        **({"metadata": {**base_metadata, "m": "12"}} if should_store else {}),        **store_option
-    )
-    log_request_time("m12", time.time() - start_request)
-    output_m12 = response_m12['choices'][0]['message']['content']
-    elapsed_time = time.time() - start_request
-    #print(f"m12 - Done ({elapsed_time:.2f} seconds)")
-    #print(output_m12)
-    #print("\n\n")
-    #print("\n\n")
-    
-    # m13 model execution
-    m13_user = f"""Document: {document_text}"""
-    
-    start_request = time.time()
-    response_m13 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m13"),
-        messages=[
-            {"role": "system", "content": m13_prompt},
-            {"role": "user", "content": m13_user}
-        ],
-        seed=63,
-        **({"metadata": {**base_metadata, "m": "13"}} if should_store else {}),        **store_option
+    # Section-aligned chunks of at most CMS_CHUNK_MAX_TOKENS tokens; contracts that
+    # fit are a single chunk and every stage sees the whole document as before.
+    chunks = await asyncio.to_thread(
+        chunk_document, document_text, get_chunk_max_tokens(), get_model_for_stage("m12")
     )
-    log_request_time("m13", time.time() - start_request)
-    elapsed_time = time.time() - start_request
-    
-    output_m13 = response_m13['choices'][0]['message']['content'].strip()
-    #print(f"M13 - Extracted Legal References:\n{output_m13}")
-    #print(f"M13 - Done ({elapsed_time:.2f} seconds)\n")
-    
-    # Parse M13 output into a list of legal references
-    legal_references = [ref.strip() for ref in output_m13.splitlines() if ref.strip()]
-    
-    # Print the list of legal references
-    #print("\n--- Legal References List ---")
-    for idx, ref in enumerate(legal_references, start=1):
-        pass
-        #print(f"{idx}: {ref}")
-    
-    
-    # M2x models - paralell execution - data
-    def call_m2x_api(prompt, idx):
-        m2x_user = f"""
-    Extracted lines: {output_m12}
+    if len(chunks) > 1:
+        logging.info("Document split into %s chunks", len(chunks))
 
-    Full document: {document_text}
-    """
+    async def complete(stage: str, messages, *, seed=True, metadata_m=None) -> str:
+        """One timed chat completion for ``stage``."""
         start_request = time.time()
-        stage = f"m2{idx + 1}"
-        response_m2x = openai.ChatCompletion.create(
+        response = await create_chat_completion(
+            priority=stage_priority(stage),
             model=get_model_for_stage(stage),
-            messages=[
-                {"role": "system", "content": f"{prompt}"},
-                {"role": "user", "content": m2x_user}
-            ],
-            seed=63,
-        **({"metadata": {**base_metadata, "m": f"2{idx + 1}"}} if should_store else {}),            **store_option
+            messages=messages,
+            **({"seed": 63} if seed else {}),
+            **({"metadata": {**base_metadata, "m": metadata_m or stage.replace("m", "")}} if should_store else {}),
+            **store_option,
+            api_key=api_key,
         )
-        elapsed_time = time.time() - start_request
-        log_request_time(stage, elapsed_time)
-        output_m2x = response_m2x['choices'][0]['message']['content']
-        #print(f"m2{idx + 1} - Done ({elapsed_time:.2f} seconds)")
-        #print(output_m2x)
-        #print("\n\n")
-        return output_m2x
-    
-    
-    # Running M2x requests in parallel
-    m2x_outputs = []
-    start_request = time.time()
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = [executor.submit(call_m2x_api, prompt, idx) for idx, prompt in enumerate(m2x_prompts)]
-        results = [future.result() for future in futures]
-    # Collect results and timing
-    for output in results:
-        m2x_outputs.append(output)
-
-    total_m2x_time = time.time() - start_request
-    log_request_time("m2x_batch", total_m2x_time)
-    #print(f"Total time for all M2x requests: {total_m2x_time:.2f} seconds")
-    m28_user = f"""Analizations: {' | '.join(m2x_outputs)}"""
-    
-    # m26 model pre
-    legal_references = []
-    for line in output_m13.splitlines():
-        # Remove existing numbering if present (e.g., "1. 2001. évi CII. tv.")
-        cleaned_line = line.strip()
-        if cleaned_line:
-            cleaned_line = cleaned_line.split(". ", 1)[-1]  # Remove leading "1. ", "2. ", etc.
-            legal_references.append(cleaned_line)
-    
-    
-    # M26 Function
-    def process_m26_reference(ref, retries=3):
+        log_request_time(stage, time.time() - start_request)
+        record_token_usage(stage, response)
+        return response['choices'][0]['message']['content']
+
+    # M10 - its output is only needed by m50; the caller may already have started it
+    # while pages were still being extracted
+    async def run_m10():
+        if language_detection is None:
+            first_15_words, last_15_words = edge_words(document_text)
+            started = time.time()
+            language = await run_language_detection_async(
+                first_15_words, last_15_words, api_key=api_key, store_conversation=should_store
+            )
+            duration = time.time() - started
+        else:
+            language, duration = await asyncio.wrap_future(language_detection)
+        log_request_time("m10", duration)
+        return language
+
+    # M11 - contract type
+    # The opening chunk (parties, subject, title) is enough to classify the contract.
+    async def run_m11():
+        opening = chunks[0]
+        output_m11 = await complete(
+            "m11", document_messages(m11_prompt, opening, f"""Document: {opening}"""), seed=False
+        )
+        # Adjust contract type indexing (m11 might return 0-indexed values)
+        contract_type_value = output_m11.strip()
+        if not re.fullmatch(r"[0-5]", contract_type_value):
+            contract_type_no = 5
+        else:
+            contract_type_no = int(contract_type_value)
+        if not 0 <= contract_type_no < len(contract_types):
+            contract_type_no = 5
+        return contract_types[contract_type_no]
+
+    # M12 - extracted lines of every chunk, using the guide of the recognized contract type
+    async def run_m12(m11):
+        system_prompt = f"{m12_prompt}\n{h}{guides[m11][0]}"
+        return list(await asyncio.gather(*(
+            complete("m12", document_messages(system_prompt, chunk, f"""Document: {chunk}"""))
+            for chunk in chunks
+        )))
+
+    # M13 - legal references, one per line, collected from every chunk
+    async def run_m13():
+        outputs_m13 = await asyncio.gather(*(
+            complete("m13", document_messages(m13_prompt, chunk, f"""Document: {chunk}"""))
+            for chunk in chunks
+        ))
+        legal_references = []
+        seen = set()
+        for output_m13 in outputs_m13:
+            chunk_references = []
+            for line in output_m13.strip().splitlines():
+                # Remove existing numbering if present (e.g., "1. 2001. évi CII. tv.")
+                cleaned_line = line.strip()
+                if cleaned_line:
+                    cleaned_line = cleaned_line.split(". ", 1)[-1]  # Remove leading "1. ", "2. ", etc.
+                    # Neighbouring chunks often cite the same act; one chunk's list is kept as is.
+                    if cleaned_line.lower() not in seen:
+                        chunk_references.append(cleaned_line)
+            seen.update(reference.lower() for reference in chunk_references)
+            legal_references.extend(chunk_references)
+        return legal_references
+
+    # M2x - risk analyses of the extracted lines, each chunk with its own lines
+    def m2x_stage(stage, prompt):
+        async def analyze_chunk(chunk, lines):
+            m2x_user = f"""
+    Extracted lines: {lines}
+
+    Full document: {chunk}
+    """
+            return await complete(
+                stage,
+                document_messages(f"{prompt}", chunk, m2x_user, f"Extracted lines: {lines}"),
+            )
+
+        async def run_m2x(m12):
+            outputs = await asyncio.gather(*(analyze_chunk(chunk, lines) for chunk, lines in zip(chunks, m12)))
+            return "\n\n".join(outputs)
+        return run_m2x
+
+    def reference_context(ref):
+        """
+        The chunks m26/m27 read for one legal reference instead of the whole document.
+
+        Returns the first matching chunk, which ``document_first`` sends as the same
+        document message as m12/m13/m2x, and the text of any further matching chunks.
+        """
+        matching = chunks_for_reference(chunks, ref)
+        return matching[0], "\n\n".join(matching[1:])
+
+    def excerpt_details(excerpt, details):
+        return f"Further excerpt: {excerpt}\n{details}" if excerpt else details
+
+    # M26 - validity check of every legal reference, at most four at a time
+    m26_slots = asyncio.Semaphore(4)
+
+    async def process_m26_reference(ref):
+        prefix, excerpt = reference_context(ref)
+        context = f"{prefix}\n\n{excerpt}" if excerpt else prefix
         m26_user = f"""
-    Full document: {document_text}
+    Full document: {context}
     Legal reference: {ref.strip()}
     """
         cleaned_ref = ref.strip()
-        for attempt in range(retries):
-            try:
-                start_request = time.time()
-                response_m26 = openai.ChatCompletion.create(
+        try:
+            async with m26_slots:
+                response_m26 = await create_chat_completion(
+                    priority=stage_priority("m26"),
                     model=get_model_for_stage("m26"),
-                    messages=[
-                        {"role": "system", "content": f"{m26_prompt}"},
-                        {"role": "user", "content": m26_user}
-                    ],
+                    messages=document_messages(
+                        f"{m26_prompt}",
+                        prefix,
+                        m26_user,
+                        excerpt_details(excerpt, f"Legal reference: {cleaned_ref}"),
+                    ),
                     seed=63,
-        **({"metadata": {**base_metadata, "m": "26"}} if should_store else {}),                    **store_option
+                    **({"metadata": {**base_metadata, "m": "26"}} if should_store else {}),
+                    **store_option,
+                    api_key=api_key,
                 )
-                elapsed_time = time.time() - start_request
-                m26_output = response_m26['choices'][0]['message']['content'].strip()
-                #print(f"M26 - Processed Reference: {cleaned_ref} | Response: {m26_output}")
-                #print(f"M26 - Done ({elapsed_time:.2f} seconds)\n")
-                return (cleaned_ref, m26_output)
-            except openai.error.RateLimitError:
-                wait_time = 2 * (attempt + 1)
-                time.sleep(wait_time)
-        return (cleaned_ref, "RATE LIMIT ERROR")
-
-
-    # Run M26 in parallel, using TPE
-    m26_responses = []
-    if legal_references:
-        start_request = time.time()
-        max_workers = min(4, len(legal_references))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_m26_reference, ref) for ref in legal_references]
-            for future in futures:
-                m26_responses.append(future.result())
-        total_m26_time = time.time() - start_request
-        log_request_time("m26", total_m26_time)
-
-    # Print all M26 results
-    #print("\n--- M26 Results ---")
-    for idx, (ref, response) in enumerate(m26_responses, start=1):
-        #print(f"{idx}. Reference: {ref}")
-        #print(f"   M26 Response: {response}\n")
-        pass
-    
-    # m27 models execution
-
-    # Function to process a single invalid legal reference for M27
-    def process_m27_reference(ref, m26_response, retries=3):
+        except openai.error.RateLimitError:
+            # Retries are exhausted; one unchecked reference should not fail the analysis.
+            return (cleaned_ref, "RATE LIMIT ERROR")
+        record_token_usage("m26", response_m26)
+        m26_output = response_m26['choices'][0]['message']['content'].strip()
+        return (cleaned_ref, m26_output)
+
+    async def run_m26(m13):
+        m26_responses = []
+        if m13:
+            start_request = time.time()
+            m26_responses = await asyncio.gather(*(process_m26_reference(ref) for ref in m13))
+            log_request_time("m26", time.time() - start_request)
+        return list(m26_responses)
+
+    # M27 - suggestions for the references M26 flagged, at most four at a time
+    m27_slots = asyncio.Semaphore(4)
+
+    async def process_m27_reference(ref, m26_response):
+        prefix, excerpt = reference_context(ref)
+        context = f"{prefix}\n\n{excerpt}" if excerpt else prefix
         m27_user = f"""
-    Full document: {document_text}
+    Full document: {context}
     Legal reference: {ref.strip()}
     M26 response: {m26_response.strip()}
     """
-        for attempt in range(retries):
-            try:
-                start_request = time.time()
-                response_m27 = openai.ChatCompletion.create(
+        try:
+            async with m27_slots:
+                response_m27 = await create_chat_completion(
+                    priority=stage_priority("m27"),
                     model=get_model_for_stage("m27"),
-                    messages=[
-                        {"role": "system", "content": f"{m27_prompt}"},
-                        {"role": "user", "content": m27_user}
-                    ],
+                    messages=document_messages(
+                        f"{m27_prompt}",
+                        prefix,
+                        m27_user,
+                        excerpt_details(
+                            excerpt, f"Legal reference: {ref.strip()}\nM26 response: {m26_response.strip()}"
+                        ),
+                    ),
                     seed=63,
-        **({"metadata": {**base_metadata, "m": "27"}} if should_store else {}),                    **store_option
+                    **({"metadata": {**base_metadata, "m": "27"}} if should_store else {}),
+                    **store_option,
+                    api_key=api_key,
                 )
-                elapsed_time = time.time() - start_request
-                m27_output = response_m27['choices'][0]['message']['content'].strip()
-                return (ref.strip(), m26_response.strip(), m27_output)
-            except openai.error.RateLimitError:
-                wait_time = 2 * (attempt + 1)
-                print(f"Rate limit hit. Waiting {wait_time}s before retrying M27 for {ref.strip()}")
-                time.sleep(wait_time)
-        # If all retries fail
-        return (ref.strip(), m26_response.strip(), "RATE LIMIT ERROR")
-    
-    
-    # Filter references where M26 flagged an issue (response != "0")
-    invalid_references = [(ref, response) for ref, response in m26_responses if response != "0"]
-    
-    # Run M27 in parallel, using TPE
-    m27_responses = []
-    if invalid_references:
-        max_workers = min(4, len(invalid_references))
-        stage_start = time.time()
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [
-                executor.submit(process_m27_reference, ref, response)
-                for ref, response in invalid_references
-            ]
-            for future in futures:
-                m27_responses.append(future.result())
-        log_request_time("m27", time.time() - stage_start)
-
-    # Print all M27 results
-    #print("\n--- M27 Suggestions ---")
-    for idx, (ref, m26_response, m27_suggestion) in enumerate(m27_responses, start=1):
-        #print(f"{idx}. Reference: {ref}")
-        #print(f"   M26 Response: {m26_response}")
-        #print(f"   M27 Suggestion: {m27_suggestion}\n")
-        pass
-    # Prepare the M27 suggestions as a formatted string
-    m27_suggestions_summary = "\n".join([
-        f"{idx}. Reference: {ref}\n    Assessment: {m26_response}\n   Suggestion: {m27_suggestion}"
-        for idx, (ref, m26_response, m27_suggestion) in enumerate(m27_responses, start=1)
-    ])
-    
-    # m28 model execution
-    start_request = time.time()
-    response_m28 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m28"),
-        messages=[
-            {"role": "system", "content": f"{m28_prompt}"},
-            {"role": "user", "content": m28_user}
-        ],
-        seed=63,
-        **({"metadata": {**base_metadata, "m": "26"}} if should_store else {}),        **store_option
-    )
-    log_request_time("m28", time.time() - start_request)
-    output_m28 = response_m28['choices'][0]['message']['content']
-    elapsed_time = time.time() - start_request
-    #print(f"m28 - Done ({elapsed_time:.2f} seconds)")
-    #print(output_m28)
-    #print("\n\n")
-    #print("\n\n")
-    
-    # M30 model execution
-    m30_user = f"""
-    Original document: {document_text}
-    Summarized risks: {output_m28}
-    Legal reference suggestions: {m27_suggestions_summary}
+        except openai.error.RateLimitError:
+            # If all retries fail
+            return (ref.strip(), m26_response.strip(), "RATE LIMIT ERROR")
+        record_token_usage("m27", response_m27)
+        m27_output = response_m27['choices'][0]['message']['content'].strip()
+        return (ref.strip(), m26_response.strip(), m27_output)
+
+    async def run_m27(m26):
+        # Only references where M26 flagged an issue (response != "0")
+        invalid_references = [(ref, response) for ref, response in m26 if response != "0"]
+        m27_responses = []
+        if invalid_references:
+            stage_start = time.time()
+            m27_responses = await asyncio.gather(
+                *(process_m27_reference(ref, response) for ref, response in invalid_references)
+            )
+            log_request_time("m27", time.time() - stage_start)
+        # The M27 suggestions as a formatted string
+        return "\n".join([
+            f"{idx}. Reference: {ref}\n    Assessment: {m26_response}\n   Suggestion: {m27_suggestion}"
+            for idx, (ref, m26_response, m27_suggestion) in enumerate(m27_responses, start=1)
+        ])
+
+    # M28 - risk summary of the M2x analyses
+    async def run_m28(m21, m22, m23, m24, m25):
+        m28_user = f"""Analizations: {' | '.join([m21, m22, m23, m24, m25])}"""
+        return await complete("m28", stage_messages(f"{m28_prompt}", m28_user), metadata_m="26")
+
+    # M30 - detailed English summary; long documents are summarized chunk by chunk
+    # first and the partial summaries then stand in for the document
+    async def summarize(text, m28, m27):
+        m30_user = f"""
+    Original document: {text}
+    Summarized risks: {m28}
+    Legal reference suggestions: {m27}
     """
-    start_request = time.time()
-    response_m30 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m30"),
-        messages=[
-            {"role": "system", "content": f"{m30_prompt}"},
-            {"role": "user", "content": m30_user}
-        ],
-        seed=63,
-        **({"metadata": {**base_metadata, "m": "30"}} if should_store else {}),        **store_option
-    )
-    log_request_time("m30", time.time() - start_request)
-    output_m30 = response_m30['choices'][0]['message']['content'].strip()
-    #print("m30:\n", output_m30)
-    #print(f"m30 - Done ({request_times[-1]:.2f} seconds)")
-    #print("\n\n")
-    #print("\n\n")
-
-    # Generate medium and ultra-short summaries (M31 & M32) in parallel
-    def run_followup_summary(stage: str, prompt: str, user_content: str) -> str:
-        start_request = time.time()
-        response = openai.ChatCompletion.create(
-            model=get_model_for_stage(stage),
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": user_content},
-            ],
-            seed=63,
-        **({"metadata": {**base_metadata, "m": stage.replace("m", "")}} if should_store else {}),            **store_option,
-        )
-        log_request_time(stage, time.time() - start_request)
-        return response['choices'][0]['message']['content'].strip()
-
-    condensed_inputs = {
-        "m31": (m31_prompt, f"Detailed summary for follow-up processing:\n\n{output_m30}"),
-        "m32": (m32_prompt, f"Detailed summary for follow-up processing:\n\n{output_m30}"),
+        m30_details = f"Summarized risks: {m28}\nLegal reference suggestions: {m27}"
+        return (
+            await complete("m30", document_messages(f"{m30_prompt}", text, m30_user, m30_details))
+        ).strip()
+
+    async def run_m30(m28, m27):
+        if len(chunks) == 1:
+            return await summarize(document_text, m28, m27)
+        partial_summaries = await asyncio.gather(*(summarize(chunk, m28, m27) for chunk in chunks))
+        return await summarize("\n\n".join(partial_summaries), m28, m27)
+
+    # M31 & M32 - medium and ultra-short summaries
+    async def run_m31(m30):
+        messages = stage_messages(m31_prompt, f"Detailed summary for follow-up processing:\n\n{m30}")
+        return (await complete("m31", messages)).strip()
+
+    async def run_m32(m30):
+        messages = stage_messages(m32_prompt, f"Detailed summary for follow-up processing:\n\n{m30}")
+        return (await complete("m32", messages)).strip()
+
+    # M41-M43 - Hungarian translations
+    async def run_m41(m30):
+        messages = stage_messages(m41_prompt, f"English detailed summary:\n\n{m30}")
+        return (await complete("m41", messages)).strip()
+
+    async def run_m42(m31):
+        messages = stage_messages(m42_prompt, f"English normal summary:\n\n{m31}")
+        return (await complete("m42", messages)).strip()
+
+    async def run_m43(m32):
+        messages = stage_messages(m43_prompt, f"English ultra-short summary:\n\n{m32}")
+        return (await complete("m43", messages)).strip()
+
+    # M50 - summary in the document language (kept for compatibility)
+    async def run_m50(m10, m30):
+        m50_user = f"""
+    Translated Output Language: {m10}
+    Text needing translation: {m30}
+    """
+        return await complete("m50", stage_messages(f"{m50_prompt}", m50_user))
+
+    runners = {
+        "m10": run_m10,
+        "m11": run_m11,
+        "m12": run_m12,
+        "m13": run_m13,
+        "m21": m2x_stage("m21", m21_prompt),
+        "m22": m2x_stage("m22", m22_prompt),
+        "m23": m2x_stage("m23", m23_prompt),
+        "m24": m2x_stage("m24", m24_prompt),
+        "m25": m2x_stage("m25", m25_prompt),
+        "m26": run_m26,
+        "m27": run_m27,
+        "m28": run_m28,
+        "m30": run_m30,
+        "m31": run_m31,
+        "m32": run_m32,
+        "m41": run_m41,
+        "m42": run_m42,
+        "m43": run_m43,
+        "m50": run_m50,
     }
+    outputs = await run_stage_graph(
+        Stage(stage, runners[stage], inputs) for stage, inputs in ANALYSIS_STAGE_INPUTS.items()
+    )
 
-    condensed_outputs = {}
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = {
-            stage: executor.submit(run_followup_summary, stage, prompt, user)
-            for stage, (prompt, user) in condensed_inputs.items()
-        }
-        for stage, future in futures.items():
-            condensed_outputs[stage] = future.result()
-
-    output_m31 = condensed_outputs.get("m31", "").strip()
-    output_m32 = condensed_outputs.get("m32", "").strip()
+    contract_type = outputs["m11"]
+    doc_lang = outputs["m10"]
+    output_m30 = outputs["m30"]
+    output_m50 = outputs["m50"]
 
     summaries_en = {
         "detailed": output_m30,
-        "normal": output_m31,
-        "short": output_m32,
+        "normal": outputs["m31"],
+        "short": outputs["m32"],
     }
-
-    # Prepare Hungarian translations (M41-M43) in parallel
-    def run_translation(stage: str, prompt: str, content: str) -> str:
-        start_request = time.time()
-        response = openai.ChatCompletion.create(
-            model=get_model_for_stage(stage),
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": content},
-            ],
-            seed=63,
-        **({"metadata": {**base_metadata, "m": stage.replace("m", "")}} if should_store else {}),            **store_option,
-        )
-        log_request_time(stage, time.time() - start_request)
-        return response['choices'][0]['message']['content'].strip()
-
-    translation_inputs = {
-        "m41": (m41_prompt, f"English detailed summary:\n\n{output_m30}"),
-        "m42": (m42_prompt, f"English normal summary:\n\n{output_m31}"),
-        "m43": (m43_prompt, f"English ultra-short summary:\n\n{output_m32}"),
-    }
-
-    translation_outputs = {}
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = {
-            stage: executor.submit(run_translation, stage, prompt, user)
-            for stage, (prompt, user) in translation_inputs.items()
-        }
-        for stage, future in futures.items():
-            translation_outputs[stage] = future.result()
-
     summaries_hu = {
-        "detailed": translation_outputs.get("m41", "").strip(),
-        "normal": translation_outputs.get("m42", "").strip(),
-        "short": translation_outputs.get("m43", "").strip(),
+        "detailed": outputs["m41"],
+        "normal": outputs["m42"],
+        "short": outputs["m43"],
     }
 
     output_m40 = "0"
@@ -456,21 +567,15 @@ def analyze_document(document_text: str, api_key: str, *, store_conversation: bo
         The summary needing review: {output}
         """
         start_request = time.time()
-        response_m40 = openai.ChatCompletion.create(
+        response_m40 = await create_chat_completion(
+            priority=stage_priority("m40"),
             model=get_model_for_stage("m40"),
-            messages=[
-                {"role": "system", "content": f"{m40_prompt}"},
-                {"role": "user", "content": m40_user}
-            ],
+            messages=stage_messages(f"{m40_prompt}", m40_user),
             seed=63,
         **({"metadata": {**base_metadata, "m": "40"}} if should_store else {}),            **store_option
         )
         log_request_time("m40", time.time() - start_request)
         output_m40 = response_m40['choices'][0]['message']['content']
-        elapsed_time = time.time() - start_request
-        #print(f"m40 - Done ({elapsed_time:.2f} seconds)")
-    #print("\n\n")
-    #print("\n\n")
     
     if output_m40 == "0":
         #print("m40 gave back 0")
@@ -479,34 +584,15 @@ def analyze_document(document_text: str, api_key: str, *, store_conversation: bo
         #print("so sorry, m40 failsafe activated, dont yet know how to proceed")
         #print("m40 gave back: ", output_m40, "process terminated")
         sys.exit(40)
-      
-    
-    # M50 model execution (kept for compatibility)
-    m50_user = f"""
-    Translated Output Language: {doc_lang}
-    Text needing translation: {output_m30}
-    """
 
-    start_request = time.time()
-    response_m50 = openai.ChatCompletion.create(
-        model=get_model_for_stage("m50"),
-        messages=[
-            {"role": "system", "content": f"{m50_prompt}"},
-            {"role": "user", "content": m50_user}
-        ],
-        seed=63,
-        **({"metadata": {**base_metadata, "m": "50"}} if should_store else {}),        **store_option
+    prompt_tokens = sum(usage["prompt_tokens"] for usage in token_usage.values())
+    cached_tokens = sum(usage["cached_tokens"] for usage in token_usage.values())
+    logging.info(
+        "Analysis used %s prompt tokens, %s served from the prompt cache (%s layout)",
+        prompt_tokens,
+        cached_tokens,
+        get_prompt_layout(),
     )
-    log_request_time("m50", time.time() - start_request)
-    output_m50 = response_m50['choices'][0]['message']['content']
-    elapsed_time = time.time() - start_request
-    #print("m50:\n", output_m50)
-    #print(f"m50 - Done ({elapsed_time:.2f} seconds)")
-    #print("\n\n")
-
-    # final output to user
-    # print(ouput_m50)
-
 
     # Final runtime and total API request time
     end_time = time.time()
@@ -516,8 +602,6 @@ def analyze_document(document_text: str, api_key: str, *, store_conversation: bo
         for entry in request_times
         if not entry["stage"].endswith("_batch")
     )
-    #print(f"Total runtime: {total_runtime:.2f} seconds")
-    #print(f"Total API request time: {total_api_time:.2f} seconds")
 
     return {
         "contract_type": contract_type,
@@ -537,4 +621,6 @@ def analyze_document(document_text: str, api_key: str, *, store_conversation: bo
         "elapsed_time": total_runtime,
         "api_request_time": total_api_time,
         "per_stage_request_times": request_times,
+        "per_stage_token_usage": token_usage,
+        "document_chunks": len(chunks),
     }
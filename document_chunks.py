@@ -0,0 +1,116 @@
+"""Token-aware splitting of contracts along their section boundaries."""
+
+import os
+import re
+from typing import List, Optional
+
+from llm_rate_limit import count_tokens
+
+# Lines that open a new section: numbered clauses (1. / 4.2.), paragraphs (12. §, § 12),
+# Roman-numbered parts (IV.), "3. cikk" / "2. fejezet", Article/Section/Melléklet
+# headings and all-caps titles.
+_SECTION_HEADING = re.compile(
+    r"^[ \t]*(?:"
+    r"\d+\.(?:\d+\.?)*[ \t]+\S"
+    r"|\d+\.?[ \t]*§"
+    r"|§[ \t]*\d+"
+    r"|[IVXLC]+\.[ \t]+\S"
+    r"|\d+\.[ \t]*(?i:cikk|fejezet|pont|szakasz)\b"
+    r"|(?i:article|section|chapter|clause|schedule|annex|appendix|melléklet|függelék)[ \t]+[\dIVXLC]+"
+    r"|[A-ZÁÉÍÓÖŐÚÜŰ][A-ZÁÉÍÓÖŐÚÜŰ \t\-]{3,}$"
+    r")",
+    re.MULTILINE,
+)
+
+# Finer cut points for sections that are too long on their own: paragraphs, lines,
+# sentences, words. All are zero-width, so the pieces join back into the exact text.
+_FINER_SPLITS = (
+    re.compile(r"(?<=\n\n)"),
+    re.compile(r"(?<=\n)"),
+    re.compile(r"(?<=[.!?;:] )"),
+    re.compile(r"(?<= )"),
+)
+
+# Distinctive parts of a legal reference: years and paragraph numbers ("2012.", "45.",
+# "6:1"), Roman numerals ("I.") and abbreviated act names ("Mt.", "Ptk.").
+_REFERENCE_KEY = re.compile(r"\d+(?:[:/]\d+)*\.?|\b[IVXLC]+\.|\b[A-ZÁÉÍÓÖŐÚÜŰ][a-záéíóöőúüű]{0,5}\.")
+
+
+def get_chunk_max_tokens() -> int:
+    """Largest chunk sent in one prompt, from ``CMS_CHUNK_MAX_TOKENS`` (``0`` disables chunking)."""
+    return int(os.environ.get("CMS_CHUNK_MAX_TOKENS", "8000"))
+
+
+def split_sections(text: str) -> List[str]:
+    """Cut ``text`` in front of every section heading; the parts join back into ``text``."""
+    starts = [match.start() for match in _SECTION_HEADING.finditer(text) if match.start() > 0]
+    bounds = [0] + starts + [len(text)]
+    return [text[begin:end] for begin, end in zip(bounds, bounds[1:]) if end > begin]
+
+
+def _fitting_pieces(text: str, max_tokens: int, model: Optional[str], level: int = 0):
+    """Yield ``(piece, tokens)`` no longer than ``max_tokens`` unless a single word is."""
+    tokens = count_tokens(text, model)
+    if tokens <= max_tokens or level >= len(_FINER_SPLITS):
+        yield text, tokens
+        return
+    for part in _FINER_SPLITS[level].split(text):
+        if part:
+            yield from _fitting_pieces(part, max_tokens, model, level + 1)
+
+
+def chunk_document(text: str, max_tokens: int = None, model: Optional[str] = None) -> List[str]:
+    """
+    Split ``text`` into chunks of at most ``max_tokens`` tokens.
+
+    Whole sections are packed together as long as they fit; a section that is too long
+    by itself is cut at paragraph, then line, sentence and word boundaries. Documents
+    that fit, and every document when ``max_tokens`` is ``0``, come back as one chunk.
+    ``''.join(chunks) == text`` always holds.
+    """
+    max_tokens = get_chunk_max_tokens() if max_tokens is None else max_tokens
+    if not max_tokens or count_tokens(text, model) <= max_tokens:
+        return [text]
+
+    chunks, current, current_tokens = [], [], 0
+    for section in split_sections(text):
+        for piece, tokens in _fitting_pieces(section, max_tokens, model):
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def chunks_for_reference(chunks: List[str], reference: str, limit: int = 2) -> List[str]:
+    """
+    The chunks (at most ``limit``, in document order) that mention ``reference``.
+
+    A chunk quoting the reference verbatim wins; otherwise chunks are ranked by how
+    many of its years, paragraph numbers and act abbreviations they contain. When no
+    chunk mentions any of them, the opening chunk (parties, subject, governing law)
+    is used.
+    """
+    if len(chunks) <= 1:
+        return list(chunks)
+
+    wanted = _normalized(reference)
+    exact = [index for index, chunk in enumerate(chunks) if wanted and wanted in _normalized(chunk)]
+    if exact:
+        return [chunks[index] for index in exact[:limit]]
+
+    keys = set(_REFERENCE_KEY.findall(reference))
+    scores = [sum(1 for key in keys if key in chunk) for chunk in chunks]
+    top = max(scores)
+    if not top:
+        return chunks[:1]
+    # Chunks that only share a stray number with the reference do not qualify.
+    ranked = sorted(range(len(chunks)), key=lambda index: -scores[index])[:limit]
+    return [chunks[index] for index in sorted(ranked) if scores[index] * 2 >= top]
@@ -0,0 +1,154 @@
+"""Streaming DOCX text extraction straight from ``word/document.xml``."""
+
+import posixpath
+import zipfile
+
+from lxml import etree
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+BODY = _W + 'body'
+P = _W + 'p'
+R = _W + 'r'
+TBL = _W + 'tbl'
+TR = _W + 'tr'
+TC = _W + 'tc'
+TC_PR = _W + 'tcPr'
+TR_PR = _W + 'trPr'
+HYPERLINK = _W + 'hyperlink'
+BR = _W + 'br'
+TYPE = _W + 'type'
+VAL = _W + 'val'
+GRID_SPAN = _W + 'gridSpan'
+GRID_BEFORE = _W + 'gridBefore'
+V_MERGE = _W + 'vMerge'
+
+# Run children with a plain-text equivalent, mirroring python-docx's ``Run.text``.
+_RUN_TEXT = {
+    _W + 't': None,
+    _W + 'tab': '\t',
+    _W + 'ptab': '\t',
+    _W + 'cr': '\n',
+    _W + 'noBreakHyphen': '-',
+}
+
+
+def _main_part_name(archive):
+    """Resolve the main document part from the package relationships."""
+    try:
+        rels = etree.fromstring(archive.read('_rels/.rels'))
+    except KeyError:
+        return 'word/document.xml'
+    for rel in rels.iter(_REL + 'Relationship'):
+        if rel.get('Type') == _OFFICE_DOCUMENT:
+            return posixpath.normpath(rel.get('Target', '').lstrip('/'))
+    return 'word/document.xml'
+
+
+def _run_text(run):
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag in _RUN_TEXT:
+            parts.append(_RUN_TEXT[tag] or child.text or '')
+        elif tag == BR and child.get(TYPE, 'textWrapping') == 'textWrapping':
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def paragraph_text(paragraph):
+    """Text of direct runs and hyperlinked runs, like python-docx's ``Paragraph.text``."""
+    parts = []
+    for child in paragraph:
+        if child.tag == R:
+            parts.append(_run_text(child))
+        elif child.tag == HYPERLINK:
+            parts.extend(_run_text(run) for run in child if run.tag == R)
+    return ''.join(parts)
+
+
+def has_page_break(paragraph):
+    return any(
+        br.get(TYPE) == 'page'
+        for run in paragraph if run.tag == R
+        for br in run if br.tag == BR
+    )
+
+
+def _cell_property(cell, tag, default=None):
+    properties = cell.find(TC_PR)
+    element = properties.find(tag) if properties is not None else None
+    if element is None:
+        return default
+    return element.get(VAL, 'continue' if tag == V_MERGE else default)
+
+
+def table_lines(table):
+    """
+    Rows of a table as ``cell | cell`` lines.
+
+    Cells are laid out on the table grid the way python-docx's ``_Row.cells`` does: a
+    horizontally merged cell repeats once per spanned column and a vertically merged
+    continuation repeats the text of the cell that starts the merge. Only the cell's own
+    paragraphs count; nested tables are skipped.
+    """
+    lines = []
+    previous_row = {}
+    for row in table.iterchildren(TR):
+        row_properties = row.find(TR_PR)
+        grid_before = row_properties.find(GRID_BEFORE) if row_properties is not None else None
+        offset = int(grid_before.get(VAL, 0)) if grid_before is not None else 0
+        current_row = {}
+        cells = []
+        for cell in row.iterchildren(TC):
+            span = int(_cell_property(cell, GRID_SPAN, 1))
+            if _cell_property(cell, V_MERGE) == 'continue' and offset in previous_row:
+                text, span = previous_row[offset]
+            else:
+                text = '\n'.join(paragraph_text(p) for p in cell.iterchildren(P)).strip()
+            current_row[offset] = (text, span)
+            cells.extend([text] * span)
+            offset += span
+        previous_row = current_row
+        row_text = [text for text in cells if text]
+        if row_text:
+            lines.append(' | '.join(row_text))
+    return lines
+
+
+def iter_docx_pages(file_path):
+    """
+    Yield the text of each page of a DOCX file, split at explicit page breaks.
+
+    ``word/document.xml`` is parsed incrementally from the zip; each top-level paragraph
+    or table is converted as soon as it is complete and then freed, so memory stays flat
+    however long the document is.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(_main_part_name(archive)) as stream:
+            parts = []
+            for _, element in etree.iterparse(stream, events=('end',), tag=(P, TBL), huge_tree=True):
+                parent = element.getparent()
+                if parent is None or parent.tag != BODY:
+                    continue
+                if element.tag == P:
+                    text = paragraph_text(element).strip()
+                    if text:
+                        parts.append(text)
+                    if has_page_break(element):
+                        page = '\n'.join(parts)
+                        if page.strip():
+                            yield page.strip()
+                        parts = []
+                else:
+                    lines = table_lines(element)
+                    if lines:
+                        parts.append('\n'.join(lines))
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+            page = '\n'.join(parts)
+            if page.strip():
+                yield page.strip()
@@ -0,0 +1,98 @@
+"""Process-wide asyncio loop and pooled keep-alive HTTP session for OpenAI calls.
+
+openai 0.28 opens a fresh ``aiohttp.ClientSession`` for every ``acreate`` unless
+``openai.aiosession`` holds one, so each call would pay a new TCP and TLS handshake.
+All LLM coroutines run on one background event loop instead and share a single
+session whose connector keeps up to ``OPENAI_HTTP_POOL_SIZE`` connections alive.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Optional
+
+import aiohttp
+import openai
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_openai_pool_size() -> int:
+    return max(1, int(os.environ.get("OPENAI_HTTP_POOL_SIZE", "100")))
+
+
+def get_llm_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared event loop, starting its thread on first use (and again after a fork)."""
+    global _loop, _loop_pid, _session
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _session = None
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _loop
+
+
+async def get_llm_session() -> aiohttp.ClientSession:
+    """The pooled session; must be awaited on the shared loop."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=get_openai_pool_size(),
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        logging.info("Opened pooled OpenAI HTTP session (%s connections)", get_openai_pool_size())
+    return _session
+
+
+async def _with_shared_session(coro: Awaitable[Any]) -> Any:
+    # Tasks copy the context they are created in, so every call the coroutine
+    # spawns picks up the pooled session.
+    openai.aiosession.set(await get_llm_session())
+    return await coro
+
+
+def submit_llm(coro: Awaitable[Any]) -> concurrent.futures.Future:
+    """Schedule ``coro`` on the shared loop from any thread."""
+    return asyncio.run_coroutine_threadsafe(_with_shared_session(coro), get_llm_loop())
+
+
+def run_llm(coro: Awaitable[Any]) -> Any:
+    """Run ``coro`` on the shared loop and block the calling thread until it finishes."""
+    return submit_llm(coro).result()
+
+
+def close_llm_client() -> None:
+    """Cancel pending calls, close the pooled session and stop the loop; runs at interpreter exit."""
+    global _loop, _session
+    with _loop_lock:
+        loop, session = _loop, _session
+        _loop, _session = None, None
+    if loop is None or _loop_pid != os.getpid() or loop.is_closed():
+        return
+
+    async def shutdown():
+        # Calls still waiting for a rate-limit slot or a retry are abandoned.
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if session is not None and not session.closed:
+            await session.close()
+
+    try:
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=5)
+    except (concurrent.futures.TimeoutError, RuntimeError):
+        logging.warning("Timed out closing the OpenAI HTTP session")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+atexit.register(close_llm_client)
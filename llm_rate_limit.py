@@ -0,0 +1,462 @@
+"""Process-wide OpenAI request scheduler: per-model RPM/TPM token buckets, priorities and backoff.
+
+Every chat completion first reserves one request and its estimated tokens from the
+model's buckets. Calls that do not fit wait in a per-model priority queue until the
+buckets refill, so concurrent documents share the quota instead of racing for it.
+After the response, the estimate is settled against the reported usage. Rate-limit
+and transient errors are retried with jittered exponential backoff that honours
+``Retry-After``; a 429 also drains the model's request bucket, so the calls queued
+behind it wait as well instead of starting a retry storm.
+
+Buckets live in memory by default. Set ``OPENAI_RATE_LIMIT_BACKEND`` to
+``sqlite:///path/to/file`` or ``redis://host:6379/0`` to share them between worker
+processes.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import sqlite3
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import openai
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# (bucket key, amount, capacity, refill per second)
+Bucket = Tuple[str, float, float, float]
+
+
+def get_model_limits(model: str) -> Tuple[int, int]:
+    """Return ``(rpm, tpm)`` for ``model``; ``0`` means unlimited.
+
+    ``OPENAI_RATE_LIMITS`` takes ``model=rpm/tpm`` pairs separated by commas, e.g.
+    ``gpt-4.1=500/30000,gpt-4.1-mini=500/200000``. Unlisted models fall back to
+    ``OPENAI_DEFAULT_RPM`` / ``OPENAI_DEFAULT_TPM``. Nothing is throttled unless one of
+    them is set: a budget below the account's real tier only queues calls needlessly.
+    """
+    for entry in (os.environ.get("OPENAI_RATE_LIMITS") or "").split(","):
+        name, _, limits = entry.strip().partition("=")
+        if name == model and limits:
+            rpm, _, tpm = limits.partition("/")
+            return int(rpm or 0), int(tpm or 0)
+    return (
+        int(os.environ.get("OPENAI_DEFAULT_RPM", "0")),
+        int(os.environ.get("OPENAI_DEFAULT_TPM", "0")),
+    )
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Tokens in ``text``: exact with tiktoken, otherwise three characters per token.
+
+    The fallback over- rather than under-counts Hungarian text.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 3
+
+
+def estimate_tokens(model: str, messages: List[dict], max_tokens: Optional[int] = None) -> int:
+    """Prompt tokens plus the expected completion, counted before the request is sent."""
+    text = "".join(str(message.get("content") or "") for message in messages)
+    completion_tokens = max_tokens or int(os.environ.get("OPENAI_EXPECTED_OUTPUT_TOKENS", "1000"))
+    return count_tokens(text, model) + 4 * len(messages) + completion_tokens
+
+
+def _refilled(state, capacity: float, per_second: float, now: float) -> float:
+    if state is None:
+        return capacity
+    level, updated = state
+    return min(capacity, level + max(now - updated, 0.0) * per_second)
+
+
+def _take(levels: Dict[str, Tuple[float, float]], buckets: List[Bucket], now: float) -> float:
+    """Take every amount from ``levels`` or none; return ``0`` or the seconds until all fit."""
+    current = [_refilled(levels.get(key), capacity, rate, now) for key, _, capacity, rate in buckets]
+    wait = max(
+        ((amount - level) / rate for (_, amount, _, rate), level in zip(buckets, current) if level < amount),
+        default=0.0,
+    )
+    if wait > 0:
+        return wait
+    for (key, amount, _, _), level in zip(buckets, current):
+        levels[key] = (level - amount, now)
+    return 0.0
+
+
+def _give(levels, key: str, amount: float, capacity: float, per_second: float, now: float) -> None:
+    levels[key] = (min(capacity, _refilled(levels.get(key), capacity, per_second, now) + amount), now)
+
+
+def _drain(levels, key: str, seconds: float, capacity: float, per_second: float, now: float) -> None:
+    # Several 429s at once pause the bucket once, not once per failed call.
+    levels[key] = (min(_refilled(levels.get(key), capacity, per_second, now), -seconds * per_second), now)
+
+
+class MemoryBucketStore:
+    """Token buckets for one process."""
+
+    # Operations only hold a thread lock briefly, so they may run on the event loop.
+    blocking = False
+
+    def __init__(self):
+        self._lock = Lock()
+        self._levels: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, buckets: List[Bucket]) -> float:
+        """Take every amount or none; return ``0`` on success or the seconds until all fit."""
+        with self._lock:
+            return _take(self._levels, buckets, time.time())
+
+    def give(self, key: str, amount: float, capacity: float, per_second: float) -> None:
+        """Return capacity to a bucket, or charge it with a negative ``amount`` (it may go below zero)."""
+        with self._lock:
+            _give(self._levels, key, amount, capacity, per_second, time.time())
+
+    def drain(self, key: str, seconds: float, capacity: float, per_second: float) -> None:
+        """Empty a bucket so that nothing fits for ``seconds``."""
+        with self._lock:
+            _drain(self._levels, key, seconds, capacity, per_second, time.time())
+
+
+class SQLiteBucketStore:
+    """Token buckets shared by every process on one host through a SQLite file."""
+
+    # BEGIN IMMEDIATE can wait up to 30s for another process's write lock.
+    blocking = True
+
+    def __init__(self, path: str):
+        self._lock = Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_bucket "
+                "(bucket_key TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _update(self, keys: List[str], apply):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" * len(keys))
+                levels = {
+                    key: (level, updated)
+                    for key, level, updated in self._conn.execute(
+                        f"SELECT bucket_key, level, updated_at FROM rate_bucket WHERE bucket_key IN ({placeholders})",
+                        keys,
+                    )
+                }
+                result = apply(levels, time.time())
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_bucket (bucket_key, level, updated_at) VALUES (?, ?, ?)",
+                    [(key, level, updated) for key, (level, updated) in levels.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def take(self, buckets: List[Bucket]) -> float:
+        return self._update([bucket[0] for bucket in buckets], lambda levels, now: _take(levels, buckets, now))
+
+    def give(self, key: str, amount: float, capacity: float, per_second: float) -> None:
+        self._update([key], lambda levels, now: _give(levels, key, amount, capacity, per_second, now))
+
+    def drain(self, key: str, seconds: float, capacity: float, per_second: float) -> None:
+        self._update([key], lambda levels, now: _drain(levels, key, seconds, capacity, per_second, now))
+
+
+# KEYS: bucket keys; ARGV: now, then amount, capacity, per-second rate for each key.
+_REDIS_TAKE = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local amount = tonumber(ARGV[i * 3 - 1])
+    local capacity = tonumber(ARGV[i * 3])
+    local rate = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call('HMGET', key, 'level', 'updated_at')
+    local level = capacity
+    if state[1] then
+        level = math.min(capacity, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * rate)
+    end
+    levels[i] = math.min(capacity, level - amount)
+    if level < amount then
+        wait = math.max(wait, (amount - level) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'level', tostring(levels[i]), 'updated_at', ARGV[1])
+    redis.call('EXPIRE', key, 3600)
+end
+return '0'
+"""
+
+# Unlike a take, a give always applies: overage charges may leave the level below zero.
+_REDIS_GIVE = """
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[3])
+local rate = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'level', 'updated_at')
+local level = capacity
+if state[1] then
+    level = math.min(capacity, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * rate)
+end
+redis.call('HSET', KEYS[1], 'level', tostring(math.min(capacity, level + tonumber(ARGV[2]))), 'updated_at', ARGV[1])
+redis.call('EXPIRE', KEYS[1], 3600)
+return '0'
+"""
+
+_REDIS_DRAIN = """
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[3])
+local rate = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'level', 'updated_at')
+local level = capacity
+if state[1] then
+    level = math.min(capacity, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * rate)
+end
+redis.call('HSET', KEYS[1], 'level', tostring(math.min(level, -tonumber(ARGV[2]) * rate)), 'updated_at', ARGV[1])
+redis.call('EXPIRE', KEYS[1], 3600)
+return '0'
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by every process that can reach one Redis server."""
+
+    blocking = True
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("OPENAI_RATE_LIMIT_BACKEND points to Redis but the redis package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._take_script = self._client.register_script(_REDIS_TAKE)
+        self._give_script = self._client.register_script(_REDIS_GIVE)
+        self._drain_script = self._client.register_script(_REDIS_DRAIN)
+
+    def take(self, buckets: List[Bucket]) -> float:
+        args = [time.time()]
+        for _, amount, capacity, rate in buckets:
+            args.extend([amount, capacity, rate])
+        return float(self._take_script(keys=[bucket[0] for bucket in buckets], args=args))
+
+    def give(self, key: str, amount: float, capacity: float, per_second: float) -> None:
+        self._give_script(keys=[key], args=[time.time(), amount, capacity, per_second])
+
+    def drain(self, key: str, seconds: float, capacity: float, per_second: float) -> None:
+        self._drain_script(keys=[key], args=[time.time(), seconds, capacity, per_second])
+
+
+def _bucket_key(model: str, kind: str) -> str:
+    return f"openai:{model}:{kind}"
+
+
+class RateLimiter:
+    """Per-model priority queues in front of a bucket store; lower ``priority`` goes first."""
+
+    def __init__(self, store):
+        self.store = store
+        self._queues: Dict[str, list] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._pumps: Dict[str, asyncio.Task] = {}
+        self._order = itertools.count()
+        self._loop = None
+
+    async def _store_call(self, method, *args):
+        # Shared stores wait on file locks or the network; keep that off the LLM loop.
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def _buckets(self, model: str, tokens: int) -> List[Bucket]:
+        rpm, tpm = get_model_limits(model)
+        buckets = []
+        if rpm:
+            buckets.append((_bucket_key(model, "requests"), 1, rpm, rpm / 60.0))
+        if tpm:
+            # A single call larger than the whole budget waits for a full bucket.
+            buckets.append((_bucket_key(model, "tokens"), min(tokens, tpm), tpm, tpm / 60.0))
+        return buckets
+
+    async def acquire(self, model: str, tokens: int, priority: int = 0) -> None:
+        """Wait until one request of ``tokens`` fits into the budgets of ``model``."""
+        buckets = self._buckets(model, tokens)
+        if not buckets:
+            return
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Queues belong to one event loop; the buckets themselves carry over.
+            self._queues, self._wakeups, self._pumps, self._loop = {}, {}, {}, loop
+        future = loop.create_future()
+        heapq.heappush(self._queues.setdefault(model, []), (priority, next(self._order), buckets, future))
+        self._wakeups.setdefault(model, asyncio.Event()).set()
+        pump = self._pumps.get(model)
+        if pump is None or pump.done():
+            self._pumps[model] = asyncio.ensure_future(self._pump(model))
+        await future
+
+    async def _pump(self, model: str) -> None:
+        queue, wakeup = self._queues[model], self._wakeups[model]
+        while queue:
+            _, _, buckets, future = queue[0]
+            if future.done():
+                heapq.heappop(queue)
+                continue
+            wait = await self._store_call(self.store.take, buckets)
+            if not wait:
+                heapq.heappop(queue)
+                future.set_result(None)
+                continue
+            # Sleep until the head fits, or until a more urgent call joins the queue.
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def settle(self, model: str, estimated_tokens: int, used_tokens: Optional[int]) -> None:
+        """Correct the token bucket once the real usage of a call is known."""
+        rpm, tpm = get_model_limits(model)
+        if tpm and used_tokens is not None:
+            await self._store_call(
+                self.store.give, _bucket_key(model, "tokens"), min(estimated_tokens, tpm) - used_tokens, tpm, tpm / 60.0
+            )
+
+    async def pause(self, model: str, seconds: float) -> None:
+        """Hold every queued call for ``model`` for ``seconds`` by draining its request bucket."""
+        rpm, _ = get_model_limits(model)
+        if rpm:
+            await self._store_call(self.store.drain, _bucket_key(model, "requests"), seconds, rpm, rpm / 60.0)
+
+
+def _create_store():
+    backend = (os.environ.get("OPENAI_RATE_LIMIT_BACKEND") or "memory").strip()
+    if backend.startswith("sqlite:///"):
+        return SQLiteBucketStore(backend[len("sqlite:///"):])
+    if backend.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketStore(backend)
+    return MemoryBucketStore()
+
+
+_LIMITER = None
+_LIMITER_PID = None
+_LIMITER_LOCK = Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter; it must only be used from the shared LLM loop."""
+    global _LIMITER, _LIMITER_PID
+    with _LIMITER_LOCK:
+        if _LIMITER is None or _LIMITER_PID != os.getpid():
+            try:
+                store = _create_store()
+            except (sqlite3.Error, RuntimeError) as store_error:
+                logging.warning("Shared OpenAI rate limits unavailable, using per-process buckets: %s", store_error)
+                store = MemoryBucketStore()
+            _LIMITER, _LIMITER_PID = RateLimiter(store), os.getpid()
+        return _LIMITER
+
+
+_RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    openai.error.APIError,
+)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay the server asked for via ``retry-after-ms`` or ``Retry-After``, if any."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's ``Retry-After``."""
+    base = float(os.environ.get("OPENAI_BACKOFF_BASE_SECONDS", "1"))
+    cap = float(os.environ.get("OPENAI_BACKOFF_MAX_SECONDS", "60"))
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if not isinstance(error, _RETRYABLE_ERRORS):
+        return False
+    status = getattr(error, "http_status", None)
+    # APIError also covers 4xx answers that will not succeed on a second try.
+    return not (type(error) is openai.error.APIError and status is not None and status < 500)
+
+
+async def create_chat_completion(*, priority: int = 0, **kwargs):
+    """``openai.ChatCompletion.acreate`` behind the shared rate limiter, with retries.
+
+    Gives up after ``OPENAI_MAX_RETRIES`` (default 5) retries and re-raises the last error.
+    """
+    model = kwargs["model"]
+    tokens = 0
+    if get_model_limits(model)[1]:
+        # Encoding a whole contract takes a while; keep it off the shared loop.
+        tokens = await asyncio.to_thread(
+            estimate_tokens, model, kwargs.get("messages") or [], kwargs.get("max_tokens")
+        )
+    limiter = get_rate_limiter()
+    max_retries = int(os.environ.get("OPENAI_MAX_RETRIES", "5"))
+    for attempt in itertools.count():
+        await limiter.acquire(model, tokens, priority)
+        try:
+            response = await openai.ChatCompletion.acreate(**kwargs)
+        except Exception as error:
+            if attempt >= max_retries or not _is_retryable(error):
+                raise
+            retry_after = retry_after_seconds(error)
+            delay = backoff_delay(attempt, retry_after)
+            if isinstance(error, openai.error.RateLimitError):
+                await limiter.pause(model, retry_after if retry_after is not None else delay)
+            logging.warning(
+                "OpenAI %s call failed (%s), retry %s in %.1fs",
+                model,
+                type(error).__name__,
+                attempt + 1,
+                delay,
+            )
+            await asyncio.sleep(delay)
+            continue
+        usage = response.get("usage") if hasattr(response, "get") else None
+        await limiter.settle(model, tokens, (usage or {}).get("total_tokens"))
+        return response
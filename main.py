@@ -1,6 +1,20 @@
 import os
 
 from app import app
+from routes import resume_stalled_documents
+
+
+def _should_resume_on_startup() -> bool:
+    if os.environ.get("OCR_RESUME_ON_STARTUP", "true").strip().lower() not in {"1", "true", "yes", "on"}:
+        return False
+    # `python main.py` runs under the debug reloader, whose parent process only watches
+    # files; the serving child re-executes this file with WERKZEUG_RUN_MAIN set. Imported
+    # by a WSGI server (gunicorn main:app) every worker tries, and claiming is atomic.
+    return __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+
+if _should_resume_on_startup():
+    resume_stalled_documents()
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5000"))
@@ -0,0 +1,54 @@
+"""add analysis cache entry table
+
+Revision ID: 0008_add_analysis_cache_entry
+Revises: 0007_add_visit_metadata
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008_add_analysis_cache_entry"
+down_revision = "0007_add_visit_metadata"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "analysis_cache_entry",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("analysis_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=True),
+        sa.Column("file_sha256", sa.String(length=64), nullable=True),
+        sa.Column("text_sha256", sa.String(length=64), nullable=False),
+        sa.Column("pipeline_version", sa.String(length=64), nullable=False),
+        sa.Column("pii_sanitized", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["analysis_id"], ["analysis.id"], ),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"], ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_analysis_cache_entry_file_sha256"),
+        "analysis_cache_entry",
+        ["file_sha256"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_analysis_cache_entry_text_sha256"),
+        "analysis_cache_entry",
+        ["text_sha256"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_analysis_cache_entry_text_sha256"), table_name="analysis_cache_entry")
+    op.drop_index(op.f("ix_analysis_cache_entry_file_sha256"), table_name="analysis_cache_entry")
+    op.drop_table("analysis_cache_entry")
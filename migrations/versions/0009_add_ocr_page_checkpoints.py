@@ -0,0 +1,52 @@
+"""add OCR page checkpoints and analysis page progress
+
+Revision ID: 0009_add_ocr_page_checkpoints
+Revises: 0008_add_analysis_cache_entry
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0009_add_ocr_page_checkpoints"
+down_revision = "0008_add_analysis_cache_entry"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("analysis") as batch_op:
+        batch_op.add_column(sa.Column("pages_done", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("pages_total", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("progress_at", sa.DateTime(), nullable=True))
+
+    op.create_table(
+        "ocr_page_checkpoint",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("file_sha256", sa.String(length=64), nullable=False),
+        sa.Column("page_index", sa.Integer(), nullable=False),
+        sa.Column("encrypted_text", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["document_id"], ["document.id"], ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("document_id", "page_index", name="uq_ocr_page_checkpoint_page"),
+    )
+    op.create_index(
+        op.f("ix_ocr_page_checkpoint_document_id"),
+        "ocr_page_checkpoint",
+        ["document_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_ocr_page_checkpoint_document_id"), table_name="ocr_page_checkpoint")
+    op.drop_table("ocr_page_checkpoint")
+    with op.batch_alter_table("analysis") as batch_op:
+        batch_op.drop_column("progress_at")
+        batch_op.drop_column("pages_total")
+        batch_op.drop_column("pages_done")
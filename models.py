@@ -137,6 +137,9 @@ class Analysis(db.Model):
     # Processing info
     processing_time = db.Column(db.Float)  # seconds
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    pages_done = db.Column(db.Integer)  # OCR progress while status is 'ocr'
+    pages_total = db.Column(db.Integer)
+    progress_at = db.Column(db.DateTime)  # last OCR progress, used to spot stalled jobs
     
     # Status
     status = db.Column(db.String(50), default='pending')  # pending, completed, failed
@@ -249,6 +252,37 @@ class Analysis(db.Model):
         return self._resolve_field('pii_map')
 
 
+class AnalysisCacheEntry(db.Model):
+    """Content fingerprints of a completed analysis so identical uploads can reuse it."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'))
+    file_sha256 = db.Column(db.String(64), index=True)
+    text_sha256 = db.Column(db.String(64), nullable=False, index=True)
+    pipeline_version = db.Column(db.String(64), nullable=False)
+    pii_sanitized = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    analysis = db.relationship('Analysis', backref='cache_entries', lazy=True)
+
+
+class OcrPageCheckpoint(db.Model):
+    """OCR text of one completed page, kept until the document's analysis completes."""
+
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'page_index', name='uq_ocr_page_checkpoint_page'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False, index=True)
+    file_sha256 = db.Column(db.String(64), nullable=False)
+    page_index = db.Column(db.Integer, nullable=False)
+    encrypted_text = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class AnalysisFeedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     analysis_id = db.Column(db.Integer, db.ForeignKey('analysis.id'), nullable=False)
@@ -0,0 +1,169 @@
+"""Content-addressed cache for per-page OCR results."""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Optional, Tuple
+
+from encryption_utils import decrypt_value, encrypt_value
+
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS ocr_result (
+        cache_key TEXT PRIMARY KEY,
+        encrypted_text TEXT NOT NULL,
+        provider_meta TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_ocr_result_last_used_at ON ocr_result (last_used_at)",
+    """
+    CREATE TABLE IF NOT EXISTS ocr_cache_counter (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+)
+
+
+def make_cache_key(image, lang: str, providers, settings=()) -> str:
+    """Hash the preprocessed page pixels together with the OCR settings that shape the result.
+
+    ``settings`` holds provider options beyond the chain itself, e.g. Tesseract's page
+    segmentation mode, so changing them does not serve text produced under the old ones.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("utf-8"))
+    digest.update(image.tobytes())
+    digest.update(f"|{lang}|{','.join(providers)}".encode("utf-8"))
+    if settings:
+        digest.update(f"|{','.join(str(value) for value in settings)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """SQLite-backed page cache with size-based LRU eviction.
+
+    Text is stored Fernet-encrypted, the same way private analyses are, so the cache
+    never holds contract contents in plain text.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT encrypted_text, provider_meta FROM ocr_result WHERE cache_key = ?",
+                (key,),
+            ).fetchone()
+            # Only non-empty text is stored, so an empty result means the row was
+            # encrypted with a key that has since been rotated; it can never be read again.
+            text = decrypt_value(row[0]) if row is not None else ""
+            if not text:
+                if row is not None:
+                    self._conn.execute("DELETE FROM ocr_result WHERE cache_key = ?", (key,))
+                self._increment("misses")
+                return None
+            self._conn.execute(
+                "UPDATE ocr_result SET last_used_at = ? WHERE cache_key = ?",
+                (time.time(), key),
+            )
+            self._increment("hits")
+        return text, json.loads(row[1])
+
+    def put(self, key: str, text: str, provider_meta: dict) -> None:
+        encrypted_text = encrypt_value(text)
+        meta_json = json.dumps(provider_meta)
+        size_bytes = len(encrypted_text) + len(meta_json) + len(key)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_result "
+                "(cache_key, encrypted_text, provider_meta, size_bytes, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, encrypted_text, meta_json, size_bytes, now, now),
+            )
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM ocr_cache_counter").fetchall())
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM ocr_result"
+            ).fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _increment(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO ocr_cache_counter (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _evict(self) -> None:
+        total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM ocr_result"
+        ).fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        excess = total_bytes - self.max_bytes
+        evicted = 0
+        rows = self._conn.execute(
+            "SELECT cache_key, size_bytes FROM ocr_result ORDER BY last_used_at ASC"
+        ).fetchall()
+        stale_keys = []
+        for cache_key, size_bytes in rows:
+            if evicted >= excess:
+                break
+            stale_keys.append((cache_key,))
+            evicted += size_bytes
+        self._conn.executemany("DELETE FROM ocr_result WHERE cache_key = ?", stale_keys)
+        logging.info("OCR cache evicted %s entries (%s bytes)", len(stale_keys), evicted)
+
+
+_CACHE = None
+_CACHE_LOCK = Lock()
+
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """Return the process-wide OCR cache, or ``None`` when caching is disabled."""
+    global _CACHE
+    enabled = (os.environ.get("OCR_CACHE_ENABLED", "true") or "true").strip().lower()
+    if enabled not in {"1", "true", "yes", "on"}:
+        return None
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            path = os.environ.get("OCR_CACHE_PATH") or os.path.join("instance", "ocr_cache.sqlite3")
+            max_bytes = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+            try:
+                _CACHE = OCRResultCache(path, max_bytes)
+            except sqlite3.Error as cache_error:
+                logging.warning("OCR cache unavailable at %s: %s", path, cache_error)
+                return None
+        return _CACHE
@@ -0,0 +1,114 @@
+"""Per-page OCR checkpoints so an interrupted extraction resumes from the pages already done."""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from app import db
+from encryption_utils import decrypt_value, encrypt_value
+from models import Analysis, Document, OcrPageCheckpoint
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# Only these are OCRed page by page, so only their progress_at advances while they run.
+CHECKPOINTED_FILE_TYPES = ("pdf",)
+
+
+def is_ocr_checkpointing_enabled() -> bool:
+    flag = (os.environ.get("OCR_CHECKPOINTS_ENABLED", "true") or "true").strip().lower()
+    return flag in _TRUTHY
+
+
+def load_page_checkpoints(document_id: int, file_sha256: Optional[str]) -> Dict[int, str]:
+    """Return ``{page_index: text}`` saved for this exact file; checkpoints of other bytes are dropped."""
+    if not is_ocr_checkpointing_enabled() or not file_sha256:
+        return {}
+    pages = {}
+    outdated = False
+    for checkpoint in OcrPageCheckpoint.query.filter_by(document_id=document_id):
+        if checkpoint.file_sha256 == file_sha256:
+            pages[checkpoint.page_index] = decrypt_value(checkpoint.encrypted_text)
+        else:
+            db.session.delete(checkpoint)
+            outdated = True
+    if outdated:
+        db.session.commit()
+    return pages
+
+
+def save_page_checkpoint(document_id: int, file_sha256: Optional[str], page_index: int, text: str) -> None:
+    """Add (without committing) the checkpoint for one finished page."""
+    if not is_ocr_checkpointing_enabled() or not file_sha256:
+        return
+    db.session.add(
+        OcrPageCheckpoint(
+            document_id=document_id,
+            file_sha256=file_sha256,
+            page_index=page_index,
+            encrypted_text=encrypt_value(text or ""),
+        )
+    )
+
+
+def clear_page_checkpoints(document_id: int) -> None:
+    """Delete (without committing) a document's checkpoints once its text is stored."""
+    OcrPageCheckpoint.query.filter_by(document_id=document_id).delete(synchronize_session=False)
+
+
+def clear_user_page_checkpoints(user_ids: Iterable[int]) -> None:
+    """Delete (without committing) the checkpoints of every document owned by ``user_ids``."""
+    documents = db.session.query(Document.id).filter(Document.user_id.in_(list(user_ids)))
+    OcrPageCheckpoint.query.filter(OcrPageCheckpoint.document_id.in_(documents.scalar_subquery())).delete(
+        synchronize_session=False
+    )
+
+
+def record_ocr_progress(analysis: Analysis, pages_done: int, pages_total: Optional[int]) -> None:
+    analysis.pages_done = pages_done
+    analysis.pages_total = pages_total
+    analysis.progress_at = datetime.utcnow()
+
+
+def _stale_before() -> datetime:
+    stale_after = float(os.environ.get("OCR_RESUME_STALE_SECONDS", "300"))
+    return datetime.utcnow() - timedelta(seconds=stale_after)
+
+
+def find_stalled_analyses() -> List[Analysis]:
+    """Analyses left in ``ocr`` whose progress stopped, e.g. because the worker died.
+
+    Jobs count as stalled after ``OCR_RESUME_STALE_SECONDS`` (default 300) without a
+    finished page, and are only resumed for ``OCR_RESUME_MAX_AGE_HOURS`` (default 24).
+    Other file types are OCRed in one call that reports no progress, so a long but
+    healthy run would look stalled; they are never resumed.
+    """
+    max_age = timedelta(hours=float(os.environ.get("OCR_RESUME_MAX_AGE_HOURS", "24")))
+    return (
+        Analysis.query.join(Document, Analysis.document_id == Document.id)
+        .filter(
+            Document.file_type.in_(CHECKPOINTED_FILE_TYPES),
+            Analysis.status == "ocr",
+            Analysis.progress_at.isnot(None),
+            Analysis.progress_at < _stale_before(),
+            Analysis.progress_at > datetime.utcnow() - max_age,
+        )
+        .order_by(Analysis.progress_at)
+        .all()
+    )
+
+
+def claim_stalled_analysis(analysis: Analysis) -> bool:
+    """Atomically take over a job that is still stalled, so only one process resumes it."""
+    claimed = (
+        Analysis.query.filter(
+            Analysis.id == analysis.id,
+            Analysis.status == "ocr",
+            Analysis.progress_at < _stale_before(),
+        )
+        .update({Analysis.progress_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    db.session.commit()
+    if claimed:
+        logging.info("Resuming stalled OCR of document %s", analysis.document_id)
+    return bool(claimed)
@@ -0,0 +1,185 @@
+"""Per-provider circuit breakers used to route around failing OCR providers."""
+
+import logging
+import os
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, List, Optional
+
+# Statuses that say nothing about provider health (e.g. OCR.space without an API key).
+_NEUTRAL_STATUSES = {"skipped"}
+# Statuses that will not heal by retrying, so the breaker opens on the first occurrence.
+_FATAL_STATUSES = {"auth_error", "permission_error", "client_init_failed"}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_circuit_breaker_enabled() -> bool:
+    flag = (os.environ.get("OCR_BREAKER_ENABLED", "true") or "true").strip().lower()
+    return flag in {"1", "true", "yes", "on"}
+
+
+class ProviderCircuitBreaker:
+    """Rolling-window breaker for one OCR provider.
+
+    A call counts as failed when its status is an error or it ran longer than
+    ``slow_call_ms``. Once the window holds ``min_calls`` calls and the failure rate
+    reaches ``error_rate`` the breaker opens; after ``cooldown`` seconds a single probe
+    call is let through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, provider: str, window: int, min_calls: int, error_rate: float,
+                 slow_call_ms: float, cooldown: float):
+        self.provider = provider
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_ms = slow_call_ms
+        self.cooldown = cooldown
+        self._calls = deque(maxlen=window)
+        self._lock = Lock()
+        self._state = CLOSED
+        self._opened_at: Optional[float] = None
+        self._probe_started_at: Optional[float] = None
+        self._last_error = ""
+        self._times_opened = 0
+        self._rejected = 0
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = time.time()
+            if self._state == OPEN and now - self._opened_at >= self.cooldown:
+                self._state = HALF_OPEN
+                self._probe_started_at = None
+            # A probe that never reported back (e.g. an earlier provider won) expires.
+            if self._state == HALF_OPEN and (
+                self._probe_started_at is None or now - self._probe_started_at >= self.cooldown
+            ):
+                self._probe_started_at = now
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, status: str, latency_ms: float, error: str = "") -> None:
+        if status in _NEUTRAL_STATUSES:
+            with self._lock:
+                self._probe_started_at = None
+            return
+
+        failed = status != "ok" or (self.slow_call_ms > 0 and latency_ms > self.slow_call_ms)
+        with self._lock:
+            self._calls.append((failed, latency_ms))
+            if failed:
+                self._last_error = error or status
+            if self._state == HALF_OPEN:
+                self._probe_started_at = None
+                if failed:
+                    self._open(f"probe failed ({status})")
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    logging.info("OCR provider %s circuit closed after successful probe", self.provider)
+                return
+            if self._state == CLOSED:
+                if status in _FATAL_STATUSES:
+                    self._open(status)
+                elif len(self._calls) >= self.min_calls:
+                    failure_rate = sum(1 for call_failed, _ in self._calls if call_failed) / len(self._calls)
+                    if failure_rate >= self.error_rate:
+                        self._open(f"failure rate {failure_rate:.0%}")
+
+    def _open(self, reason: str) -> None:
+        self._state = OPEN
+        self._opened_at = time.time()
+        self._times_opened += 1
+        logging.warning(
+            "OCR provider %s circuit opened: %s; retrying in %.0fs", self.provider, reason, self.cooldown
+        )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._calls.clear()
+            self._probe_started_at = None
+            self._opened_at = None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(latency for _, latency in self._calls)
+            failures = sum(1 for failed, _ in self._calls if failed)
+            state = self._state
+            if state == OPEN and time.time() - self._opened_at >= self.cooldown:
+                state = HALF_OPEN
+            return {
+                "provider": self.provider,
+                "state": state,
+                "calls": len(self._calls),
+                "failure_rate": failures / len(self._calls) if self._calls else 0.0,
+                "p50_ms": _percentile(latencies, 0.50),
+                "p95_ms": _percentile(latencies, 0.95),
+                "opened_at": self._opened_at if self._state != CLOSED else None,
+                "times_opened": self._times_opened,
+                "rejected_calls": self._rejected,
+                "last_error": self._last_error,
+            }
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+_BREAKERS: Dict[str, ProviderCircuitBreaker] = {}
+_BREAKERS_LOCK = Lock()
+
+
+def get_circuit_breaker(provider: str) -> ProviderCircuitBreaker:
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(provider)
+        if breaker is None:
+            breaker = _BREAKERS[provider] = ProviderCircuitBreaker(
+                provider,
+                window=int(os.environ.get("OCR_BREAKER_WINDOW", "20")),
+                min_calls=int(os.environ.get("OCR_BREAKER_MIN_CALLS", "5")),
+                error_rate=float(os.environ.get("OCR_BREAKER_ERROR_RATE", "0.5")),
+                slow_call_ms=float(os.environ.get("OCR_BREAKER_SLOW_CALL_MS", "15000")),
+                cooldown=float(os.environ.get("OCR_BREAKER_COOLDOWN_SECONDS", "60")),
+            )
+        return breaker
+
+
+def route_providers(providers: List[str]) -> List[str]:
+    """Drop providers whose circuit is open; fall back to the full chain if none are left."""
+    if not is_circuit_breaker_enabled():
+        return list(providers)
+    available = [provider for provider in providers if get_circuit_breaker(provider).allow_request()]
+    skipped = [provider for provider in providers if provider not in available]
+    if skipped:
+        logging.info("OCR providers skipped by open circuit: %s", ", ".join(skipped))
+    return available or list(providers)
+
+
+def record_provider_call(provider: str, status: str, latency_ms: float, error: str = "") -> None:
+    if is_circuit_breaker_enabled():
+        get_circuit_breaker(provider).record(status, latency_ms, error)
+
+
+def provider_health_snapshot() -> List[dict]:
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return [breaker.snapshot() for breaker in breakers]
+
+
+def reset_circuit_breakers(provider: Optional[str] = None) -> None:
+    with _BREAKERS_LOCK:
+        breakers = [
+            breaker for name, breaker in _BREAKERS.items() if provider is None or name == provider
+        ]
+    for breaker in breakers:
+        breaker.reset()
@@ -0,0 +1,131 @@
+"""Per-page cache of encoded upload images shared by the cloud OCR providers."""
+
+import logging
+import time
+import weakref
+from io import BytesIO
+from threading import Lock
+
+from PIL import Image, features
+
+# Encoded uploads keyed by ``id(page)``; entries are dropped when the page image is collected.
+_ENCODED_PAGES = {}
+_ENCODED_PAGES_LOCK = Lock()
+
+MIME_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'tiff': 'image/tiff',
+}
+
+
+class EncodedImage:
+    """One encoded rendition of a page; ``view`` is a zero-copy ``memoryview`` of the bytes."""
+
+    def __init__(self, data, image_format, encode_ms):
+        self.view = memoryview(data)
+        self.format = image_format
+        self.mime_type = MIME_TYPES[image_format]
+        self.encode_ms = encode_ms
+
+    @property
+    def size(self):
+        return self.view.nbytes
+
+    def report(self, cached):
+        return {
+            'upload_format': self.format,
+            'upload_bytes': self.size,
+            'encode_ms': 0.0 if cached else self.encode_ms,
+            'encode_cached': cached,
+        }
+
+
+class _PageEncodings:
+    def __init__(self):
+        self.lock = Lock()
+        self.bilevel = None
+        self.renditions = {}
+
+
+def _page_encodings(image):
+    key = id(image)
+    with _ENCODED_PAGES_LOCK:
+        entry = _ENCODED_PAGES.get(key)
+        if entry is None:
+            entry = _ENCODED_PAGES[key] = _PageEncodings()
+            weakref.finalize(image, _forget, key, entry)
+        return entry
+
+
+def _forget(key, entry):
+    with _ENCODED_PAGES_LOCK:
+        if _ENCODED_PAGES.get(key) is entry:
+            del _ENCODED_PAGES[key]
+
+
+def share_encodings(source, copy):
+    """Let ``copy`` (e.g. a page duplicated for a concurrent provider) reuse ``source``'s uploads."""
+    entry = _page_encodings(source)
+    with _ENCODED_PAGES_LOCK:
+        _ENCODED_PAGES[id(copy)] = entry
+    weakref.finalize(copy, _forget, id(copy), entry)
+
+
+def is_bilevel(image):
+    """True when a page holds only black and white pixels (checked once via the histogram)."""
+    if image.mode == '1':
+        return True
+    if 'bilevel' in image.info:
+        return bool(image.info['bilevel'])
+    if image.mode != 'L':
+        return False
+    histogram = image.histogram()
+    return not any(histogram[1:255])
+
+
+def encode_page(image, image_format='png', quality=85):
+    """
+    Return ``(EncodedImage, cached)`` for ``image``, encoding it at most once per format.
+
+    Bilevel pages are written as 1-bit PNG (or CCITT Group 4 TIFF when ``tiff`` is asked
+    for), which is several times smaller and faster to produce than 8-bit grayscale PNG.
+    """
+    image_format = {'jpg': 'jpeg'}.get(image_format, image_format)
+    if image_format not in MIME_TYPES:
+        image_format = 'png'
+    entry = _page_encodings(image)
+    with entry.lock:
+        encoded = entry.renditions.get((image_format, quality))
+        if encoded is not None:
+            return encoded, True
+
+        started = time.perf_counter()
+        if entry.bilevel is None:
+            entry.bilevel = is_bilevel(image)
+        source = image
+        save_options = {}
+        if image_format in {'png', 'tiff'} and entry.bilevel:
+            source = image if image.mode == '1' else image.convert('1', dither=Image.Dither.NONE)
+            if image_format == 'tiff' and features.check('libtiff'):
+                save_options['compression'] = 'group4'
+        elif image_format == 'tiff':
+            save_options['compression'] = 'tiff_lzw' if features.check('libtiff') else 'raw'
+        elif image_format in {'jpeg', 'webp'}:
+            if image.mode not in {'L', 'RGB'}:
+                source = image.convert('L')
+            save_options['quality'] = quality
+
+        buffer = BytesIO()
+        source.save(buffer, format=image_format.upper(), **save_options)
+        encoded = EncodedImage(buffer.getvalue(), image_format, (time.perf_counter() - started) * 1000)
+        entry.renditions[(image_format, quality)] = encoded
+        logging.debug(
+            "Encoded page as %s%s: %s bytes in %.1f ms",
+            image_format,
+            ' (1-bit)' if entry.bilevel and image_format in {'png', 'tiff'} else '',
+            encoded.size,
+            encoded.encode_ms,
+        )
+        return encoded, False
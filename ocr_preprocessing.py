@@ -0,0 +1,137 @@
+"""NumPy implementation of the OCR grayscale/contrast/denoise/binarize chain.
+
+The PIL chain in ``ocr_processor.preprocess_image`` materialises a new image for every
+step. Here contrast and fixed thresholding are folded into a single 256-entry lookup
+table, and because a 3x3 median commutes with monotonic point operations, denoising a
+binarized page reduces to a majority vote over nine shifted boolean views.
+"""
+
+import numpy as np
+from PIL import Image
+
+BINARIZE_MODES = ('fixed', 'otsu', 'adaptive')
+
+# Pairwise compare-exchange network that leaves the median of nine values in slot 4.
+_MEDIAN9_NETWORK = (
+    (1, 2), (4, 5), (7, 8), (0, 1), (3, 4), (6, 7), (1, 2), (4, 5), (7, 8),
+    (0, 3), (5, 8), (4, 7), (3, 6), (1, 4), (2, 5), (4, 7), (4, 2), (6, 4), (4, 2),
+)
+
+
+def preprocess_grayscale(
+    image,
+    contrast_factor=1.6,
+    denoise=True,
+    binarize=True,
+    threshold=170,
+    mode='fixed',
+    adaptive_block_size=31,
+    adaptive_offset=10,
+):
+    """Return ``(grayscale PIL image, steps_applied)`` for an RGB or L page image."""
+    steps_applied = []
+    gray = np.asarray(image if image.mode == 'L' else image.convert('L'))
+    steps_applied.append('grayscale')
+
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    lut = contrast_lut(histogram, contrast_factor)
+    steps_applied.append(f'contrast_{contrast_factor}')
+
+    if binarize and mode == 'fixed':
+        bits = (lut > threshold)[gray]
+        if denoise:
+            bits = majority3x3(bits)
+            steps_applied.append('median_denoise')
+        steps_applied.append(f'binarize_{threshold}')
+        return Image.fromarray(np.where(bits, np.uint8(255), np.uint8(0))), steps_applied
+
+    contrasted = lut[gray]
+    if denoise:
+        contrasted = median3x3(contrasted)
+        steps_applied.append('median_denoise')
+
+    if binarize and mode == 'otsu':
+        threshold = otsu_threshold(np.bincount(contrasted.ravel(), minlength=256))
+        contrasted = np.where(contrasted > threshold, np.uint8(255), np.uint8(0))
+        steps_applied.append(f'binarize_otsu_{threshold}')
+    elif binarize and mode == 'adaptive':
+        local_mean = box_mean(contrasted, adaptive_block_size)
+        contrasted = np.where(
+            contrasted.astype(np.int16) > local_mean - adaptive_offset,
+            np.uint8(255),
+            np.uint8(0),
+        )
+        steps_applied.append(f'binarize_adaptive_{adaptive_block_size}')
+
+    return Image.fromarray(np.ascontiguousarray(contrasted)), steps_applied
+
+
+def contrast_lut(histogram, factor):
+    """Lookup table matching ``ImageEnhance.Contrast`` for an image with ``histogram``."""
+    total = int(histogram.sum()) or 1
+    mean = int(float(np.dot(np.arange(256), histogram)) / total + 0.5)
+    ramp = Image.frombytes('L', (256, 1), bytes(range(256)))
+    # Blending against PIL itself keeps the rounding identical to the PIL chain.
+    blended = Image.blend(Image.new('L', (256, 1), mean), ramp, factor)
+    return np.frombuffer(blended.tobytes(), dtype=np.uint8).copy()
+
+
+def _neighbours(array):
+    padded = np.pad(array, 1, mode='edge')
+    height, width = array.shape
+    return [
+        padded[row:row + height, col:col + width]
+        for row in range(3)
+        for col in range(3)
+    ]
+
+
+def majority3x3(bits):
+    """3x3 median of a boolean image, i.e. at least five of nine neighbours set."""
+    votes = np.zeros(bits.shape, dtype=np.uint8)
+    for view in _neighbours(bits.view(np.uint8)):
+        votes += view
+    return votes >= 5
+
+
+def median3x3(array):
+    """3x3 median filter with edge replication, computed with a sorting network."""
+    values = _neighbours(array)
+    for low, high in _MEDIAN9_NETWORK:
+        values[low], values[high] = np.minimum(values[low], values[high]), np.maximum(values[low], values[high])
+    return values[4]
+
+
+def otsu_threshold(histogram):
+    """Return the grey level that maximises between-class variance."""
+    histogram = histogram.astype(np.float64)
+    total = histogram.sum()
+    if not total:
+        return 127
+    levels = np.arange(256)
+    weight_bg = np.cumsum(histogram)
+    weight_fg = total - weight_bg
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_bg = cumulative_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def box_mean(array, block_size):
+    """Mean over a ``block_size`` square around every pixel using an integral image."""
+    radius = max(int(block_size) // 2, 1)
+    padded = np.pad(array, radius + 1, mode='edge')
+    # uint32 wraps, but box sums are differences of prefix sums and stay exact modulo 2**32.
+    integral = padded.astype(np.uint32).cumsum(axis=0, dtype=np.uint32).cumsum(axis=1, dtype=np.uint32)
+    height, width = array.shape
+    size = 2 * radius + 1
+    top, left = 0, 0
+    bottom, right = top + size, left + size
+    sums = (
+        integral[bottom:bottom + height, right:right + width]
+        - integral[top:top + height, right:right + width]
+        - integral[bottom:bottom + height, left:left + width]
+        + integral[top:top + height, left:left + width]
+    )
+    return (sums // (size * size)).astype(np.int16)
@@ -2,22 +2,36 @@ import os
 import logging
 import re
 import json
+import time
+import statistics
+import subprocess
+import tempfile
+import multiprocessing
+from collections import Counter
+from contextlib import ExitStack
 from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from urllib import request
-from threading import Lock
+from threading import Event, Lock, local
 from PIL import Image
 from PIL import ImageEnhance, ImageFilter
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from google.cloud import vision
 from google.oauth2 import service_account
-import docx
-from docx.enum.text import WD_BREAK
-from docx.oxml.table import CT_Tbl
-from docx.oxml.text.paragraph import CT_P
-from docx.table import _Cell, Table
-from docx.text.paragraph import Paragraph
+
+from docx_text import iter_docx_pages
+from ocr_cache import get_ocr_cache, make_cache_key
+from ocr_health import record_provider_call, route_providers
+from tesseract_engine import get_tesseract_engine
+from text_ingest import iter_text_chunks
+from ocr_image_encoding import encode_page, share_encodings
+
+try:  # optional dependency – the PIL preprocessing chain is used without NumPy
+    import ocr_preprocessing
+except ImportError:  # pragma: no cover - numpy ships with requirements.txt
+    ocr_preprocessing = None
 
 
 LANGUAGE_HINTS = {
@@ -49,6 +63,15 @@ GARBAGE_PATTERNS = [
     r"\b(?:eee+|ccc+|000+)\b",
     r"[^\w\s]{3,}",
 ]
+# Each compiled pattern is paired with a cheap test that must hold for it to match at all.
+_GARBAGE_REGEXES = [
+    (re.compile(GARBAGE_PATTERNS[0]), lambda text, symbols, counts: '.' in counts),
+    (re.compile(GARBAGE_PATTERNS[1]), lambda text, symbols, counts: 'eee' in text or 'ccc' in text or '000' in text),
+    (re.compile(GARBAGE_PATTERNS[2]), lambda text, symbols, counts: symbols >= 3),
+]
+
+QUALITY_PUNCTUATION = ',.;:!?()/-'
+HUNGARIAN_DIACRITICS = 'áéíóöőúüűÁÉÍÓÖŐÚÜŰ'
 
 
 GOOGLE_SERVICE_ACCOUNT_FIELDS = [
@@ -69,6 +92,11 @@ GOOGLE_SERVICE_ACCOUNT_FIELDS = [
 _GOOGLE_VISION_CLIENT = None
 _GOOGLE_VISION_CLIENT_ERROR = None
 _GOOGLE_VISION_CLIENT_LOCK = Lock()
+_GOOGLE_VISION_BATCHER = None
+_GOOGLE_VISION_CONFIG_STATUS = None
+
+_OCR_PROCESS_POOL = None
+_OCR_PROCESS_POOL_LOCK = Lock()
 
 def extract_text_from_file(file_path, file_type):
     """
@@ -90,122 +118,589 @@ def extract_text_from_file(file_path, file_type):
         raise
 
 
+def iter_text_from_file(file_path, file_type):
+    """
+    Yield ``(page_index, text, total_pages)`` as pages of a document become available.
+
+    PDF pages arrive in completion order – text-layer pages first, then OCR results –
+    and ``total_pages`` is ``None`` while the page count is still unknown. Image frames
+    arrive the same way; other file types yield their whole text as a single page.
+    """
+    if file_type == 'pdf':
+        yield from iter_pdf_page_texts(file_path)
+    elif file_type == 'image':
+        yield from iter_image_page_texts(file_path)
+    else:
+        yield 0, extract_text_from_file(file_path, file_type), 1
+
+
+class ExtractedPages:
+    """Collects streamed pages and answers questions that only need part of the document."""
+
+    def __init__(self):
+        self.pages = {}
+        self.total = None
+
+    def add(self, index, text, total=None):
+        self.pages[index] = text if text and text.strip() else ''
+        if total is not None:
+            self.total = total
+
+    def finish(self):
+        self.total = max(self.pages) + 1 if self.pages else 0
+
+    def text(self):
+        return '\n\n'.join(filter(None, (self.pages[index] for index in sorted(self.pages))))
+
+    def _edge_words(self, count, indexes):
+        words = []
+        for index in indexes:
+            if index not in self.pages:
+                return None
+            page_words = self.pages[index].split()
+            words = words + page_words if indexes.step > 0 else page_words + words
+            if len(words) >= count:
+                return words[:count] if indexes.step > 0 else words[-count:]
+        return words
+
+    def leading_words(self, count):
+        """First ``count`` words of the final text, or ``None`` while they are not settled."""
+        if self.total is None:
+            indexes = range(0, max(self.pages, default=-1) + 2)
+        else:
+            indexes = range(0, self.total)
+        return self._edge_words(count, indexes)
+
+    def trailing_words(self, count):
+        """Last ``count`` words of the final text, or ``None`` while they are not settled."""
+        if self.total is None:
+            return None
+        return self._edge_words(count, range(self.total - 1, -1, -1))
+
+
 def extract_text_from_pdf(file_path):
     """
-    Extract text from PDF using OCR
+    Extract text from PDF, preferring the embedded text layer and OCR-ing only scanned pages
+    """
+    pages = ExtractedPages()
+    for index, text, total in iter_pdf_page_texts(file_path):
+        pages.add(index, text, total)
+
+    full_text = pages.text()
+    if not full_text.strip():
+        raise ValueError("Failed to process PDF file: No text could be extracted from the PDF")
+    return full_text
+
+
+def iter_pdf_page_texts(file_path, completed_pages=None):
+    """
+    Yield ``(page_index, text, total_pages)`` for a PDF as each page's text becomes available
+
+    ``completed_pages`` maps page indexes to text already extracted by an earlier,
+    interrupted run; those pages are yielded first and not OCR-ed again.
     """
     try:
-        images = convert_from_path(file_path, dpi=300)
+        completed_pages = completed_pages or {}
         selected_lang = determine_ocr_language(file_path)
         providers = get_ocr_provider_chain()
-
-        if not images:
+        layer_pages = extract_pdf_text_layer(file_path)
+        max_in_flight = get_pdf_max_in_flight_pages()
+        dpi_ladder = get_pdf_dpi_ladder()
+        page_numbers = None
+        page_label = "?"
+
+        if layer_pages is None:
+            page_count = get_pdf_page_count(file_path)
+            if page_count is not None:
+                page_label = page_count
+                page_numbers = [number for number in range(1, page_count + 1) if number - 1 not in completed_pages]
+            logging.info("PDF OCR of all pages starting with lang=%s", selected_lang)
+        else:
+            page_numbers = []
+            layer_texts = []
+            for index, layer_text in enumerate(layer_pages):
+                if index in completed_pages:
+                    continue
+                if is_text_layer_usable(layer_text):
+                    layer_texts.append((index, layer_text.strip()))
+                else:
+                    page_numbers.append(index + 1)
+            page_label = len(layer_pages)
+            logging.info(
+                "PDF contains %s pages – %s with usable text layer, %s checkpointed, %s need OCR",
+                len(layer_pages),
+                len(layer_texts),
+                len(completed_pages),
+                len(page_numbers),
+            )
+            if page_numbers:
+                logging.info("PDF OCR of %s pages starting with lang=%s", len(page_numbers), selected_lang)
+            for index, layer_text in layer_texts:
+                yield index, layer_text, page_label
+
+        for index in sorted(completed_pages):
+            yield index, completed_pages[index], page_label if page_label != "?" else None
+
+        def dpi_plan_for(page_number):
+            if len(dpi_ladder) < 2:
+                return None
+            return AdaptiveDpiPlan(file_path, page_number, dpi_ladder)
+
+        rendered_any = bool(completed_pages)
+        total_pages = page_label if page_label != "?" else None
+        if page_numbers is None or page_numbers:
+            results = iter_ocr_page_results(
+                lambda spool_dir, make_room: iter_pdf_page_images(
+                    file_path,
+                    page_numbers,
+                    dpi=dpi_ladder[0],
+                    window=max_in_flight,
+                    output_folder=spool_dir,
+                    before_render=make_room,
+                ),
+                selected_lang,
+                providers,
+                kind='PDF',
+                page_label=page_label,
+                max_in_flight=max_in_flight,
+                page_count=len(page_numbers) if page_numbers else None,
+                dpi_plan_for=dpi_plan_for,
+            )
+            for index, text, last_page in results:
+                rendered_any = True
+                if total_pages is None and last_page is not None:
+                    # The open-ended render stopped at the last page, so the count is now known.
+                    total_pages = last_page
+                yield index, text, total_pages
+
+        if layer_pages is None and not rendered_any:
             raise ValueError("No pages detected in the PDF document")
 
-        logging.info("PDF contains %s pages – starting OCR with lang=%s", len(images), selected_lang)
+    except Exception as e:
+        logging.error(f"Error processing PDF: {e}")
+        raise ValueError(f"Failed to process PDF file: {str(e)}")
+
+
+def get_pdf_page_count(file_path):
+    """Page count from poppler's pdfinfo, or ``None`` if it cannot be read."""
+    try:
+        return int(pdfinfo_from_path(file_path)['Pages'])
+    except Exception as info_error:
+        logging.info("PDF page count unavailable: %s", info_error)
+        return None
 
-        def process_page(task):
-            index, page_image = task
+
+def iter_ocr_page_results(open_page_stream, lang, providers, *, kind, page_label, max_in_flight,
+                          page_count=None, dpi_plan_for=None):
+    """
+    OCR the pages of one document concurrently and yield ``(page_index, text, last_page)``.
+
+    ``open_page_stream(spool_dir, make_room)`` must return an iterator of ``(page_number,
+    page)`` pairs (1-based); it is consumed lazily so that at most ``max_in_flight`` pages
+    are pending at once. A stream that renders several pages per call should call
+    ``make_room(count)`` first, which blocks until ``count`` more pages fit, so rendered
+    pages never outnumber ``max_in_flight`` either. In process mode ``spool_dir`` is a temporary directory and pages must be image
+    files inside it, otherwise it is ``None`` and pages are PIL images. ``last_page`` is
+    ``None`` while pages are still being produced and the number of the last page after.
+    """
+    use_process_pool = get_ocr_executor_mode() == 'process'
+    orientation_hint = OrientationHint()
+    pending = {}
+    ready = []
+    pool_of = {}
+
+    def make_room(count):
+        while pending and len(pending) + count > max_in_flight:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            ready.extend(collect(done))
+
+    def collect(done):
+        completed = []
+        for future in done:
+            index = pending.pop(future)
+            pool = pool_of.pop(future, None)
             try:
-                logging.info("Processing PDF page %s/%s", index + 1, len(images))
-                prepared = preprocess_image(page_image)
-                text, provider_meta = run_ocr_with_fallback(prepared, selected_lang, providers)
+                text, provider_meta = future.result()
+                if provider_meta.get('orientation_angle') is not None:
+                    # Pool workers cannot share the hint object; they report what OSD found.
+                    orientation_hint.set(provider_meta['orientation_angle'])
                 logging.info(
-                    "PDF page %s OCR via %s with quality %.3f",
+                    "%s page %s OCR via %s with quality %.3f (preprocess %.0f ms, ocr %.0f ms, "
+                    "upload encode %.0f ms, %s bytes)",
+                    kind,
                     index + 1,
                     provider_meta.get('provider', 'unknown'),
                     provider_meta.get('quality_score', 0.0),
+                    provider_meta.get('preprocess_ms', 0.0),
+                    provider_meta.get('ocr_ms', 0.0),
+                    provider_meta.get('encode_ms', 0.0),
+                    provider_meta.get('upload_bytes', 0),
                 )
-                return index, text
             except Exception as ocr_error:
-                logging.warning("OCR failed for page %s: %s", index + 1, ocr_error)
-                return index, ""
-
-        max_workers = min(len(images), os.cpu_count() or 1, 6) or 1
-        page_texts = [""] * len(images)
+                logging.warning("OCR failed for %s page %s: %s", kind, index + 1, ocr_error)
+                if isinstance(ocr_error, BrokenProcessPool):
+                    reset_ocr_process_pool(pool)
+                text = ""
+            completed.append((index, text if text and text.strip() else ""))
+        return completed
+
+    if dpi_plan_for is None:
+        def dpi_plan_for(page_number):
+            return None
+
+    with ExitStack() as stack:
+        if use_process_pool:
+            # Pages are spooled to disk and handed to workers by path, so bitmaps are
+            # never pickled between processes.
+            spool_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='contra-ocr-'))
+
+            def submit(page_number, page):
+                # The pool is looked up per page: once a worker dies the broken pool is
+                # reset and the rest of the document goes to its replacement.
+                args = (ocr_page_file, page, lang, providers, dpi_plan_for(page_number), orientation_hint.get())
+                pool = get_ocr_process_pool()
+                try:
+                    future = pool.submit(*args)
+                except BrokenProcessPool:
+                    reset_ocr_process_pool(pool)
+                    pool = get_ocr_process_pool()
+                    future = pool.submit(*args)
+                pool_of[future] = pool
+                return future
+        else:
+            spool_dir = None
+            max_workers = min(os.cpu_count() or 1, 6, max_in_flight)
+            if providers[:1] == ['google_vision'] and get_google_vision_batch_size() > 1:
+                # Vision calls are network-bound; enough concurrent pages must reach
+                # the batcher for one request to carry several of them.
+                max_workers = max_in_flight
+            if page_count:
+                max_workers = min(max_workers, page_count)
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers or 1))
+
+            def submit(page_number, page):
+                return executor.submit(
+                    ocr_page_image,
+                    page,
+                    lang,
+                    providers,
+                    orientation_hint,
+                    dpi_plan_for(page_number),
+                )
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(process_page, (idx, image)): idx
-                for idx, image in enumerate(images)
-            }
-            for future in as_completed(futures):
-                index, text = future.result()
-                if text and text.strip():
-                    page_texts[index] = text
+        last_page = None
+        for page_number, page in open_page_stream(spool_dir, make_room):
+            make_room(1)
+            while ready:
+                index, text = ready.pop(0)
+                yield index, text, None
+            logging.info("Processing %s page %s/%s", kind, page_number, page_label)
+            pending[submit(page_number, page)] = page_number - 1
+            del page
+            last_page = page_number
+        for index, text in ready:
+            yield index, text, last_page
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for index, text in collect(done):
+                yield index, text, last_page
+
+
+def ocr_page_image(image, lang, providers, orientation_hint=None, dpi_plan=None):
+    """
+    Preprocess and OCR a single page image, closing it once done.
 
-        full_text = '\n\n'.join(filter(None, page_texts))
+    With a ``dpi_plan`` the page arrives rendered at the plan's probe DPI; it is re-rendered
+    at the lowest DPI whose text size suits OCR, then at higher DPIs while quality stays low.
+    """
+    timings = {'preprocess_ms': 0.0, 'ocr_ms': 0.0}
 
-        if not full_text.strip():
-            raise ValueError("No text could be extracted from the PDF")
+    def run(page):
+        started = time.perf_counter()
+        prepared = preprocess_image(page, orientation_hint=orientation_hint)
+        preprocessed = time.perf_counter()
+        text, provider_meta = run_cached_ocr(prepared, lang, providers)
+        timings['preprocess_ms'] += (preprocessed - started) * 1000
+        timings['ocr_ms'] += (time.perf_counter() - preprocessed) * 1000
+        return text, provider_meta
 
-        return full_text
+    try:
+        if dpi_plan is None:
+            text, provider_meta = run(image)
+            return text, {**provider_meta, **timings}
+
+        dpi = dpi_plan.choose_initial_dpi(image)
+        if dpi != dpi_plan.probe_dpi:
+            image.close()
+            image = dpi_plan.render(dpi)
+
+        min_quality = _provider_min_quality('adaptive_dpi')
+        best = None
+        while True:
+            text, provider_meta = run(image)
+            provider_meta = {**provider_meta, 'dpi': dpi}
+            quality = provider_meta.get('quality_score', 0.0)
+            if best is None or quality > best[1].get('quality_score', 0.0):
+                best = (text, provider_meta)
+            next_dpi = dpi_plan.next_dpi(dpi)
+            if next_dpi is None or (text.strip() and quality >= min_quality):
+                break
+            logging.info(
+                "PDF page %s quality %.3f below %.3f at %s DPI – re-rendering at %s DPI",
+                dpi_plan.page_number,
+                quality,
+                min_quality,
+                dpi,
+                next_dpi,
+            )
+            image.close()
+            image = dpi_plan.render(next_dpi)
+            dpi = next_dpi
 
-    except Exception as e:
-        logging.error(f"Error processing PDF: {e}")
-        raise ValueError(f"Failed to process PDF file: {str(e)}")
+        text, provider_meta = best
+        return text, {**provider_meta, **timings}
+    finally:
+        image.close()
 
 
-def extract_text_from_docx(file_path):
+def ocr_page_file(path, lang, providers, dpi_plan=None, known_angle=None):
     """
-    Extract text from DOCX file
+    Process-pool entry point: OCR a page image spooled to disk, then delete the file.
+
+    ``known_angle`` is the document's rotation found on an earlier page, if any; the
+    angle this page settles on comes back as ``orientation_angle`` in the metadata.
     """
     try:
-        document = docx.Document(file_path)
+        image = Image.open(path)
+        image.load()
+        orientation_hint = OrientationHint()
+        orientation_hint.set(known_angle)
+        text, provider_meta = ocr_page_image(
+            image, lang, providers, orientation_hint=orientation_hint, dpi_plan=dpi_plan
+        )
+        return text, {**provider_meta, 'orientation_angle': orientation_hint.get()}
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_pdf_dpi_ladder():
+    """Return the ascending DPIs to rasterize PDF pages at; one entry means a fixed DPI."""
+    fixed_dpi = int(os.environ.get('OCR_PDF_DPI', '300'))
+    if (os.environ.get('OCR_PDF_DPI_MODE') or 'fixed').strip().lower() != 'adaptive':
+        return [fixed_dpi]
+    ladder = os.environ.get('OCR_PDF_DPI_LADDER') or '150,200,300'
+    steps = sorted({int(step) for step in ladder.split(',') if step.strip()})
+    return steps or [fixed_dpi]
+
+
+def estimate_line_height(image):
+    """Median height in pixels of the text lines found in the row ink profile, or ``None``."""
+    gray = image.convert('L')
+    rows = gray.resize((1, gray.size[1]), Image.Resampling.BOX).tobytes()
+    min_ink = int(os.environ.get('OCR_ADAPTIVE_DPI_ROW_INK', '8'))
+    runs = []
+    run_length = 0
+    for value in rows:
+        if 255 - value > min_ink:
+            run_length += 1
+        elif run_length:
+            runs.append(run_length)
+            run_length = 0
+    if run_length:
+        runs.append(run_length)
+    # Ignore one-row specks and full-height blocks such as photos or borders.
+    runs = [length for length in runs if 2 < length < gray.size[1] // 4]
+    if len(runs) < 3:
+        return None
+    return statistics.median(runs)
+
+
+class AdaptiveDpiPlan:
+    """Rendering ladder for one PDF page that was first rasterized at a low probe DPI."""
+
+    def __init__(self, file_path, page_number, ladder):
+        self.file_path = file_path
+        self.page_number = page_number
+        self.ladder = sorted(ladder)
+
+    @property
+    def probe_dpi(self):
+        return self.ladder[0]
+
+    def choose_initial_dpi(self, probe_image):
+        target = float(os.environ.get('OCR_ADAPTIVE_DPI_TARGET_LINE_PX', '32'))
+        line_height = estimate_line_height(probe_image)
+        if not line_height:
+            return self.probe_dpi
+        needed = self.probe_dpi * target / line_height
+        for dpi in self.ladder:
+            if dpi >= needed:
+                return dpi
+        return self.ladder[-1]
+
+    def next_dpi(self, dpi):
+        for candidate in self.ladder:
+            if candidate > dpi:
+                return candidate
+        return None
+
+    def render(self, dpi):
+        images = convert_from_path(
+            self.file_path, dpi=dpi, first_page=self.page_number, last_page=self.page_number
+        )
+        if not images:
+            raise ValueError(f"Page {self.page_number} could not be rendered from the PDF document")
+        return images[0]
+
+
+def get_ocr_executor_mode():
+    mode = (os.environ.get('OCR_EXECUTOR') or 'thread').strip().lower()
+    if mode not in {'thread', 'process'}:
+        logging.warning("Unknown OCR_EXECUTOR '%s', falling back to thread", mode)
+        return 'thread'
+    return mode
+
+
+def get_ocr_process_pool_size():
+    configured = os.environ.get('OCR_PROCESS_POOL_WORKERS')
+    if configured:
+        return max(int(configured), 1)
+    return os.cpu_count() or 1
+
+
+def get_ocr_process_pool():
+    """Return the process pool shared by all documents OCR-ed in this process."""
+    global _OCR_PROCESS_POOL
+    with _OCR_PROCESS_POOL_LOCK:
+        if _OCR_PROCESS_POOL is None:
+            start_method = (os.environ.get('OCR_PROCESS_POOL_START_METHOD') or 'spawn').strip()
+            workers = get_ocr_process_pool_size()
+            _OCR_PROCESS_POOL = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+            )
+            logging.info("Started OCR process pool with %s workers (%s)", workers, start_method)
+        return _OCR_PROCESS_POOL
 
-        def iter_block_items(parent):
-            if isinstance(parent, _Cell):
-                parent_element = parent._tc
-            else:
-                parent_element = parent.element.body
-            for child in parent_element.iterchildren():
-                if isinstance(child, CT_P):
-                    yield Paragraph(child, parent)
-                elif isinstance(child, CT_Tbl):
-                    yield Table(child, parent)
-
-        pages = []
-        current_parts = []
-
-        def push_page():
-            combined = '\n'.join(part for part in current_parts if part)
-            if combined.strip():
-                pages.append(combined)
-            current_parts.clear()
-
-        for block in iter_block_items(document):
-            if isinstance(block, Paragraph):
-                text = block.text.strip()
-                if text:
-                    current_parts.append(text)
-                has_page_break = any(
-                    getattr(run, "break_type", None) == WD_BREAK.PAGE
-                    for run in block.runs
-                )
-                if has_page_break:
-                    push_page()
-            elif isinstance(block, Table):
-                table_lines = []
-                for row in block.rows:
-                    row_text = [cell.text.strip() for cell in row.cells if cell.text.strip()]
-                    if row_text:
-                        table_lines.append(' | '.join(row_text))
-                if table_lines:
-                    current_parts.append('\n'.join(table_lines))
-
-        push_page()
-
-        if not pages:
-            raise ValueError("No text could be extracted from the DOCX file")
 
-        max_workers = min(len(pages), os.cpu_count() or 1, 6) or 1
-        if max_workers > 1:
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                processed_pages = list(executor.map(lambda page: page.strip(), pages))
+def reset_ocr_process_pool(broken_pool=None):
+    """
+    Drop a broken process pool so the next page starts a fresh one.
+
+    With ``broken_pool`` the shared pool is only dropped while it is still that pool, so
+    late failures from a pool that was already replaced leave its successor running.
+    """
+    global _OCR_PROCESS_POOL
+    with _OCR_PROCESS_POOL_LOCK:
+        if broken_pool is not None and _OCR_PROCESS_POOL is not broken_pool:
+            return
+        pool, _OCR_PROCESS_POOL = _OCR_PROCESS_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_pdf_max_in_flight_pages():
+    configured = os.environ.get('OCR_PDF_MAX_IN_FLIGHT_PAGES')
+    if configured:
+        return max(int(configured), 1)
+    if get_ocr_executor_mode() == 'process':
+        return get_ocr_process_pool_size()
+    return max(4, get_google_vision_batch_size())
+
+
+def iter_pdf_page_images(file_path, page_numbers=None, dpi=300, window=4, output_folder=None,
+                         before_render=None):
+    """
+    Yield ``(page_number, page)`` pairs, rasterizing at most ``window`` pages per poppler call.
+
+    ``page_numbers`` are 1-based; when omitted every page is rendered until the document
+    is exhausted. Pages are PIL images that the consumer should close once OCR is done,
+    or file paths inside ``output_folder`` when one is given. ``before_render(count)`` is
+    called ahead of every poppler call with the number of pages it will produce.
+    """
+    window = max(int(window), 1)
+    render_options = {}
+    if output_folder:
+        render_options = {'output_folder': output_folder, 'paths_only': True, 'fmt': 'ppm'}
+
+    if page_numbers is None:
+        first_page = 1
+        while True:
+            last_page = first_page + window - 1
+            if before_render:
+                before_render(window)
+            batch = convert_from_path(
+                file_path, dpi=dpi, first_page=first_page, last_page=last_page, **render_options
+            )
+            for offset in range(len(batch)):
+                page, batch[offset] = batch[offset], None
+                yield first_page + offset, page
+            if len(batch) < window:
+                return
+            first_page = last_page + 1
+
+    runs = []
+    for page_number in page_numbers:
+        if runs and page_number == runs[-1][-1] + 1 and len(runs[-1]) < window:
+            runs[-1].append(page_number)
         else:
-            processed_pages = [page.strip() for page in pages]
+            runs.append([page_number])
+
+    for run in runs:
+        if before_render:
+            before_render(len(run))
+        batch = convert_from_path(file_path, dpi=dpi, first_page=run[0], last_page=run[-1], **render_options)
+        if len(batch) < len(run):
+            raise ValueError(f"Pages {run[0]}-{run[-1]} could not be rendered from the PDF document")
+        for offset, page_number in enumerate(run):
+            page, batch[offset] = batch[offset], None
+            yield page_number, page
 
-        full_text = '\n\n'.join(filter(None, processed_pages))
+
+def extract_pdf_text_layer(file_path):
+    """
+    Return the embedded text of every PDF page via poppler's pdftotext.
+
+    Returns ``None`` when the probe is disabled or pdftotext cannot read the file,
+    in which case every page is rasterized and OCR-ed.
+    """
+    if not should_enable_preprocessing_step('OCR_ENABLE_TEXT_LAYER', True):
+        return None
+
+    timeout = float(os.environ.get('OCR_TEXT_LAYER_TIMEOUT', '30'))
+    try:
+        result = subprocess.run(
+            ['pdftotext', '-enc', 'UTF-8', file_path, '-'],
+            capture_output=True,
+            timeout=timeout,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError) as probe_error:
+        logging.info("PDF text layer probe skipped: %s", probe_error)
+        return None
+
+    # pdftotext terminates every page with a form feed, so the final chunk is empty.
+    pages = result.stdout.decode('utf-8', errors='ignore').split('\f')[:-1]
+    return pages or None
+
+
+def is_text_layer_usable(text):
+    min_chars = int(os.environ.get('OCR_TEXT_LAYER_MIN_CHARS', '20'))
+    stripped = (text or '').strip()
+    if len(stripped) < min_chars:
+        return False
+    return calculate_text_quality(stripped) >= _provider_min_quality('text_layer')
+
+
+def extract_text_from_docx(file_path):
+    """
+    Extract text from DOCX file
+    """
+    try:
+        full_text = '\n\n'.join(iter_docx_pages(file_path))
 
         if not full_text.strip():
             raise ValueError("No text could be extracted from the DOCX file")
@@ -219,62 +714,150 @@ def extract_text_from_docx(file_path):
 
 def extract_text_from_image(file_path):
     """
-    Extract text from image using OCR
+    Extract text from every frame of an image using OCR
+    """
+    pages = ExtractedPages()
+    for index, text, total in iter_image_page_texts(file_path):
+        pages.add(index, text, total)
+
+    full_text = pages.text()
+    if not full_text.strip():
+        raise ValueError("Failed to process image file: No text could be extracted from the image")
+    return full_text
+
+
+def iter_image_page_texts(file_path):
+    """
+    Yield ``(page_index, text, total_pages)`` for each frame, or tile of a frame, of an image
     """
     try:
-        image = Image.open(file_path)
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
         selected_lang = determine_ocr_language(file_path)
-        providers = get_ocr_provider_chain()
-        prepared = preprocess_image(image)
-        text, provider_meta = run_ocr_with_fallback(prepared, selected_lang, providers)
-
-        logging.info(
-            "Image OCR via %s with language %s and quality %.3f",
-            provider_meta.get('provider', 'unknown'),
+        logging.info("Image OCR starting with lang=%s", selected_lang)
+        total_pages = None
+        produced_any = False
+        results = iter_ocr_page_results(
+            lambda spool_dir, make_room: iter_image_pages(file_path, output_folder=spool_dir),
             selected_lang,
-            provider_meta.get('quality_score', 0.0),
+            get_ocr_provider_chain(),
+            kind='Image',
+            page_label='?',
+            max_in_flight=get_pdf_max_in_flight_pages(),
         )
-        
-        if not text.strip():
-            raise ValueError("No text could be extracted from the image")
+        for index, text, last_page in results:
+            produced_any = True
+            if last_page is not None:
+                total_pages = last_page
+            yield index, text, total_pages
 
-        return text
+        if not produced_any:
+            raise ValueError("No frames detected in the image")
 
     except Exception as e:
         logging.error(f"Error processing image: {e}")
         raise ValueError(f"Failed to process image file: {str(e)}")
 
 
+def iter_image_pages(file_path, output_folder=None):
+    """
+    Yield ``(page_number, page)`` for every frame of an image file, e.g. a multi-page fax TIFF.
+
+    Frames are decoded at no more than ``OCR_IMAGE_MAX_SHORT_SIDE`` pixels on their short
+    side and cut into pages along blank rows (or columns) when their long side exceeds
+    ``OCR_IMAGE_TILE_MAX_SIDE``. Pages are PIL images, or PPM files inside
+    ``output_folder`` when one is given.
+    """
+    max_short_side = int(os.environ.get('OCR_IMAGE_MAX_SHORT_SIDE', '3000'))
+    tile_max_side = int(os.environ.get('OCR_IMAGE_TILE_MAX_SIDE', '4500'))
+    page_number = 0
+    with Image.open(file_path) as image:
+        for frame_index in range(getattr(image, 'n_frames', 1)):
+            image.seek(frame_index)
+            frame = load_image_at_useful_resolution(image, max_short_side)
+            for tile in split_image_into_tiles(frame, tile_max_side):
+                page_number += 1
+                if output_folder:
+                    path = os.path.join(output_folder, f'page-{page_number:05d}.ppm')
+                    (tile if tile.mode in {'1', 'L', 'RGB'} else tile.convert('RGB')).save(path)
+                    tile.close()
+                    tile = path
+                yield page_number, tile
+
+
+def load_image_at_useful_resolution(image, max_short_side):
+    """
+    Return the current frame of ``image`` scaled so its short side is at most ``max_short_side``.
+
+    JPEGs are decoded through ``Image.draft``, which lets libjpeg scale by 1/2-1/8 while
+    decoding, so a large photo is never expanded at full size. Frames with non-square
+    pixels (fax TIFFs at 204x98 DPI) are stretched to square pixels.
+    """
+    width, height = image.size
+    x_dpi, y_dpi = (float(value) for value in image.info.get('dpi') or (0, 0))
+    if x_dpi > 0 and y_dpi > 0 and abs(x_dpi - y_dpi) > 1:
+        if x_dpi > y_dpi:
+            height *= x_dpi / y_dpi
+        else:
+            width *= y_dpi / x_dpi
+    scale = min(max_short_side / max(min(width, height), 1), 1.0) if max_short_side > 0 else 1.0
+    target = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+    if target == image.size:
+        image.load()
+        return image.copy()
+
+    if image.format == 'JPEG':
+        image.draft(image.mode, target)
+    if image.mode in {'1', 'P'}:
+        # Both would be resized with nearest-neighbour sampling, which drops thin strokes.
+        image = image.convert('L' if image.mode == '1' else 'RGB')
+    return image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def split_image_into_tiles(image, max_side):
+    """
+    Yield pages of at most ``max_side`` pixels along the long axis of ``image``.
+
+    Each cut is placed on the blankest row (or column) in the last tenth of the tile, so
+    text lines are not sliced in half. ``image`` itself is yielded when it already fits.
+    """
+    width, height = image.size
+    vertical = height >= width
+    length = height if vertical else width
+    if max_side <= 0 or length <= max_side:
+        yield image
+        return
+
+    gray = image.convert('L')
+    profile = gray.resize((1, height) if vertical else (width, 1), Image.Resampling.BOX).tobytes()
+    gray.close()
+    search = max(max_side // 10, 1)
+    start = 0
+    while length - start > max_side:
+        end = start + max_side
+        cut = max(range(end - search, end), key=lambda offset: (profile[offset], offset))
+        yield image.crop((0, start, width, cut) if vertical else (start, 0, cut, height))
+        start = cut
+    yield image.crop((0, start, width, height) if vertical else (start, 0, width, height))
+    image.close()
+
+
 def extract_text_from_txt(file_path):
     """
     Extract text from TXT file
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
+        text = ''.join(iter_text_chunks(file_path))
 
         if not text.strip():
             raise ValueError("The text file is empty")
 
         return text
 
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='latin-1') as file:
-                text = file.read()
-            return text
-        except Exception as e:
-            logging.error(f"Error reading text file with latin-1: {e}")
-            raise ValueError(f"Failed to read text file: {str(e)}")
     except Exception as e:
         logging.error(f"Error processing text file: {e}")
         raise ValueError(f"Failed to process text file: {str(e)}")
 
 
-def preprocess_image(image):
+def preprocess_image(image, orientation_hint=None):
     """
     Preprocess image for better OCR results.
     """
@@ -284,24 +867,38 @@ def preprocess_image(image):
 
         steps_applied = []
         if should_enable_preprocessing_step('OCR_ENABLE_AUTOROTATE', True):
-            image = auto_orient_image(image)
+            image = auto_orient_image(image, orientation_hint)
             steps_applied.append('autorotate')
 
-        gray = image.convert('L')
-        steps_applied.append('grayscale')
-
         contrast_factor = float(os.environ.get('OCR_CONTRAST_FACTOR', '1.6'))
-        gray = ImageEnhance.Contrast(gray).enhance(contrast_factor)
-        steps_applied.append(f'contrast_{contrast_factor}')
+        threshold = int(os.environ.get('OCR_BINARY_THRESHOLD', '170'))
+
+        if get_preprocess_engine() == 'numpy':
+            gray, array_steps = ocr_preprocessing.preprocess_grayscale(
+                image,
+                contrast_factor=contrast_factor,
+                denoise=should_enable_preprocessing_step('OCR_ENABLE_DENOISE', True),
+                binarize=should_enable_preprocessing_step('OCR_ENABLE_BINARIZE', True),
+                threshold=threshold,
+                mode=get_binarize_mode(),
+                adaptive_block_size=int(os.environ.get('OCR_ADAPTIVE_BLOCK_SIZE', '31')),
+                adaptive_offset=int(os.environ.get('OCR_ADAPTIVE_OFFSET', '10')),
+            )
+            steps_applied.extend(array_steps)
+        else:
+            gray = image.convert('L')
+            steps_applied.append('grayscale')
 
-        if should_enable_preprocessing_step('OCR_ENABLE_DENOISE', True):
-            gray = gray.filter(ImageFilter.MedianFilter(size=3))
-            steps_applied.append('median_denoise')
+            gray = ImageEnhance.Contrast(gray).enhance(contrast_factor)
+            steps_applied.append(f'contrast_{contrast_factor}')
 
-        if should_enable_preprocessing_step('OCR_ENABLE_BINARIZE', True):
-            threshold = int(os.environ.get('OCR_BINARY_THRESHOLD', '170'))
-            gray = gray.point(lambda p: 255 if p > threshold else 0)
-            steps_applied.append(f'binarize_{threshold}')
+            if should_enable_preprocessing_step('OCR_ENABLE_DENOISE', True):
+                gray = gray.filter(ImageFilter.MedianFilter(size=3))
+                steps_applied.append('median_denoise')
+
+            if should_enable_preprocessing_step('OCR_ENABLE_BINARIZE', True):
+                gray = gray.point(lambda p: 255 if p > threshold else 0)
+                steps_applied.append(f'binarize_{threshold}')
 
         if should_enable_preprocessing_step('OCR_ENABLE_UPSCALE', True):
             min_side = int(os.environ.get('OCR_UPSCALE_MIN_SIDE', '1400'))
@@ -311,6 +908,10 @@ def preprocess_image(image):
                 gray = gray.resize((int(width * scale), int(height * scale)), Image.Resampling.LANCZOS)
                 steps_applied.append(f'upscale_{scale:.2f}x')
 
+        # Lets upload encoders write 1-bit images without re-scanning the pixels.
+        gray.info['bilevel'] = any(step.startswith('binarize') for step in steps_applied) and not any(
+            step.startswith('upscale') for step in steps_applied
+        )
         logging.info("OCR preprocessing steps: %s", ', '.join(steps_applied))
         return gray
     except Exception as e:
@@ -318,23 +919,148 @@ def preprocess_image(image):
         return image
 
 
+def get_preprocess_engine():
+    engine = (os.environ.get('OCR_PREPROCESS_ENGINE') or 'pil').strip().lower()
+    if engine == 'numpy' and ocr_preprocessing is None:
+        logging.warning("OCR_PREPROCESS_ENGINE=numpy requested but NumPy is unavailable; using PIL")
+        return 'pil'
+    return 'numpy' if engine == 'numpy' else 'pil'
+
+
+def get_binarize_mode():
+    mode = (os.environ.get('OCR_BINARIZE_MODE') or 'fixed').strip().lower()
+    if ocr_preprocessing is not None and mode not in ocr_preprocessing.BINARIZE_MODES:
+        logging.warning("Unknown OCR_BINARIZE_MODE '%s', falling back to fixed", mode)
+        return 'fixed'
+    return mode
+
+
 def should_enable_preprocessing_step(env_name, default=False):
     truthy = {'1', 'true', 'yes', 'on'}
     fallback = 'true' if default else 'false'
     return (os.environ.get(env_name, fallback) or fallback).strip().lower() in truthy
 
 
-def auto_orient_image(image):
-    """Rotate image based on OCR orientation metadata when available."""
+class OrientationHint:
+    """Rotation confirmed by OSD for one document, reused by its later pages."""
+
+    def __init__(self):
+        self.angle = None
+        self._lock = Lock()
+
+    def get(self):
+        with self._lock:
+            return self.angle
+
+    def set(self, angle):
+        with self._lock:
+            self.angle = angle
+
+
+def get_orientation_mode():
+    mode = (os.environ.get('OCR_ORIENTATION_MODE') or 'fast').strip().lower()
+    return mode if mode in {'fast', 'osd'} else 'fast'
+
+
+def estimate_text_layout(image):
+    """
+    Classify text lines from projection profiles of a thumbnail.
+
+    Returns ``'upright'`` (lines run horizontally, 0° or 180°), ``'sideways'`` (90° or 270°),
+    ``'blank'`` when the page has almost no ink, or ``None`` when the profiles are inconclusive.
+    """
+    side = int(os.environ.get('OCR_ORIENTATION_THUMBNAIL_SIDE', '512'))
+    thumbnail = image.convert('L')
+    thumbnail.thumbnail((side, side))
+    width, height = thumbnail.size
+
+    def ink_profile(size):
+        profile = [255 - value for value in thumbnail.resize(size, Image.Resampling.BOX).tobytes()]
+        inked = [index for index, value in enumerate(profile) if value > 2]
+        if not inked:
+            return []
+        return profile[inked[0]:inked[-1] + 1]
+
+    rows = ink_profile((1, height))
+    columns = ink_profile((width, 1))
+    if len(rows) < 8 or len(columns) < 8:
+        return 'blank'
+
+    def variation(profile):
+        return statistics.pstdev(profile) / (statistics.fmean(profile) + 1e-6)
+
+    ratio = float(os.environ.get('OCR_ORIENTATION_CONFIDENCE_RATIO', '1.5'))
+    row_variation = variation(rows)
+    column_variation = variation(columns)
+    if row_variation >= column_variation * ratio:
+        return 'upright'
+    if column_variation >= row_variation * ratio:
+        return 'sideways'
+    return None
+
+
+def detect_orientation_with_osd(image):
     try:
-        osd = pytesseract.image_to_osd(image)
-        match = re.search(r"Rotate:\s+(\d+)", osd)
-        if match:
-            angle = int(match.group(1)) % 360
-            if angle:
-                return image.rotate(-angle, expand=True)
+        return get_tesseract_engine().detect_rotation(image)
     except Exception as orientation_error:
         logging.debug("OSD orientation detection skipped: %s", orientation_error)
+    return None
+
+
+def _osd_sample(image):
+    """Central band of the page, downscaled, for a quick OSD call."""
+    side = int(os.environ.get('OCR_ORIENTATION_OSD_SIDE', '1024'))
+    width, height = image.size
+    sample = image.crop((0, height // 4, width, height - height // 4))
+    sample.thumbnail((side, side))
+    return sample
+
+
+def _layout_for_angle(angle):
+    return 'sideways' if angle in {90, 270} else 'upright'
+
+
+def auto_orient_image(image, orientation_hint=None):
+    """
+    Rotate image upright.
+
+    ``osd`` mode runs Tesseract OSD on the whole page. ``fast`` mode skips blank pages
+    and first runs OSD on a downscaled band of the page (projection profiles alone
+    cannot tell 0° from 180°), discarding an answer that contradicts the page's line
+    direction; full-page OSD runs only when the band is inconclusive. The rotation
+    found earlier in the document is a last resort when OSD cannot decide, and only
+    if the page's line direction agrees with it.
+    """
+    started = time.perf_counter()
+    angle = None
+    method = 'osd'
+    layout = None
+
+    if get_orientation_mode() == 'fast':
+        layout = estimate_text_layout(image)
+        if layout == 'blank':
+            angle, method = 0, 'blank'
+        else:
+            angle, method = detect_orientation_with_osd(_osd_sample(image)), 'osd_sample'
+            if angle is not None and layout is not None and _layout_for_angle(angle) != layout:
+                angle, method = None, 'osd'
+
+    if angle is None:
+        angle = detect_orientation_with_osd(image)
+        known_angle = orientation_hint.get() if orientation_hint is not None else None
+        if angle is None and known_angle is not None and layout == _layout_for_angle(known_angle):
+            angle, method = known_angle, 'document'
+    if angle is not None and method != 'blank' and orientation_hint is not None:
+        orientation_hint.set(angle)
+
+    logging.info(
+        "Page orientation %s° via %s in %.1f ms",
+        angle or 0,
+        method,
+        (time.perf_counter() - started) * 1000,
+    )
+    if angle:
+        return image.rotate(-angle, expand=True)
     return image
 
 
@@ -402,81 +1128,331 @@ def should_force_ocr_provider_failures():
     return (os.environ.get('OCR_STRICT_PROVIDER', 'false') or 'false').strip().lower() in truthy
 
 
-def run_ocr_with_fallback(image, lang, providers):
-    best_text = ''
-    best_meta = {'provider': 'none', 'quality_score': 0.0, 'reason': 'no_provider_ran', 'text_length': 0}
-    strict_mode = should_force_ocr_provider_failures()
+# Reasons run_ocr_with_fallback gives for a result that passed its provider's checks;
+# anything else is a best-effort fallback (e.g. Tesseract during a Vision outage).
+_ACCEPTED_OCR_REASONS = {'google_vision_text_found', 'quality_threshold_met'}
 
-    if 'google_vision' in providers:
-        verify_google_vision_configuration()
+# Metadata describing one provider call rather than the page; it is not stored in the cache.
+_PER_CALL_OCR_META = ('upload_format', 'upload_bytes', 'encode_ms', 'encode_cached', 'race', 'race_ms')
+
+
+def _page_ocr_meta(provider_meta):
+    return {key: value for key, value in provider_meta.items() if key not in _PER_CALL_OCR_META}
+
+
+def _tesseract_settings():
+    return (
+        os.environ.get('OCR_TESSERACT_PSM', '6'),
+        os.environ.get('OCR_TESSERACT_OEM', '3'),
+    )
+
+
+def _ocr_cache_settings(providers):
+    if 'tesseract' not in providers:
+        return ()
+    psm, oem = _tesseract_settings()
+    return (f'psm={psm}', f'oem={oem}', f'engine={get_tesseract_engine().name}')
+
+
+def run_cached_ocr(image, lang, providers):
+    """Run the provider chain, reusing a stored result for identical preprocessed pages.
+
+    Only accepted results are stored; a below-threshold fallback is returned but run
+    again next time, when the preferred provider may be back. Upload and race details of
+    the original call are not stored, so a hit reports no encode time or upload.
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return run_ocr_with_fallback(image, lang, providers)
+
+    try:
+        cache_key = make_cache_key(image, lang, providers, _ocr_cache_settings(providers))
+        cached = cache.get(cache_key)
+    except Exception as cache_error:
+        logging.warning("OCR cache lookup failed: %s", cache_error)
+        return run_ocr_with_fallback(image, lang, providers)
+
+    if cached is not None:
+        text, provider_meta = cached
+        logging.info("OCR cache hit (provider=%s)", provider_meta.get('provider', 'unknown'))
+        return text, {**_page_ocr_meta(provider_meta), 'cache': 'hit', 'encode_ms': 0.0, 'upload_bytes': 0}
+
+    text, provider_meta = run_ocr_with_fallback(image, lang, providers)
+    if text and text.strip() and provider_meta.get('reason') in _ACCEPTED_OCR_REASONS:
+        try:
+            cache.put(cache_key, text, _page_ocr_meta(provider_meta))
+        except Exception as cache_error:
+            logging.warning("OCR cache store failed: %s", cache_error)
+    return text, provider_meta
+
+
+def get_ocr_provider_mode():
+    mode = (os.environ.get('OCR_PROVIDER_MODE') or 'sequential').strip().lower()
+    return mode if mode in {'sequential', 'race'} else 'sequential'
+
+
+def _provider_deadline(provider):
+    specific = os.environ.get(f'OCR_PROVIDER_DEADLINE_{provider.upper()}')
+    if specific is not None:
+        return float(specific)
+    return float(os.environ.get('OCR_PROVIDER_DEADLINE', '30'))
 
+
+# Race mode caps each provider's own network/process timeout at its race deadline,
+# so abandoned calls free their worker instead of running to the provider default.
+_RACE_CALL = local()
+
+
+def _call_timeout(default):
+    deadline = getattr(_RACE_CALL, 'timeout', None)
+    return default if deadline is None else min(default, deadline)
+
+
+def _run_race_call(provider, image, lang, started_at):
+    started_at.append(time.perf_counter())
+    _RACE_CALL.timeout = _provider_deadline(provider)
+    try:
+        return _run_ocr_provider(provider, image, lang)
+    finally:
+        _RACE_CALL.timeout = None
+
+
+def _run_ocr_provider(provider, image, lang):
+    started = time.perf_counter()
+    if provider == 'tesseract':
+        text, provider_meta = run_tesseract_ocr(image, lang)
+    elif provider == 'google_vision':
+        text, provider_meta = run_google_vision_ocr(image, lang)
+    elif provider == 'ocr_space':
+        text, provider_meta = run_ocr_space_ocr(image, lang)
+    else:
+        raise ValueError(f"Unknown OCR provider '{provider}'")
+    record_provider_call(
+        provider,
+        provider_meta.get('status', 'unknown'),
+        (time.perf_counter() - started) * 1000,
+        provider_meta.get('error', ''),
+    )
+    return text, provider_meta
+
+
+def _known_ocr_providers(providers):
+    known = []
     for provider in providers:
-        text = ''
-        provider_meta = {'provider': provider, 'status': 'unknown', 'reason': 'unknown', 'error': ''}
-        if provider == 'tesseract':
-            text, provider_meta = run_tesseract_ocr(image, lang)
-        elif provider == 'google_vision':
-            text, provider_meta = run_google_vision_ocr(image, lang)
-        elif provider == 'ocr_space':
-            text, provider_meta = run_ocr_space_ocr(image, lang)
+        if provider in {'tesseract', 'google_vision', 'ocr_space'}:
+            known.append(provider)
         else:
             logging.warning("Unknown OCR provider '%s' in OCR_PROVIDER_CHAIN", provider)
-            continue
+    return known
+
+
+def _evaluate_ocr_result(provider, text, provider_meta, strict_mode):
+    """Log a provider result and return ``(quality, accept_reason)``; ``None`` means fall back."""
+    quality = calculate_text_quality(text)
+    reason = provider_meta.get('reason', 'unknown')
+    logging.info(
+        "OCR provider=%s status=%s text_length=%s quality=%.3f reason=%s",
+        provider,
+        provider_meta.get('status', 'unknown'),
+        len((text or '').strip()),
+        quality,
+        reason,
+    )
+
+    if strict_mode and provider_meta.get('status') not in {'ok', 'skipped'}:
+        raise RuntimeError(
+            f"OCR strict mode is enabled and provider '{provider}' failed: "
+            f"{provider_meta.get('status')} ({provider_meta.get('error') or provider_meta.get('reason')})"
+        )
+
+    if provider == 'google_vision' and text.strip() and provider_meta.get('status') == 'ok':
+        return quality, 'google_vision_text_found'
 
-        quality = calculate_text_quality(text)
-        text_length = len((text or '').strip())
-        reason = provider_meta.get('reason', 'unknown')
+    min_quality = _provider_min_quality(provider)
+    if text.strip() and quality >= min_quality:
+        return quality, 'quality_threshold_met'
+
+    if not text.strip():
+        logging.info("OCR fallback from provider=%s due to reason=empty_text", provider)
+    else:
         logging.info(
-            "OCR provider=%s status=%s text_length=%s quality=%.3f reason=%s",
+            "OCR fallback from provider=%s due to reason=quality_below_threshold (%.3f < %.3f)",
             provider,
-            provider_meta.get('status', 'unknown'),
-            text_length,
             quality,
-            reason,
+            min_quality,
         )
+    return quality, None
+
+
+def _tally_upload(totals, provider_meta):
+    """Accumulate the upload encode time and size that cloud providers report per page."""
+    if 'upload_bytes' in provider_meta:
+        totals['encode_ms'] = totals.get('encode_ms', 0.0) + provider_meta.get('encode_ms', 0.0)
+        totals['upload_bytes'] = totals.get('upload_bytes', 0) + provider_meta['upload_bytes']
+    return totals
+
+
+def run_ocr_with_fallback(image, lang, providers):
+    if 'google_vision' in providers:
+        ensure_google_vision_configuration()
+    providers = route_providers(_known_ocr_providers(providers))
+
+    if get_ocr_provider_mode() == 'race':
+        return run_ocr_race(image, lang, providers)
+
+    best_text = ''
+    best_meta = {'provider': 'none', 'quality_score': 0.0, 'reason': 'no_provider_ran', 'text_length': 0}
+    strict_mode = should_force_ocr_provider_failures()
+    uploads = {}
+
+    for provider in providers:
+        text, provider_meta = _run_ocr_provider(provider, image, lang)
+        _tally_upload(uploads, provider_meta)
+        quality, accept_reason = _evaluate_ocr_result(provider, text, provider_meta, strict_mode)
 
         if quality > best_meta['quality_score']:
             best_text = text
             best_meta = {
                 'provider': provider,
                 'quality_score': quality,
-                'reason': reason,
-                'text_length': text_length,
+                'reason': provider_meta.get('reason', 'unknown'),
+                'text_length': len((text or '').strip()),
                 'status': provider_meta.get('status', 'unknown'),
             }
 
-        if strict_mode and provider_meta.get('status') not in {'ok', 'skipped'}:
-            raise RuntimeError(
-                f"OCR strict mode is enabled and provider '{provider}' failed: "
-                f"{provider_meta.get('status')} ({provider_meta.get('error') or provider_meta.get('reason')})"
-            )
+        if accept_reason:
+            return text, {'provider': provider, 'quality_score': quality, 'reason': accept_reason, **uploads}
 
-        if provider == 'google_vision' and text.strip() and provider_meta.get('status') == 'ok':
-            return text, {'provider': provider, 'quality_score': quality, 'reason': 'google_vision_text_found'}
+    return best_text, {**best_meta, **uploads}
 
-        min_quality = _provider_min_quality(provider)
-        if text.strip() and quality >= min_quality:
-            return text, {'provider': provider, 'quality_score': quality, 'reason': 'quality_threshold_met'}
 
-        if not text.strip():
-            logging.info("OCR fallback from provider=%s due to reason=empty_text", provider)
-        else:
-            logging.info(
-                "OCR fallback from provider=%s due to reason=quality_below_threshold (%.3f < %.3f)",
-                provider,
-                quality,
-                min_quality,
-            )
+_OCR_RACE_EXECUTOR = None
+_OCR_RACE_EXECUTOR_LOCK = Lock()
 
-    return best_text, best_meta
+
+def get_ocr_race_executor():
+    global _OCR_RACE_EXECUTOR
+    with _OCR_RACE_EXECUTOR_LOCK:
+        if _OCR_RACE_EXECUTOR is None:
+            workers = int(os.environ.get('OCR_PROVIDER_RACE_WORKERS', '12'))
+            _OCR_RACE_EXECUTOR = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='ocr-race')
+        return _OCR_RACE_EXECUTOR
+
+
+def run_ocr_race(image, lang, providers):
+    """
+    Run the provider chain concurrently and return the first acceptable result.
+
+    Providers start in chain order, ``OCR_PROVIDER_RACE_STAGGER_MS`` apart (all at once by
+    default), and each is abandoned once it has run for its deadline; the clock starts
+    when a pool worker picks the call up, not when it is queued. Calls still queued
+    when a winner is found are cancelled. Running calls cannot be interrupted, but
+    their provider timeout is capped at the deadline so they free the worker soon
+    after; their results are ignored. Each call receives its own copy of the page.
+    """
+    executor = get_ocr_race_executor()
+    strict_mode = should_force_ocr_provider_failures()
+    stagger = float(os.environ.get('OCR_PROVIDER_RACE_STAGGER_MS', '0')) / 1000
+    started = time.perf_counter()
+    waiting = list(providers)
+    chain_position = {provider: index for index, provider in enumerate(providers)}
+    running = {}
+    outcomes = {}
+    best_text = ''
+    best_meta = {'provider': 'none', 'quality_score': 0.0, 'reason': 'no_provider_ran', 'text_length': 0}
+    uploads = {}
+    next_start = started
+
+    while waiting or running:
+        now = time.perf_counter()
+        while waiting and (now >= next_start or not running):
+            provider = waiting.pop(0)
+            page_copy = image.copy()
+            share_encodings(image, page_copy)
+            started_at = []
+            future = executor.submit(_run_race_call, provider, page_copy, lang, started_at)
+            running[future] = (provider, started_at)
+            next_start = now + stagger
+
+        # Queued calls have no deadline yet; poll until a worker starts them.
+        wake_at = min(
+            started_at[0] + _provider_deadline(provider) if started_at else now + 0.05
+            for provider, started_at in running.values()
+        )
+        if waiting:
+            wake_at = min(wake_at, next_start)
+        done, _ = wait(list(running), timeout=max(wake_at - now, 0), return_when=FIRST_COMPLETED)
+
+        # Several calls can finish in one round; the earliest in the chain wins, and
+        # every finished call is recorded before the rest are abandoned.
+        winner = None
+        for future in sorted(done, key=lambda future: chain_position[running[future][0]]):
+            provider, _ = running.pop(future)
+            try:
+                text, provider_meta = future.result()
+            except Exception as provider_error:
+                text, provider_meta = '', {
+                    'provider': provider,
+                    'status': 'api_error',
+                    'reason': 'exception',
+                    'error': f'{type(provider_error).__name__}: {provider_error}',
+                }
+            outcomes[provider] = provider_meta.get('status', 'unknown')
+            _tally_upload(uploads, provider_meta)
+            quality, accept_reason = _evaluate_ocr_result(provider, text, provider_meta, strict_mode)
+            if quality > best_meta['quality_score']:
+                best_text = text
+                best_meta = {
+                    'provider': provider,
+                    'quality_score': quality,
+                    'reason': provider_meta.get('reason', 'unknown'),
+                    'text_length': len((text or '').strip()),
+                    'status': provider_meta.get('status', 'unknown'),
+                }
+            if accept_reason and winner is None:
+                winner = (provider, text, quality, accept_reason)
+
+        if winner is not None:
+            provider, text, quality, accept_reason = winner
+            race_ms = (time.perf_counter() - started) * 1000
+            outcomes[provider] = 'won'
+            for pending_provider, started_at in running.values():
+                outcomes[pending_provider] = 'abandoned' if started_at else 'not_started'
+            for pending_provider in waiting:
+                outcomes[pending_provider] = 'not_started'
+            for pending_future in running:
+                pending_future.cancel()
+            logging.info("OCR race won by provider=%s in %.0f ms %s", provider, race_ms, outcomes)
+            return text, {
+                'provider': provider,
+                'quality_score': quality,
+                'reason': accept_reason,
+                'race_ms': race_ms,
+                'race': outcomes,
+                **uploads,
+            }
+
+        now = time.perf_counter()
+        for future, (provider, started_at) in list(running.items()):
+            if started_at and now >= started_at[0] + _provider_deadline(provider):
+                del running[future]
+                future.cancel()
+                outcomes[provider] = 'deadline_exceeded'
+                logging.warning("OCR provider=%s missed its %.1fs race deadline", provider, _provider_deadline(provider))
+
+    logging.info("OCR race found no acceptable result %s", outcomes)
+    return best_text, {
+        **best_meta,
+        'race_ms': (time.perf_counter() - started) * 1000,
+        'race': outcomes,
+        **uploads,
+    }
 
 
 def run_tesseract_ocr(image, lang):
-    psm = os.environ.get('OCR_TESSERACT_PSM', '6')
-    oem = os.environ.get('OCR_TESSERACT_OEM', '3')
-    config = f'--oem {oem} --psm {psm}'
+    psm, oem = _tesseract_settings()
     try:
-        text = pytesseract.image_to_string(image, lang=lang, timeout=40, config=config)
+        text = get_tesseract_engine().image_to_string(image, lang, psm, oem, timeout=_call_timeout(40))
         return text, {'provider': 'tesseract', 'status': 'ok', 'reason': 'success', 'error': ''}
     except Exception as tesseract_error:
         logging.warning('Tesseract OCR failed: %s: %s', type(tesseract_error).__name__, tesseract_error)
@@ -515,12 +1491,27 @@ def get_google_vision_client():
             raise RuntimeError(_GOOGLE_VISION_CLIENT_ERROR)
 
         try:
+            endpoint = (os.environ.get('OCR_GOOGLE_VISION_ENDPOINT') or '').strip()
+            if endpoint:
+                client_options = {'api_endpoint': endpoint}
+                if endpoint.startswith('http://'):
+                    # Plain-HTTP endpoints are local emulators that take no credentials.
+                    from google.auth.credentials import AnonymousCredentials
+
+                    _GOOGLE_VISION_CLIENT = vision.ImageAnnotatorClient(
+                        credentials=AnonymousCredentials(), transport='rest', client_options=client_options
+                    )
+                    return _GOOGLE_VISION_CLIENT
+            else:
+                client_options = None
             credentials_info = _build_google_credentials_info_from_env()
             if credentials_info:
                 credentials = service_account.Credentials.from_service_account_info(credentials_info)
-                _GOOGLE_VISION_CLIENT = vision.ImageAnnotatorClient(credentials=credentials)
+                _GOOGLE_VISION_CLIENT = vision.ImageAnnotatorClient(
+                    credentials=credentials, client_options=client_options
+                )
             else:
-                _GOOGLE_VISION_CLIENT = vision.ImageAnnotatorClient()
+                _GOOGLE_VISION_CLIENT = vision.ImageAnnotatorClient(client_options=client_options)
             return _GOOGLE_VISION_CLIENT
         except Exception as client_error:
             _GOOGLE_VISION_CLIENT_ERROR = f'{type(client_error).__name__}: {client_error}'
@@ -552,21 +1543,58 @@ def verify_google_vision_configuration():
         return {'ok': False, 'reason': 'client_init_failed', 'error': error_text}
 
 
+def encode_google_vision_image(image):
+    """Encode (or reuse) the page upload in the format chosen by ``OCR_GOOGLE_VISION_IMAGE_FORMAT``."""
+    image_format = (os.environ.get('OCR_GOOGLE_VISION_IMAGE_FORMAT') or 'png').strip().lower()
+    quality = int(os.environ.get('OCR_GOOGLE_VISION_IMAGE_QUALITY', '85'))
+    return encode_page(image, image_format, quality)
+
+
+def get_google_vision_batch_size():
+    # The images:annotate endpoint accepts at most 16 images per request.
+    return min(max(int(os.environ.get('OCR_GOOGLE_VISION_BATCH_SIZE', '1')), 1), 16)
+
+
+def ensure_google_vision_configuration():
+    """Verify the Vision client once per process; a failure opens the provider's circuit."""
+    global _GOOGLE_VISION_CONFIG_STATUS
+    with _GOOGLE_VISION_CLIENT_LOCK:
+        status = _GOOGLE_VISION_CONFIG_STATUS
+    if status is None:
+        status = verify_google_vision_configuration()
+        with _GOOGLE_VISION_CLIENT_LOCK:
+            _GOOGLE_VISION_CONFIG_STATUS = status
+        if not status.get('ok'):
+            record_provider_call('google_vision', 'client_init_failed', 0.0, status.get('error', ''))
+    return status
+
+
+def reset_google_vision_configuration():
+    """Forget a failed Vision setup so the next page checks the configuration again."""
+    global _GOOGLE_VISION_CONFIG_STATUS, _GOOGLE_VISION_CLIENT_ERROR
+    with _GOOGLE_VISION_CLIENT_LOCK:
+        _GOOGLE_VISION_CONFIG_STATUS = None
+        _GOOGLE_VISION_CLIENT_ERROR = None
+
+
 def run_google_vision_ocr(image, lang):
-    timeout = float(os.environ.get('OCR_GOOGLE_VISION_TIMEOUT', '20'))
+    timeout = _call_timeout(float(os.environ.get('OCR_GOOGLE_VISION_TIMEOUT', '20')))
     language_hints = map_ocr_lang_to_vision_hints(lang)
-
-    buffer = BytesIO()
-    image.save(buffer, format='PNG')
-    image_bytes = buffer.getvalue()
+    encoded, cached = encode_google_vision_image(image)
+    upload = encoded.report(cached)
+    # The proto field needs ``bytes``; the view's backing object is passed without copying.
+    image_bytes = encoded.view.obj
 
     try:
-        client = get_google_vision_client()
-        response = client.document_text_detection(
-            image=vision.Image(content=image_bytes),
-            image_context=vision.ImageContext(language_hints=language_hints),
-            timeout=timeout,
-        )
+        if get_google_vision_batch_size() > 1:
+            response = get_google_vision_batcher().annotate(image_bytes, language_hints, timeout)
+        else:
+            client = get_google_vision_client()
+            response = client.document_text_detection(
+                image=vision.Image(content=image_bytes),
+                image_context=vision.ImageContext(language_hints=language_hints),
+                timeout=timeout,
+            )
         if response.error.message:
             logging.warning('Google Vision OCR failed: %s', response.error.message)
             return '', {
@@ -574,6 +1602,7 @@ def run_google_vision_ocr(image, lang):
                 'status': 'api_error',
                 'reason': 'api_error',
                 'error': response.error.message,
+                **upload,
             }
         text = (response.full_text_annotation.text or '').strip()
         if not text:
@@ -582,8 +1611,9 @@ def run_google_vision_ocr(image, lang):
                 'status': 'ok',
                 'reason': 'empty_text',
                 'error': '',
+                **upload,
             }
-        return text, {'provider': 'google_vision', 'status': 'ok', 'reason': 'success', 'error': ''}
+        return text, {'provider': 'google_vision', 'status': 'ok', 'reason': 'success', 'error': '', **upload}
     except Exception as api_error:
         category = classify_google_vision_error(api_error)
         logging.warning('Google Vision OCR failed: %s: %s', type(api_error).__name__, api_error)
@@ -592,9 +1622,114 @@ def run_google_vision_ocr(image, lang):
             'status': category,
             'reason': 'exception',
             'error': f'{type(api_error).__name__}: {api_error}',
+            **upload,
         }
 
 
+class _GoogleVisionBatch:
+    def __init__(self):
+        self.requests = []
+        self.size_bytes = 0
+        self.closed = False
+        self.ready = Event()
+        self.done = Event()
+        self.responses = None
+        self.error = None
+
+
+class GoogleVisionBatcher:
+    """
+    Coalesce concurrent page requests into ``batch_annotate_images`` calls.
+
+    The first page to arrive leads its batch: it waits up to ``linger`` seconds for other
+    pages to join (or for the batch to fill), sends one request and hands every caller
+    its own response.
+    """
+
+    def __init__(self, max_size, max_bytes, linger):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.linger = linger
+        self.stats = {'requests': 0, 'images': 0}
+        self._lock = Lock()
+        self._open = None
+
+    def annotate(self, image_bytes, language_hints, timeout):
+        request_item = vision.AnnotateImageRequest(
+            image=vision.Image(content=image_bytes),
+            features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+            image_context=vision.ImageContext(language_hints=language_hints),
+        )
+        with self._lock:
+            batch = self._open
+            if batch is not None and batch.size_bytes + len(image_bytes) > self.max_bytes:
+                self._close(batch)
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = self._open = _GoogleVisionBatch()
+            index = len(batch.requests)
+            batch.requests.append(request_item)
+            batch.size_bytes += len(image_bytes)
+            if len(batch.requests) >= self.max_size:
+                self._close(batch)
+
+        if leader:
+            batch.ready.wait(self.linger)
+            with self._lock:
+                self._close(batch)
+            self._send(batch, timeout)
+        elif not batch.done.wait(timeout + self.linger + 5):
+            raise TimeoutError('Google Vision batch did not complete in time')
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.responses[index]
+
+    def _close(self, batch):
+        batch.closed = True
+        if self._open is batch:
+            self._open = None
+        batch.ready.set()
+
+    def _send(self, batch, timeout):
+        started = time.perf_counter()
+        try:
+            response = get_google_vision_client().batch_annotate_images(
+                requests=batch.requests, timeout=timeout
+            )
+            batch.responses = list(response.responses)
+            if len(batch.responses) != len(batch.requests):
+                raise RuntimeError(
+                    f'Google Vision returned {len(batch.responses)} responses for {len(batch.requests)} images'
+                )
+        except Exception as batch_error:
+            batch.error = batch_error
+        finally:
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['images'] += len(batch.requests)
+            batch.done.set()
+        logging.info(
+            "Google Vision batch of %s pages (%.0f KB) in %.0f ms",
+            len(batch.requests),
+            batch.size_bytes / 1024,
+            (time.perf_counter() - started) * 1000,
+        )
+
+
+def get_google_vision_batcher():
+    global _GOOGLE_VISION_BATCHER
+    with _GOOGLE_VISION_CLIENT_LOCK:
+        if _GOOGLE_VISION_BATCHER is None:
+            _GOOGLE_VISION_BATCHER = GoogleVisionBatcher(
+                max_size=get_google_vision_batch_size(),
+                max_bytes=int(os.environ.get('OCR_GOOGLE_VISION_BATCH_MAX_BYTES', str(8 * 1024 * 1024))),
+                linger=float(os.environ.get('OCR_GOOGLE_VISION_BATCH_LINGER_MS', '100')) / 1000,
+            )
+        return _GOOGLE_VISION_BATCHER
+
+
 def run_ocr_space_ocr(image, lang):
     api_key = (os.environ.get('OCR_SPACE_API_KEY') or '').strip()
     if not api_key:
@@ -609,9 +1744,9 @@ def run_ocr_space_ocr(image, lang):
     ocr_space_lang = lang_map.get(lang, 'eng')
     endpoint = os.environ.get('OCR_SPACE_ENDPOINT', 'https://api.ocr.space/parse/image')
 
-    buffer = BytesIO()
-    image.save(buffer, format='PNG')
-    image_bytes = buffer.getvalue()
+    image_format = (os.environ.get('OCR_SPACE_IMAGE_FORMAT') or 'png').strip().lower()
+    encoded, cached = encode_page(image, image_format)
+    upload = encoded.report(cached)
 
     boundary = '----CodexFormBoundary7MA4YWxkTrZu0gW'
     fields = {
@@ -631,22 +1766,23 @@ def run_ocr_space_ocr(image, lang):
         ])
     body.extend([
         f'--{boundary}'.encode(),
-        b'Content-Disposition: form-data; name="file"; filename="scan.png"',
-        b'Content-Type: image/png',
-        b'',
-        image_bytes,
-        f'--{boundary}--'.encode(),
+        f'Content-Disposition: form-data; name="file"; filename="scan.{encoded.format}"'.encode(),
+        f'Content-Type: {encoded.mime_type}'.encode(),
         b'',
     ])
-    payload = b'\r\n'.join(body)
+    # Send the encoded page as its own chunk so the upload is never copied into the payload.
+    chunks = [b'\r\n'.join(body) + b'\r\n', encoded.view, f'\r\n--{boundary}--\r\n'.encode()]
 
     req = request.Request(
         endpoint,
-        data=payload,
-        headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+        data=chunks,
+        headers={
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+            'Content-Length': str(sum(memoryview(chunk).nbytes for chunk in chunks)),
+        },
         method='POST',
     )
-    timeout = float(os.environ.get('OCR_SPACE_TIMEOUT', '20'))
+    timeout = _call_timeout(float(os.environ.get('OCR_SPACE_TIMEOUT', '20')))
 
     try:
         with request.urlopen(req, timeout=timeout) as resp:
@@ -655,8 +1791,8 @@ def run_ocr_space_ocr(image, lang):
         parsed_results = payload.get('ParsedResults') or []
         text = '\n'.join((item.get('ParsedText') or '') for item in parsed_results)
         if not text.strip():
-            return '', {'provider': 'ocr_space', 'status': 'ok', 'reason': 'empty_text', 'error': ''}
-        return text, {'provider': 'ocr_space', 'status': 'ok', 'reason': 'success', 'error': ''}
+            return '', {'provider': 'ocr_space', 'status': 'ok', 'reason': 'empty_text', 'error': '', **upload}
+        return text, {'provider': 'ocr_space', 'status': 'ok', 'reason': 'success', 'error': '', **upload}
     except Exception as api_error:
         logging.warning('OCR.space fallback failed: %s: %s', type(api_error).__name__, api_error)
         return '', {
@@ -664,36 +1800,107 @@ def run_ocr_space_ocr(image, lang):
             'status': 'api_error',
             'reason': 'exception',
             'error': f'{type(api_error).__name__}: {api_error}',
+            **upload,
         }
 
 
 def calculate_text_quality(text):
-    if not text:
-        return 0.0
+    return analyze_text_quality(text)['score']
+
+
+# Character -> (letter, space, noise, diacritic, regex symbol) flags, filled lazily.
+_CHAR_CLASSES = {}
+
+
+def _char_class(ch):
+    flags = _CHAR_CLASSES.get(ch)
+    if flags is None:
+        flags = (
+            ch.isalpha(),
+            ch.isspace(),
+            not (ch.isalnum() or ch.isspace() or ch in QUALITY_PUNCTUATION),
+            ch in HUNGARIAN_DIACRITICS,
+            not (ch.isalnum() or ch == '_' or ch.isspace()),
+        )
+        if len(_CHAR_CLASSES) < 8192:
+            _CHAR_CLASSES[ch] = flags
+    return flags
+
 
-    cleaned = text.strip()
+def analyze_text_quality(text, per_line=False):
+    """
+    Score OCR output and return the signals behind the score.
+
+    Characters are tallied once with ``Counter`` and classified per distinct character,
+    so the cost is one C-level pass plus a lookup for each unique symbol. ``per_line``
+    adds a score for every non-blank line.
+    """
+    cleaned = (text or '').strip()
+    report = {
+        'score': 0.0,
+        'chars': len(cleaned),
+        'letters': 0,
+        'spaces': 0,
+        'noise': 0,
+        'diacritics': 0,
+        'garbage_hits': 0,
+        'alpha_ratio': 0.0,
+        'space_ratio': 0.0,
+        'noise_ratio': 0.0,
+        'diacritic_ratio': 0.0,
+    }
+    if per_line:
+        report['lines'] = []
     if not cleaned:
-        return 0.0
+        return report
+
+    letters = spaces = noise = diacritics = symbols = 0
+    counts = Counter(cleaned)
+    for ch, count in counts.items():
+        is_letter, is_space, is_noise, is_diacritic, is_symbol = _char_class(ch)
+        if is_letter:
+            letters += count
+        if is_space:
+            spaces += count
+        if is_noise:
+            noise += count
+        if is_diacritic:
+            diacritics += count
+        if is_symbol:
+            symbols += count
+    garbage_hits = sum(
+        len(regex.findall(cleaned))
+        for regex, may_match in _GARBAGE_REGEXES
+        if may_match(cleaned, symbols, counts)
+    )
 
     chars = len(cleaned)
-    letters = sum(1 for ch in cleaned if ch.isalpha())
-    spaces = sum(1 for ch in cleaned if ch.isspace())
-    noise = sum(1 for ch in cleaned if not (ch.isalnum() or ch.isspace() or ch in ',.;:!?()/-'))
-    diacritics = sum(1 for ch in cleaned if ch in 'áéíóöőúüűÁÉÍÓÖŐÚÜŰ')
-    garbage_hits = sum(len(re.findall(pattern, cleaned)) for pattern in GARBAGE_PATTERNS)
-
-    alpha_ratio = letters / chars
-    space_ratio = spaces / chars
-    noise_ratio = noise / chars
-    diacritic_ratio = diacritics / max(letters, 1)
-
-    score = 0.55 * alpha_ratio
-    score += 0.20 * min(space_ratio * 3, 1)
-    score += 0.15 * (1 - min(noise_ratio * 4, 1))
-    score += 0.10 * min(diacritic_ratio * 8, 1)
+    report.update(
+        letters=letters,
+        spaces=spaces,
+        noise=noise,
+        diacritics=diacritics,
+        garbage_hits=garbage_hits,
+        alpha_ratio=letters / chars,
+        space_ratio=spaces / chars,
+        noise_ratio=noise / chars,
+        diacritic_ratio=diacritics / max(letters, 1),
+    )
+
+    score = 0.55 * report['alpha_ratio']
+    score += 0.20 * min(report['space_ratio'] * 3, 1)
+    score += 0.15 * (1 - min(report['noise_ratio'] * 4, 1))
+    score += 0.10 * min(report['diacritic_ratio'] * 8, 1)
     score -= min(garbage_hits * 0.03, 0.30)
+    report['score'] = max(0.0, min(1.0, score))
 
-    return max(0.0, min(1.0, score))
+    if per_line:
+        report['lines'] = [
+            {'line': number, 'score': analyze_text_quality(line)['score'], 'chars': len(line.strip())}
+            for number, line in enumerate(cleaned.splitlines(), start=1)
+            if line.strip()
+        ]
+    return report
 
 def test_ocr():
     """Test OCR functionality"""
@@ -22,13 +22,30 @@ from models import (
     PlatformSetting,
     LegalDocument,
     AnalysisFeedback,
+    AnalysisCacheEntry,
     CreditTransaction,
     ActivityLog,
 )
-from cms_main import analyze_document
+from cms_main import analyze_document, get_pipeline_fingerprint, start_language_detection
+from analysis_cache import (
+    build_cached_result,
+    compute_file_sha256,
+    compute_text_sha256,
+    find_reusable_analysis,
+    record_analysis_fingerprint,
+)
 from llm_pii_sanitizer import sanitize_text_llm
 from pii_restorer import restore_text
-from ocr_processor import extract_text_from_file
+from ocr_checkpoints import (
+    claim_stalled_analysis,
+    clear_page_checkpoints,
+    clear_user_page_checkpoints,
+    find_stalled_analyses,
+    load_page_checkpoints,
+    record_ocr_progress,
+    save_page_checkpoint,
+)
+from ocr_processor import ExtractedPages, extract_text_from_file, iter_pdf_page_texts
 from utils import (
     SUPPORTED_LANGUAGES,
     allowed_file,
@@ -936,8 +953,11 @@ def delete_document(document_id):
     try:
         if analysis:
             AnalysisFeedback.query.filter_by(analysis_id=analysis.id).delete()
+            AnalysisCacheEntry.query.filter_by(analysis_id=analysis.id).delete()
             db.session.delete(analysis)
         CreditTransaction.query.filter_by(document_id=document.id).delete()
+        # Checkpoints of a failed OCR job outlive the job and still reference the document.
+        clear_page_checkpoints(document.id)
         db.session.delete(document)
         db.session.commit()
         flash('Document deleted successfully.')
@@ -1028,29 +1048,98 @@ def process_document(document_id, filepath, file_type, client_ip=None):
         activity_log_id = None
         try:
             analysis.status = 'ocr'
+            record_ocr_progress(analysis, 0, None)
             db.session.commit()
 
-            extracted_text = extract_text_from_file(filepath, file_type)
+            use_pii = PlatformSetting.get('use_pii_sanitizer', 'false') == 'true'
+            pipeline_version = get_pipeline_fingerprint()
+            file_sha256 = compute_file_sha256(filepath)
+            text_sha256 = None
+            cached_analysis = find_reusable_analysis(
+                user,
+                pipeline_version,
+                pii_sanitized=use_pii,
+                file_sha256=file_sha256,
+            )
 
-            if not extracted_text.strip():
-                analysis.status = 'failed'
-                analysis.error_message = 'Could not extract text from the document. Please check the file format.'
-                db.session.commit()
-                return
+            api_key = os.environ.get("OPENAI_API_KEY", "")
+            language_detection = None
+            if cached_analysis is None and file_type == 'pdf':
+                # Pages stream in as OCR finishes them; m10 only needs the first and last
+                # words, so it starts as soon as those are settled (not when PII must be
+                # stripped first, since that needs the whole text). Every finished page is
+                # checkpointed, so a restarted job only OCRs the pages that are missing.
+                checkpoints = load_page_checkpoints(document.id, file_sha256)
+                if checkpoints:
+                    logging.info(
+                        "Resuming OCR of document %s with %s checkpointed pages",
+                        document_id,
+                        len(checkpoints),
+                    )
+                pages = ExtractedPages()
+                for page_index, page_text, total_pages in iter_pdf_page_texts(
+                    filepath, completed_pages=checkpoints
+                ):
+                    pages.add(page_index, page_text, total_pages)
+                    if page_index not in checkpoints:
+                        save_page_checkpoint(document.id, file_sha256, page_index, page_text)
+                    record_ocr_progress(analysis, len(pages.pages), pages.total)
+                    db.session.commit()
+                    if language_detection is None and not use_pii:
+                        first_words, last_words = pages.leading_words(15), pages.trailing_words(15)
+                        if first_words and last_words:
+                            language_detection = start_language_detection(
+                                first_words,
+                                last_words,
+                                api_key,
+                                store_conversation=document.allow_training,
+                            )
+                pages.finish()
+                record_ocr_progress(analysis, len(pages.pages), pages.total)
+                extracted_text = pages.text()
+            elif cached_analysis is None:
+                extracted_text = extract_text_from_file(filepath, file_type)
+
+            if cached_analysis is None:
+                if not extracted_text.strip():
+                    analysis.status = 'failed'
+                    analysis.error_message = 'Could not extract text from the document. Please check the file format.'
+                    clear_page_checkpoints(document.id)
+                    db.session.commit()
+                    return
+
+                text_sha256 = compute_text_sha256(extracted_text)
+                cached_analysis = find_reusable_analysis(
+                    user,
+                    pipeline_version,
+                    pii_sanitized=use_pii,
+                    text_sha256=text_sha256,
+                )
 
-            use_pii = PlatformSetting.get('use_pii_sanitizer', 'false') == 'true'
-            text_to_analyze = extracted_text
-            stored_extracted_text = extracted_text
+            text_to_analyze = None
             stored_pii_map = None
-            if use_pii:
-                sanitized_text, mapping = sanitize_text_llm(extracted_text)
-                text_to_analyze = sanitized_text
-                stored_extracted_text = sanitized_text
-                stored_pii_map = json.dumps(mapping)
+            if cached_analysis is not None:
+                stored_extracted_text = cached_analysis.resolved_extracted_text()
+                stored_pii_map = cached_analysis.resolved_pii_map() or None
+            else:
+                text_to_analyze = extracted_text
+                stored_extracted_text = extracted_text
+                if use_pii:
+                    sanitized_text, mapping = sanitize_text_llm(extracted_text)
+                    text_to_analyze = sanitized_text
+                    stored_extracted_text = sanitized_text
+                    stored_pii_map = json.dumps(mapping)
 
             analysis.status = 'analysis'
             db.session.commit()
 
+            activity_details = {
+                "document_name": document.original_filename if document else None,
+                "analysis_id": analysis.id,
+            }
+            if cached_analysis is not None:
+                activity_details["reused_analysis_id"] = cached_analysis.id
+
             activity_entry = record_activity(
                 "analysis",
                 user=user,
@@ -1060,28 +1149,34 @@ def process_document(document_id, filepath, file_type, client_ip=None):
                 analysis_status='analysis',
                 shared_with_contra=document.allow_training if document else None,
                 credit_type=analysis.credit_type,
-                details={
-                    "document_name": document.original_filename if document else None,
-                    "analysis_id": analysis.id,
-                },
+                details=activity_details,
             )
             if activity_entry:
                 activity_log_id = activity_entry.id
 
             start_time = datetime.now()
-            api_key = os.environ.get("OPENAI_API_KEY", "")
-            analysis_result = analyze_document(
-                text_to_analyze,
-                api_key,
-                store_conversation=document.allow_training,
-            )
-            processing_time = (
-                analysis_result.get('elapsed_time')
-                or analysis_result.get('elapsed time')
-                or (datetime.now() - start_time).total_seconds()
-            )
+            if cached_analysis is not None:
+                logging.info(
+                    "Reusing analysis %s for document %s (identical content)",
+                    cached_analysis.id,
+                    document_id,
+                )
+                analysis_result = build_cached_result(cached_analysis)
+                processing_time = (datetime.now() - start_time).total_seconds()
+            else:
+                analysis_result = analyze_document(
+                    text_to_analyze,
+                    api_key,
+                    store_conversation=document.allow_training,
+                    language_detection=language_detection,
+                )
+                processing_time = (
+                    analysis_result.get('elapsed_time')
+                    or analysis_result.get('elapsed time')
+                    or (datetime.now() - start_time).total_seconds()
+                )
 
-            if use_pii and stored_pii_map:
+            if cached_analysis is None and use_pii and stored_pii_map:
                 mapping = json.loads(stored_pii_map)
                 for key in [
                     'key_terms',
@@ -1168,11 +1263,18 @@ def process_document(document_id, filepath, file_type, client_ip=None):
             analysis.detected_language = analysis_result.get('detected_language', '')
             analysis.processing_time = processing_time
             analysis.status = 'completed'
+            clear_page_checkpoints(document.id)
 
             if activity_log_id:
                 log_entry = db.session.get(ActivityLog, activity_log_id)
                 if log_entry:
                     log_entry.analysis_status = analysis.status
+                    if analysis_result.get('per_stage_token_usage'):
+                        # Kept per document so prompt-cache hit rates can be compared over time.
+                        log_entry.details = {
+                            **log_entry.details_dict,
+                            'token_usage': analysis_result['per_stage_token_usage'],
+                        }
 
             if analysis.credit_type and not analysis.credit_deducted:
                 deduct_credit(user, analysis.credit_type, document=document)
@@ -1183,6 +1285,16 @@ def process_document(document_id, filepath, file_type, client_ip=None):
                 document.training_credit_awarded = True
                 award_oneoff_credit(user, 1, "Training allowance bonus", document=document)
 
+            if cached_analysis is None:
+                record_analysis_fingerprint(
+                    analysis,
+                    user,
+                    pipeline_version,
+                    pii_sanitized=use_pii,
+                    file_sha256=file_sha256,
+                    text_sha256=text_sha256,
+                )
+
             db.session.commit()
         except Exception as e:
             analysis.status = 'failed'
@@ -1193,6 +1305,26 @@ def process_document(document_id, filepath, file_type, client_ip=None):
                     log_entry.analysis_status = 'failed'
             db.session.commit()
 
+def resume_stalled_documents():
+    """Restart OCR jobs whose worker died mid-document; checkpointed pages are not redone."""
+    resumed = []
+    with app.app_context():
+        for analysis in find_stalled_analyses():
+            document = analysis.document
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], document.filename)
+            if not os.path.exists(filepath):
+                logging.warning("Cannot resume document %s: %s is missing", document.id, filepath)
+                continue
+            if not claim_stalled_analysis(analysis):
+                continue
+            Thread(
+                target=process_document,
+                args=(document.id, filepath, document.file_type),
+                daemon=True,
+            ).start()
+            resumed.append(document.id)
+    return resumed
+
 @app.route('/processing/<int:document_id>')
 @login_required
 def processing(document_id):
@@ -1219,7 +1351,11 @@ def check_analysis(document_id):
     if not analysis:
         return jsonify({'status': 'pending'})
     
-    return jsonify({'status': analysis.status})
+    return jsonify({
+        'status': analysis.status,
+        'pages_done': analysis.pages_done,
+        'pages_total': analysis.pages_total,
+    })
 
 @app.route('/analysis/<int:document_id>')
 @login_required
@@ -1674,6 +1810,7 @@ def admin_delete_company(company_id):
     if not current_user.is_admin:
         return redirect(url_for('dashboard'))
     company = Company.query.get_or_404(company_id)
+    clear_user_page_checkpoints(user.id for user in company.users)
     for user in company.users:
         db.session.delete(user)
     db.session.delete(company)
@@ -1725,6 +1862,7 @@ def delete_company(company_id):
     company = Company.query.get_or_404(company_id)
     if not (current_user.is_admin or (current_user.is_comorg and current_user.company_id == company_id)):
         return redirect(url_for('dashboard'))
+    clear_user_page_checkpoints(user.id for user in company.users)
     for user in company.users:
         db.session.delete(user)
     db.session.delete(company)
@@ -1785,6 +1923,7 @@ def remove_company_user(company_id, user_id):
     if not (current_user.is_admin or (current_user.is_comorg and current_user.company_id == company_id)):
         return redirect(url_for('dashboard'))
     user = User.query.filter_by(id=user_id, company_id=company_id).first_or_404()
+    clear_user_page_checkpoints([user.id])
     db.session.delete(user)
     db.session.commit()
     flash('User removed.')
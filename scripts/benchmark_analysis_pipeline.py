@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Measure analyze_document wall-clock time against its stage graph with simulated model latency.
+
+Usage:
+    python scripts/benchmark_analysis_pipeline.py --references 6 --scale 0.1
+    python scripts/benchmark_analysis_pipeline.py --documents 200 --scale 0.1
+    python scripts/benchmark_analysis_pipeline.py --layout document_first
+    python scripts/benchmark_analysis_pipeline.py --sections 300 --chunk-max-tokens 0
+
+OpenAI is replaced by a stub that sleeps for a typical latency per stage (scaled by
+``--scale``), so the benchmark runs offline. It reports the measured wall-clock time,
+the sum of all stage times (what a strictly sequential run would take) and the
+critical path of ``ANALYSIS_STAGE_INPUTS``. With ``--documents`` that many analyses
+run at once on the shared LLM loop, and the peak thread count is reported as well.
+
+The stub also mimics provider prompt caching (exact prefixes of at least 1024
+tokens, reused in 128-token steps, about four characters per token) and reports
+prompt and cached tokens for the chosen ``--layout``. The contract has ``--sections``
+numbered paragraphs; compare prompt tokens with ``--chunk-max-tokens 0`` (whole
+document in every prompt) against the default chunking.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import re
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import cms_main  # noqa: E402
+import cms_variables  # noqa: E402
+from llm_client import run_llm  # noqa: E402
+from stage_graph import Stage, critical_path  # noqa: E402
+
+# Rough seconds per call observed for each stage.
+STAGE_LATENCY = {
+    "m10": 1.0, "m11": 1.5, "m12": 8.0, "m13": 3.0,
+    "m21": 9.0, "m22": 9.0, "m23": 9.0, "m24": 9.0, "m25": 6.0,
+    "m26": 4.0, "m27": 6.0, "m28": 7.0, "m30": 12.0, "m31": 4.0, "m32": 2.0,
+    "m41": 8.0, "m42": 4.0, "m43": 2.0, "m50": 8.0,
+}
+
+
+class PromptCacheModel:
+    """Approximation of the provider's automatic prefix cache."""
+
+    CHARS_PER_TOKEN = 4
+    MIN_TOKENS = 1024
+    STEP_TOKENS = 128
+
+    def __init__(self):
+        self.prefixes = set()
+
+    def _prefix_hashes(self, text):
+        step = self.STEP_TOKENS * self.CHARS_PER_TOKEN
+        for end in range(self.MIN_TOKENS * self.CHARS_PER_TOKEN, len(text) + 1, step):
+            yield end // self.CHARS_PER_TOKEN, hashlib.sha1(text[:end].encode("utf-8")).digest()
+
+    def usage(self, messages):
+        text = "".join(f"<{message['role']}>{message['content']}" for message in messages)
+        cached = 0
+        for tokens, digest in self._prefix_hashes(text):
+            if digest not in self.prefixes:
+                break
+            cached = tokens
+        self.prefixes.update(digest for _, digest in self._prefix_hashes(text))
+        return {
+            "prompt_tokens": len(text) // self.CHARS_PER_TOKEN,
+            "completion_tokens": 200,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+
+CLAUSE = (
+    "A Megbízott köteles a szerződés tárgyát képező feladatokat a vonatkozó jogszabályok "
+    "és a Megbízó utasításai szerint ellátni, és a teljesítésről havonta beszámolni. "
+)
+REFERENCE = re.compile(r"\d{4}\. évi [IVXLC]+\. törvény \d+\. §")
+
+
+def build_contract(sections, references):
+    """A contract of numbered sections; the first ``references`` sections cite a paragraph of the Mt."""
+    parts = ["MEGBÍZÁSI SZERZŐDÉS\n\n"]
+    for number in range(1, sections + 1):
+        parts.append(f"{number}. § {CLAUSE * 6}\n")
+        if number <= references:
+            parts.append(f"E pontra a 2012. évi I. törvény {number + 40}. § rendelkezései irányadók.\n")
+        parts.append("\n")
+    return "".join(parts)
+
+
+def fake_completion(scale):
+    cache = PromptCacheModel()
+
+    stage_by_prompt = {
+        getattr(cms_variables, f"{stage}_prompt"): stage
+        for stage in STAGE_LATENCY
+        if stage != "m10"
+    }
+
+    async def acreate(model, messages, **kwargs):
+        # The stage prompt is the last system message in both layouts.
+        system = [message["content"] for message in messages if message["role"] == "system"][-1]
+        stage = stage_by_prompt.get(system) or next(
+            (name for prompt, name in stage_by_prompt.items() if system.startswith(prompt)), "m10"
+        )
+        await asyncio.sleep(STAGE_LATENCY[stage] * scale)
+        if stage == "m11":
+            content = "0"
+        elif stage == "m13":
+            found = REFERENCE.findall("".join(message["content"] for message in messages))
+            content = "\n".join(f"{idx}. {reference}" for idx, reference in enumerate(found, start=1))
+        elif stage == "m26":
+            content = "1"
+        else:
+            content = f"{stage} output"
+        return {"choices": [{"message": {"content": content}}], "usage": cache.usage(messages)}
+
+    return acreate
+
+
+async def analyze_many(document_text, documents):
+    threads = 0
+
+    async def watch_threads():
+        nonlocal threads
+        while True:
+            threads = max(threads, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.ensure_future(watch_threads())
+    results = await asyncio.gather(*(
+        cms_main.analyze_document_async(document_text, "sk-benchmark", store_conversation=False)
+        for _ in range(documents)
+    ))
+    watcher.cancel()
+    return results, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--references', type=int, default=6, help='sections citing a legal reference')
+    parser.add_argument('--sections', type=int, default=40, help='numbered sections in the contract')
+    parser.add_argument('--chunk-max-tokens', type=int, default=None, help='CMS_CHUNK_MAX_TOKENS, 0 disables chunking')
+    parser.add_argument('--scale', type=float, default=0.1, help='multiplier for STAGE_LATENCY')
+    parser.add_argument('--documents', type=int, default=1, help='analyses to run concurrently')
+    parser.add_argument('--layout', choices=['prompt_first', 'document_first'], default='prompt_first')
+    args = parser.parse_args()
+
+    os.environ["CMS_PROMPT_LAYOUT"] = args.layout
+    if args.chunk_max_tokens is not None:
+        os.environ["CMS_CHUNK_MAX_TOKENS"] = str(args.chunk_max_tokens)
+
+    fake = fake_completion(args.scale)
+    document_text = build_contract(args.sections, args.references)
+    with patch.object(cms_main.openai.ChatCompletion, 'acreate', side_effect=fake):
+        started = time.perf_counter()
+        results, peak_threads = run_llm(analyze_many(document_text, args.documents))
+        wall = time.perf_counter() - started
+
+    result = results[0]
+    durations = {entry["stage"]: entry["duration"] for entry in result["per_stage_request_times"]}
+    stages = [Stage(name, None, inputs) for name, inputs in cms_main.ANALYSIS_STAGE_INPUTS.items()]
+    path_seconds, path = critical_path(stages, durations)
+    print(json.dumps({
+        'documents': args.documents,
+        'wall_clock_s': wall,
+        'peak_threads': peak_threads,
+        'sequential_s': sum(durations.values()),
+        'critical_path_s': path_seconds,
+        'critical_path': path,
+        'layout': args.layout,
+        'document_chunks': result['document_chunks'],
+        'prompt_tokens': sum(usage['prompt_tokens'] for usage in result['per_stage_token_usage'].values()),
+        'cached_tokens': sum(usage['cached_tokens'] for usage in result['per_stage_token_usage'].values()),
+        'stage_s': durations,
+        'stage_tokens': result['per_stage_token_usage'],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Compare python-docx and streaming DOCX text extraction on a long synthetic contract.
+
+Usage:
+    python scripts/benchmark_docx_extraction.py --pages 250
+
+Each page holds numbered clauses and a table with merged cells and ends in a page
+break. Peak memory is measured with tracemalloc in a separate pass so it does not
+skew the timings; it covers Python allocations, not libxml2's own buffers.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import docx
+from docx.enum.text import WD_BREAK
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from docx_text import iter_docx_pages  # noqa: E402
+
+CLAUSE = (
+    "{page}.{clause}. A Megbízott köteles a szerződés tárgyát képező feladatokat a vonatkozó "
+    "jogszabályok és a Megbízó utasításai szerint ellátni. The Contractor shall perform the "
+    "services with due care and in line with the applicable laws."
+)
+
+
+def build_contract(path, pages):
+    document = docx.Document()
+    for page in range(1, pages + 1):
+        document.add_heading(f'{page}. fejezet', level=2)
+        for clause in range(1, 9):
+            document.add_paragraph(CLAUSE.format(page=page, clause=clause))
+        table = document.add_table(rows=6, cols=4)
+        for row_index, row in enumerate(table.rows):
+            for col_index, cell in enumerate(row.cells):
+                cell.text = f'Tétel {row_index}.{col_index}'
+        table.cell(0, 0).merge(table.cell(0, 3)).text = 'Díjtáblázat / fee schedule'
+        table.cell(1, 3).merge(table.cell(5, 3)).text = 'Összesen: 1 250 000 Ft'
+        document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.save(path)
+
+
+def extract_with_python_docx(path):
+    document = docx.Document(path)
+    pages, parts = [], []
+    for child in document.element.body.iterchildren():
+        if child.tag.endswith('}p'):
+            text = Paragraph(child, document).text.strip()
+            if text:
+                parts.append(text)
+            if child.xpath('./w:r/w:br[@w:type="page"]'):
+                pages.append('\n'.join(parts).strip())
+                parts = []
+        elif child.tag.endswith('}tbl'):
+            lines = []
+            for row in Table(child, document).rows:
+                cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+                if cells:
+                    lines.append(' | '.join(cells))
+            parts.append('\n'.join(lines))
+    pages.append('\n'.join(parts).strip())
+    return '\n\n'.join(filter(None, pages))
+
+
+def extract_streaming(path):
+    return '\n\n'.join(iter_docx_pages(path))
+
+
+def measure(extract, path, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        text = extract(path)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    extract(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return text, {'median_ms': statistics.median(timings), 'peak_mb': peak / (1024 * 1024)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=250)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'contract.docx')
+        build_contract(path, args.pages)
+        reference, python_docx_stats = measure(extract_with_python_docx, path, args.repeats)
+        streamed, streaming_stats = measure(extract_streaming, path, args.repeats)
+        results = {
+            'pages': args.pages,
+            'file_kb': os.path.getsize(path) / 1024,
+            'python_docx': python_docx_stats,
+            'streaming': streaming_stats,
+            'identical_output': reference == streamed,
+            'speedup': python_docx_stats['median_ms'] / max(streaming_stats['median_ms'], 1e-9),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
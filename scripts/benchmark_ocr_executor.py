@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Compare thread-pool and process-pool OCR throughput on synthetic pages.
+
+Usage:
+    python scripts/benchmark_ocr_executor.py --pages 24 --workers 8
+
+Only the Tesseract provider is used, so the benchmark runs offline.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from PIL import Image, ImageDraw
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import ocr_processor  # noqa: E402
+
+SAMPLE_LINES = [
+    "MUNKASZERZŐDÉS / EMPLOYMENT AGREEMENT",
+    "A munkáltató és a munkavállaló az alábbi feltételekben állapodnak meg.",
+    "The employer and the employee agree on the following terms and conditions.",
+    "1. A munkavégzés helye: Budapest, Fő utca 12.",
+    "2. The monthly gross salary is 850 000 HUF, payable by the 10th day.",
+    "3. Felmondási idő: 30 nap, amely a munkaviszony idejével arányosan nő.",
+]
+
+
+def render_page(width=2480, height=3508):
+    """Render a synthetic A4 page at 300 DPI."""
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    y = 200
+    while y < height - 200:
+        for line in SAMPLE_LINES:
+            draw.text((200, y), line, fill='black')
+            y += 60
+    return image
+
+
+def run_threads(paths, workers, lang):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(ocr_processor.ocr_page_image, Image.open(path), lang, ['tesseract'])
+            for path in paths
+        ]
+        wait(futures)
+    return time.perf_counter() - started
+
+
+def run_processes(paths, lang):
+    pool = ocr_processor.get_ocr_process_pool()
+    # Warm the workers so interpreter start-up is not attributed to OCR.
+    wait([pool.submit(os.getpid) for _ in range(ocr_processor.get_ocr_process_pool_size())])
+    started = time.perf_counter()
+    futures = [pool.submit(ocr_processor.ocr_page_file, path, lang, ['tesseract']) for path in paths]
+    wait(futures)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--lang', default='hun+eng')
+    args = parser.parse_args()
+
+    os.environ['OCR_PROCESS_POOL_WORKERS'] = str(args.workers)
+    page = render_page()
+    results = {'pages': args.pages, 'workers': args.workers}
+
+    with tempfile.TemporaryDirectory(prefix='contra-ocr-bench-') as spool_dir:
+        def spool():
+            paths = []
+            for number in range(args.pages):
+                path = os.path.join(spool_dir, f'page-{number}.ppm')
+                page.save(path)
+                paths.append(path)
+            return paths
+
+        thread_workers = min(args.workers, 6)
+        results['thread_seconds'] = run_threads(spool(), thread_workers, args.lang)
+        results['thread_workers'] = thread_workers
+        results['process_seconds'] = run_processes(spool(), args.lang)
+
+    for mode in ('thread', 'process'):
+        results[f'{mode}_pages_per_second'] = args.pages / max(results[f'{mode}_seconds'], 1e-9)
+    results['speedup'] = results['thread_seconds'] / max(results['process_seconds'], 1e-9)
+
+    print(json.dumps(results, indent=2))
+    ocr_processor.reset_ocr_process_pool()
+
+
+if __name__ == '__main__':
+    main()
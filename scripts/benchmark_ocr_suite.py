@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""End-to-end OCR benchmark on a synthetic Hungarian/English contract corpus.
+
+Usage:
+    python scripts/benchmark_ocr_suite.py --output bench/ocr-$(git rev-parse --short HEAD).json
+    python scripts/benchmark_ocr_suite.py --dpi 200 --distortions clean,skew --compare bench/ocr-baseline.json
+
+Every scenario (file type x DPI x distortion) is a small generated document that is
+run through ``extract_text_from_file`` in a fresh process, so peak RSS is per scenario.
+Page latency is the preprocessing plus OCR time the per-page pipeline logs; pages/sec
+is pages divided by the wall time of the whole extraction. Only the Tesseract provider
+is used and the OCR cache is off, so the run is offline and repeatable.
+"""
+
+import argparse
+import difflib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+HUNGARIAN_CLAUSES = [
+    "MEGBÍZÁSI SZERZŐDÉS",
+    "1. A Megbízó megbízza a Megbízottat a mellékletben részletezett feladatok ellátásával.",
+    "2. A megbízási díj havi bruttó 850 000 Ft, amely minden hónap 10. napjáig esedékes.",
+    "3. A szerződés határozatlan időre szól, felmondási ideje harminc nap.",
+    "4. Felek a szerződésből eredő vitás kérdéseket elsősorban tárgyalás útján rendezik.",
+    "5. A Megbízott titoktartási kötelezettsége a szerződés megszűnése után is fennáll.",
+    "6. Jelen szerződésben nem szabályozott kérdésekben a Polgári Törvénykönyv az irányadó.",
+]
+
+ENGLISH_CLAUSES = [
+    "SERVICE AGREEMENT",
+    "1. The Client engages the Contractor to perform the services described in Annex 1.",
+    "2. The monthly fee is HUF 850,000 gross, payable by the 10th day of each month.",
+    "3. This agreement is concluded for an indefinite term with thirty days notice.",
+    "4. The parties shall first attempt to settle any dispute by negotiation.",
+    "5. The confidentiality obligations survive the termination of this agreement.",
+    "6. Matters not regulated herein are governed by the Hungarian Civil Code.",
+]
+
+FILE_TYPES = ('pdf', 'png', 'tiff', 'docx', 'txt')
+IMAGE_TYPES = ('pdf', 'png', 'tiff')
+DISTORTIONS = ('clean', 'noise', 'skew', 'rotated')
+FONT_PATHS = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial.ttf',
+    'C:\\Windows\\Fonts\\arial.ttf',
+)
+
+# ``iter_ocr_page_results`` logs one record per page with these positional arguments.
+_PAGE_LOG_PREFIX = "%s page %s OCR via"
+
+
+def page_clauses(page_index):
+    """Ground-truth lines of a page; pages alternate between Hungarian and English."""
+    clauses = HUNGARIAN_CLAUSES if page_index % 2 == 0 else ENGLISH_CLAUSES
+    return [clauses[0]] + [f"{line} ({page_index + 1}/{index})" for index, line in enumerate(clauses[1:], 1)]
+
+
+def load_font(size):
+    for path in FONT_PATHS:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size=size)
+
+
+def render_page(lines, dpi, distortion, seed):
+    """Render an A4 page at ``dpi`` with 11 pt text and apply one distortion."""
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = load_font(max(int(11 * dpi / 72), 8))
+    margin = int(0.9 * dpi)
+    y = margin
+    line_height = int(font.size * 1.6)
+    for line in lines:
+        draw.text((margin, y), line, fill=0, font=font)
+        y += line_height * 2
+
+    rng = random.Random(seed)
+    if distortion == 'noise':
+        # Scanner speckle plus a light blur, roughly a worn photocopy.
+        noise = Image.effect_noise(page.size, 48)
+        page = Image.blend(page, noise, 0.25).filter(ImageFilter.GaussianBlur(0.6))
+        pixels = page.load()
+        for _ in range(width * height // 400):
+            pixels[rng.randrange(width), rng.randrange(height)] = rng.choice((0, 255))
+    elif distortion == 'skew':
+        page = page.rotate(rng.choice((-1, 1)) * 2.5, resample=Image.Resampling.BICUBIC, fillcolor=255)
+    elif distortion == 'rotated':
+        page = page.transpose(Image.Transpose.ROTATE_90)
+    return page
+
+
+def build_document(directory, case_number, file_type, dpi, distortion, pages):
+    """Write one corpus document and return ``(path, ground_truth)``."""
+    # Neutral file names: ``determine_ocr_language`` reads language hints from them.
+    path = os.path.join(directory, f'case-{case_number:03d}.{file_type}')
+    truth = [page_clauses(index) for index in range(pages)]
+
+    if file_type == 'txt':
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write('\n\n'.join('\n'.join(lines) for lines in truth))
+    elif file_type == 'docx':
+        import docx
+        from docx.enum.text import WD_BREAK
+
+        document = docx.Document()
+        for index, lines in enumerate(truth):
+            for line in lines:
+                document.add_paragraph(line)
+            if index < len(truth) - 1:
+                document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        document.save(path)
+    else:
+        images = [render_page(lines, dpi, distortion, seed=case_number * 100 + index) for index, lines in enumerate(truth)]
+        if file_type == 'pdf':
+            images[0].save(path, save_all=True, append_images=images[1:], resolution=dpi)
+        elif file_type == 'tiff':
+            # Multi-page bilevel fax-style TIFF.
+            frames = [image.convert('1') for image in images]
+            frames[0].save(path, save_all=True, append_images=frames[1:], dpi=(dpi, dpi), compression='group4')
+        else:
+            # A PNG holds one frame, so the pages are stacked into one tall scan.
+            stacked = Image.new('L', (images[0].width, sum(image.height for image in images)), 255)
+            top = 0
+            for image in images:
+                stacked.paste(image, (0, top))
+                top += image.height
+            stacked.save(path, dpi=(dpi, dpi))
+    return path, '\n'.join('\n'.join(lines) for lines in truth)
+
+
+def build_scenarios(args):
+    scenarios = []
+    for file_type in args.types:
+        if file_type in IMAGE_TYPES:
+            for dpi in args.dpi:
+                for distortion in args.distortions:
+                    scenarios.append({'file_type': file_type, 'dpi': dpi, 'distortion': distortion})
+        else:
+            scenarios.append({'file_type': file_type, 'dpi': None, 'distortion': 'clean'})
+    return scenarios
+
+
+class _PageRecorder(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.pages = []
+
+    def emit(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith(_PAGE_LOG_PREFIX):
+            _, _, provider, quality, preprocess_ms, ocr_ms = record.args[:6]
+            self.pages.append({
+                'provider': provider,
+                'quality_score': quality,
+                'latency_ms': preprocess_ms + ocr_ms,
+            })
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_scenario(task):
+    """Generate and extract one document; runs in a fresh process."""
+    scenario, pages, lang, case_number = task
+    os.environ.update({
+        'OCR_PROVIDER_CHAIN': 'tesseract',
+        'OCR_CACHE_ENABLED': 'false',
+        'OCR_DEFAULT_LANG': lang,
+    })
+    os.environ.pop('OCR_SPACE_API_KEY', None)
+
+    import ocr_processor
+
+    recorder = _PageRecorder()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(recorder)
+    file_type = 'image' if scenario['file_type'] in {'png', 'tiff'} else scenario['file_type']
+
+    with tempfile.TemporaryDirectory(prefix='contra-ocr-suite-') as directory:
+        path, truth = build_document(
+            directory, case_number, scenario['file_type'], scenario['dpi'], scenario['distortion'], pages
+        )
+        started = time.perf_counter()
+        try:
+            text = ocr_processor.extract_text_from_file(path, file_type)
+            error = None
+        except Exception as exc:  # a scenario failing is a result, not a crash
+            text, error = '', str(exc)
+        elapsed = time.perf_counter() - started
+
+    latencies = [page['latency_ms'] for page in recorder.pages] or [elapsed * 1000 / pages]
+    scores = [page['quality_score'] for page in recorder.pages]
+    return {
+        **scenario,
+        'pages': pages,
+        'ocr_pages': len(recorder.pages),
+        'seconds': elapsed,
+        'pages_per_second': pages / max(elapsed, 1e-9),
+        'p50_page_ms': statistics.median(latencies),
+        'p95_page_ms': _percentile(latencies, 0.95),
+        'quality_score': statistics.fmean(scores) if scores else ocr_processor.calculate_text_quality(text),
+        'char_accuracy': difflib.SequenceMatcher(None, ' '.join(truth.split()), ' '.join(text.split())).ratio(),
+        # Linux reports ru_maxrss in KiB; Tesseract CLI runs show up under the children.
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_child_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'error': error,
+    }
+
+
+def scenario_key(result):
+    return f"{result['file_type']}/{result['dpi'] or '-'}/{result['distortion']}"
+
+
+def run_metadata():
+    def command_output(command):
+        try:
+            return subprocess.run(command, capture_output=True, text=True, cwd=REPO_ROOT, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    tesseract_version = command_output(['tesseract', '--version'])
+    return {
+        'commit': command_output(['git', 'rev-parse', 'HEAD']),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tesseract': tesseract_version.splitlines()[0] if tesseract_version else None,
+        'env': {
+            name: os.environ[name]
+            for name in sorted(os.environ)
+            if name.startswith('OCR_') and name != 'OCR_SPACE_API_KEY'
+        },
+    }
+
+
+def summarize(results):
+    ocr_results = [result for result in results if result['file_type'] in IMAGE_TYPES and not result['error']]
+    if not ocr_results:
+        return {}
+    pages = sum(result['pages'] for result in ocr_results)
+    seconds = sum(result['seconds'] for result in ocr_results)
+    return {
+        'ocr_pages': pages,
+        'ocr_pages_per_second': pages / max(seconds, 1e-9),
+        'median_p50_page_ms': statistics.median(result['p50_page_ms'] for result in ocr_results),
+        'max_p95_page_ms': max(result['p95_page_ms'] for result in ocr_results),
+        'mean_char_accuracy': statistics.fmean(result['char_accuracy'] for result in ocr_results),
+        'max_peak_rss_mb': max(result['peak_rss_mb'] for result in ocr_results),
+        'errors': sum(1 for result in results if result['error']),
+    }
+
+
+def compare(results, baseline_path):
+    """Per-scenario relative change against an earlier JSON report."""
+    with open(baseline_path, encoding='utf-8') as handle:
+        baseline = {scenario_key(result): result for result in json.load(handle)['scenarios']}
+    deltas = {}
+    for result in results:
+        before = baseline.get(scenario_key(result))
+        if not before:
+            continue
+        deltas[scenario_key(result)] = {
+            metric: (result[metric] - before[metric]) / before[metric] if before[metric] else None
+            for metric in ('pages_per_second', 'p95_page_ms', 'char_accuracy', 'peak_rss_mb')
+        }
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--types', default=','.join(FILE_TYPES))
+    parser.add_argument('--dpi', default='150,200,300')
+    parser.add_argument('--distortions', default=','.join(DISTORTIONS))
+    parser.add_argument('--pages', type=int, default=3, help='pages per generated document')
+    parser.add_argument('--lang', default='hun+eng')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--compare', help='earlier JSON report to diff against')
+    args = parser.parse_args()
+    args.types = [value for value in args.types.split(',') if value]
+    args.dpi = [int(value) for value in args.dpi.split(',') if value]
+    args.distortions = [value for value in args.distortions.split(',') if value]
+
+    if shutil.which('tesseract') is None:
+        sys.exit("tesseract is not on PATH; install tesseract-ocr with the hun and eng traineddata")
+    if 'pdf' in args.types and shutil.which('pdftoppm') is None:
+        sys.exit("pdftoppm is not on PATH; install poppler-utils or leave pdf out of --types")
+
+    scenarios = build_scenarios(args)
+    tasks = [(scenario, args.pages, args.lang, number) for number, scenario in enumerate(scenarios, 1)]
+    # One process per scenario keeps ru_maxrss from carrying over between scenarios.
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        results = []
+        for result in pool.imap(run_scenario, tasks):
+            results.append(result)
+            print(
+                f"{scenario_key(result):24} {result['pages_per_second']:6.2f} pages/s  "
+                f"p50 {result['p50_page_ms']:7.0f} ms  p95 {result['p95_page_ms']:7.0f} ms  "
+                f"accuracy {result['char_accuracy']:.3f}  rss {result['peak_rss_mb']:.0f} MB"
+                + (f"  ERROR {result['error']}" if result['error'] else ''),
+                file=sys.stderr,
+            )
+
+    report = {'meta': run_metadata(), 'summary': summarize(results), 'scenarios': results}
+    if args.compare:
+        report['compared_to'] = args.compare
+        report['deltas'] = compare(results, args.compare)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare per-page Tesseract latency of the CLI and warm tesserocr engines.
+
+Usage:
+    python scripts/benchmark_tesseract_engine.py --pages 20 --lang hun+eng
+
+Pages are OCR-ed one after another so the numbers are per-page latency, not
+throughput. The tesserocr run is skipped when the binding is not installed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import tesseract_engine  # noqa: E402
+
+SAMPLE_LINES = [
+    "MUNKASZERZŐDÉS / EMPLOYMENT AGREEMENT",
+    "A munkáltató és a munkavállaló az alábbi feltételekben állapodnak meg.",
+    "The employer and the employee agree on the following terms and conditions.",
+    "3. Felmondási idő: 30 nap, amely a munkaviszony idejével arányosan nő.",
+]
+
+
+def render_page(width=1240, height=1754):
+    """Render a synthetic A4 page at 150 DPI in grayscale."""
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    y = 120
+    while y < height - 120:
+        for line in SAMPLE_LINES:
+            draw.text((100, y), line, fill=0)
+            y += 40
+    return image
+
+
+def measure(engine, page, pages, lang, psm, oem):
+    latencies = []
+    for _ in range(pages):
+        started = time.perf_counter()
+        engine.image_to_string(page, lang, psm, oem)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[min(int(round(0.95 * (len(latencies) - 1))), len(latencies) - 1)],
+        'mean_ms': statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--lang', default='hun+eng')
+    parser.add_argument('--psm', default=os.environ.get('OCR_TESSERACT_PSM', '6'))
+    parser.add_argument('--oem', default=os.environ.get('OCR_TESSERACT_OEM', '3'))
+    args = parser.parse_args()
+
+    page = render_page()
+    results = {'pages': args.pages, 'lang': args.lang}
+    results['cli'] = measure(tesseract_engine.CliTesseractEngine(), page, args.pages, args.lang, args.psm, args.oem)
+
+    if tesseract_engine.tesserocr is not None:
+        pool = tesseract_engine.TesserocrEnginePool(max_instances=1)
+        # The first call loads traineddata; report it separately from the warm latency.
+        started = time.perf_counter()
+        pool.image_to_string(page, args.lang, args.psm, args.oem)
+        results['tesserocr_warmup_ms'] = (time.perf_counter() - started) * 1000
+        results['tesserocr'] = measure(pool, page, args.pages, args.lang, args.psm, args.oem)
+        results['p50_speedup'] = results['cli']['p50_ms'] / max(results['tesserocr']['p50_ms'], 1e-9)
+        pool.close()
+    else:
+        results['tesserocr'] = 'not installed'
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Declarative stage graph and a scheduler that starts each stage as soon as its inputs exist."""
+
+import asyncio
+import os
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Tuple
+
+
+class Stage(NamedTuple):
+    """One pipeline step: coroutine function ``run`` gets the outputs named in ``inputs`` as kwargs."""
+
+    name: str
+    run: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+
+
+def get_stage_concurrency() -> int:
+    return max(1, int(os.environ.get("ANALYSIS_MAX_CONCURRENT_STAGES", "6")))
+
+
+def topological_order(stages: Iterable[Stage], provided: Iterable[str] = ()) -> List[str]:
+    """Return stage names in dependency order; raises ``ValueError`` on unknown inputs or cycles."""
+    stages = list(stages)
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate stage names in graph")
+    available = set(provided)
+    known = available | set(names)
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in known]
+        if missing:
+            raise ValueError(f"Stage {stage.name} needs unknown inputs: {', '.join(missing)}")
+
+    order = []
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(name in available for name in stage.inputs)]
+        if not ready:
+            cycle = ", ".join(stage.name for stage in remaining)
+            raise ValueError(f"Stage graph has a cycle among: {cycle}")
+        for stage in ready:
+            order.append(stage.name)
+            available.add(stage.name)
+        remaining = [stage for stage in remaining if stage.name not in available]
+    return order
+
+
+def critical_path(stages: Iterable[Stage], durations: Mapping[str, float]) -> Tuple[float, List[str]]:
+    """Longest chain of ``durations`` through the graph: the best wall-clock time it allows."""
+    stages = {stage.name: stage for stage in stages}
+    finish: Dict[str, Tuple[float, List[str]]] = {}
+    for name in topological_order(stages.values()):
+        before = max(
+            (finish[dep] for dep in stages[name].inputs if dep in finish),
+            key=lambda item: item[0],
+            default=(0.0, []),
+        )
+        finish[name] = (before[0] + durations.get(name, 0.0), before[1] + [name])
+    return max(finish.values(), key=lambda item: item[0], default=(0.0, []))
+
+
+async def run_stage_graph(
+    stages: Iterable[Stage],
+    *,
+    max_workers: int = None,
+    provided: Mapping[str, Any] = None,
+) -> Dict[str, Any]:
+    """
+    Run the coroutine ``stages`` on the current event loop and return every output by name.
+
+    A stage is started the moment all of its inputs are available, so the run takes
+    as long as the graph's critical path rather than the sum of its stages. At most
+    ``max_workers`` stages (``ANALYSIS_MAX_CONCURRENT_STAGES``, default 6) run at once.
+    ``provided`` seeds outputs that exist before the run. The first failing stage
+    cancels the rest and its exception is re-raised.
+    """
+    stages = list(stages)
+    topological_order(stages, provided or ())
+    results: Dict[str, Any] = dict(provided or {})
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    limit = asyncio.Semaphore(max_workers or get_stage_concurrency())
+
+    async def run_limited(stage, kwargs):
+        async with limit:
+            return await stage.run(**kwargs)
+
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.inputs):
+                    kwargs = {dep: results[dep] for dep in stage.inputs}
+                    running[asyncio.ensure_future(run_limited(stage, kwargs))] = name
+                    del pending[name]
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[running.pop(task)] = task.result()
+    except BaseException:
+        for task in running:
+            task.cancel()
+        raise
+    return results
@@ -0,0 +1,158 @@
+"""Tesseract back-ends: one CLI process per call, or warm in-process engines via tesserocr."""
+
+import logging
+import os
+import re
+from contextlib import contextmanager
+from threading import Condition, Lock
+
+import pytesseract
+
+try:  # optional dependency – builds against libtesseract-dev
+    import tesserocr
+except ImportError:  # pragma: no cover - exercised when tesserocr is not installed
+    tesserocr = None
+
+
+class CliTesseractEngine:
+    """Runs the ``tesseract`` binary through pytesseract, reloading traineddata on every call."""
+
+    name = 'cli'
+
+    def image_to_string(self, image, lang, psm, oem, timeout=40):
+        config = f'--oem {oem} --psm {psm}'
+        return pytesseract.image_to_string(image, lang=lang, timeout=timeout, config=config)
+
+    def detect_rotation(self, image):
+        osd = pytesseract.image_to_osd(image)
+        match = re.search(r"Rotate:\s+(\d+)", osd)
+        return int(match.group(1)) % 360 if match else None
+
+    def stats(self):
+        return {'engine': self.name}
+
+    def close(self):
+        pass
+
+
+class TesserocrEnginePool:
+    """
+    Keeps initialised ``PyTessBaseAPI`` instances per ``(lang, oem)`` and lends them out.
+
+    Loading traineddata happens once per instance instead of once per page. An API object
+    is not thread-safe, so each call borrows one exclusively; callers queue on a condition
+    once ``max_instances`` engines are busy. tesserocr releases the GIL while recognising,
+    so borrowed engines run in parallel from the OCR thread pool. There is no per-call
+    timeout as with the CLI.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, max_instances):
+        self.max_instances = max(int(max_instances), 1)
+        self._idle = {}
+        self._created = 0
+        self._calls = 0
+        self._condition = Condition(Lock())
+
+    @contextmanager
+    def _borrow(self, lang, oem, psm=None):
+        key = (lang, int(oem))
+        with self._condition:
+            while True:
+                if self._idle.get(key):
+                    api = self._idle[key].pop()
+                    break
+                if self._created < self.max_instances:
+                    self._created += 1
+                    api = None
+                    break
+                if not self._evict_idle_engine():
+                    self._condition.wait()
+            self._calls += 1
+        if api is None:
+            try:
+                api = tesserocr.PyTessBaseAPI(lang=lang, oem=int(oem))
+                logging.info("Started warm Tesseract engine lang=%s oem=%s", lang, oem)
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+        try:
+            if psm is not None:
+                api.SetPageSegMode(int(psm))
+            yield api
+        finally:
+            api.Clear()
+            with self._condition:
+                self._idle.setdefault(key, []).append(api)
+                self._condition.notify()
+
+    def _evict_idle_engine(self):
+        """Close an idle engine loaded for another language so a new one can start."""
+        for engines in self._idle.values():
+            if engines:
+                engines.pop().End()
+                self._created -= 1
+                return True
+        return False
+
+    def image_to_string(self, image, lang, psm, oem, timeout=None):
+        with self._borrow(lang, oem, psm) as api:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+
+    def detect_rotation(self, image):
+        with self._borrow('osd', 0, tesserocr.PSM.OSD_ONLY) as api:
+            api.SetImage(image)
+            orientation = api.DetectOrientationScript()
+        if not orientation:
+            return None
+        # Tesseract reports the page's current orientation; rotating by its complement uprights it.
+        return (360 - int(orientation['orient_deg'])) % 360
+
+    def stats(self):
+        with self._condition:
+            return {
+                'engine': self.name,
+                'instances': self._created,
+                'idle': sum(len(engines) for engines in self._idle.values()),
+                'max_instances': self.max_instances,
+                'calls': self._calls,
+            }
+
+    def close(self):
+        with self._condition:
+            for engines in self._idle.values():
+                while engines:
+                    engines.pop().End()
+                    self._created -= 1
+
+
+_ENGINE = None
+_ENGINE_LOCK = Lock()
+
+
+def get_tesseract_engine():
+    """Return the process-wide engine chosen by ``OCR_TESSERACT_ENGINE`` (cli|tesserocr|auto)."""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            choice = (os.environ.get('OCR_TESSERACT_ENGINE') or 'auto').strip().lower()
+            if choice in {'tesserocr', 'auto'} and tesserocr is not None:
+                instances = os.environ.get('OCR_TESSERACT_ENGINE_INSTANCES') or os.cpu_count() or 1
+                _ENGINE = TesserocrEnginePool(int(instances))
+            else:
+                if choice == 'tesserocr':
+                    logging.warning("OCR_TESSERACT_ENGINE=tesserocr but tesserocr is not installed; using the CLI")
+                _ENGINE = CliTesseractEngine()
+        return _ENGINE
+
+
+def reset_tesseract_engine():
+    global _ENGINE
+    with _ENGINE_LOCK:
+        engine, _ENGINE = _ENGINE, None
+    if engine is not None:
+        engine.close()
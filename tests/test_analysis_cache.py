@@ -0,0 +1,89 @@
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import app, db  # noqa: E402
+from models import Analysis, AnalysisCacheEntry, Document, User  # noqa: E402
+from routes import process_document  # noqa: E402
+
+
+def _upload(user, path, allow_training):
+    doc = Document(
+        filename=os.path.basename(path),
+        original_filename=os.path.basename(path),
+        file_type="txt",
+        user_id=user.id,
+        allow_training=allow_training,
+    )
+    db.session.add(doc)
+    db.session.commit()
+    db.session.add(Analysis(document_id=doc.id))
+    db.session.commit()
+    return doc.id
+
+
+def test_identical_upload_reuses_previous_analysis(tmp_path):
+    contract = tmp_path / "contract.txt"
+    contract.write_text("Munkaszerződés a felek között.", encoding="utf-8")
+    result = {
+        "contract_type": "msz",
+        "summary": "Employment contract summary",
+        "summary_normal_en": "Employment contract summary",
+        "detected_language": "Hungarian",
+    }
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username="cache", email="cache@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+
+        first_id = _upload(user, str(contract), allow_training=True)
+        second_id = _upload(user, str(contract), allow_training=False)
+
+        with patch("routes.PlatformSetting.get", return_value="false"), \
+            patch("routes.extract_text_from_file", return_value="Munkaszerződés a felek között.") as extract, \
+            patch("routes.analyze_document", return_value=dict(result)) as analyze:
+            process_document(first_id, str(contract), "txt")
+            process_document(second_id, str(contract), "txt")
+
+        assert extract.call_count == 1
+        assert analyze.call_count == 1
+
+        first = Analysis.query.filter_by(document_id=first_id).one()
+        second = Analysis.query.filter_by(document_id=second_id).one()
+        assert second.status == "completed"
+        assert not first.is_encrypted and first.summary == "Employment contract summary"
+        assert second.is_encrypted and second.summary is None
+        assert second.resolved_summary() == "Employment contract summary"
+        assert second.resolved_extracted_text() == "Munkaszerződés a felek között."
+        assert second.detected_language == "Hungarian"
+        assert AnalysisCacheEntry.query.count() == 1
+
+
+def test_pipeline_change_invalidates_cached_analysis(tmp_path):
+    contract = tmp_path / "contract.txt"
+    contract.write_text("Bérleti szerződés.", encoding="utf-8")
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username="cache2", email="cache2@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+
+        first_id = _upload(user, str(contract), allow_training=True)
+        second_id = _upload(user, str(contract), allow_training=True)
+
+        with patch("routes.PlatformSetting.get", return_value="false"), \
+            patch("routes.extract_text_from_file", return_value="Bérleti szerződés."), \
+            patch("routes.analyze_document", return_value={"summary": "s"}) as analyze:
+            with patch("routes.get_pipeline_fingerprint", return_value="a" * 64):
+                process_document(first_id, str(contract), "txt")
+            with patch("routes.get_pipeline_fingerprint", return_value="b" * 64):
+                process_document(second_id, str(contract), "txt")
+
+        assert analyze.call_count == 2
@@ -0,0 +1,177 @@
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cms_main  # noqa: E402
+from cms_variables import m11_prompt, m13_prompt, m26_prompt, m30_prompt  # noqa: E402
+from document_chunks import chunk_document, chunks_for_reference, split_sections  # noqa: E402
+from llm_rate_limit import count_tokens  # noqa: E402
+
+FILLER = "A felek a szerződés teljesítése során együttműködnek, és egymást haladéktalanul tájékoztatják. "
+
+
+def build_contract(sections=12):
+    parts = ["MUNKASZERZŐDÉS\n\nAmely létrejött a Munkáltató és a Munkavállaló között.\n\n"]
+    for number in range(1, sections + 1):
+        parts.append(f"{number}. § Rendelkezés {number}\n\n{FILLER * 20}\n")
+        if number == 7:
+            parts.append("A felmondási időre a 2012. évi I. törvény (Mt.) 69. §-a irányadó.\n")
+    return "".join(parts)
+
+
+def test_chunks_follow_sections_and_rebuild_the_text():
+    text = build_contract()
+    chunks = chunk_document(text, max_tokens=1500)
+
+    assert len(chunks) > 2
+    assert "".join(chunks) == text
+    assert all(count_tokens(chunk) <= 1500 for chunk in chunks)
+    assert all(chunk.split(" ", 1)[0].rstrip(".").isdigit() for chunk in chunks[1:])
+    assert len(split_sections(text)) == 13
+
+
+def test_oversized_section_and_short_document():
+    long_clause = "1. § " + FILLER * 200
+    chunks = chunk_document(long_clause, max_tokens=500)
+
+    assert len(chunks) > 1 and "".join(chunks) == long_clause
+    assert chunk_document("Rövid szerződés.", max_tokens=500) == ["Rövid szerződés."]
+    assert chunk_document(long_clause, max_tokens=0) == [long_clause]
+
+
+def test_reference_picks_the_chunk_that_mentions_it():
+    chunks = chunk_document(build_contract(), max_tokens=1500)
+    expected = [chunk for chunk in chunks if "69. §-a" in chunk]
+
+    assert chunks_for_reference(chunks, "2012. évi I. törvény (Mt.) 69. §") == expected
+    assert chunks_for_reference(chunks, "Mt. 69. §") == expected
+    assert chunks_for_reference(chunks, "Ismeretlen jogszabály") == chunks[:1]
+
+
+def test_long_contract_is_analyzed_by_map_reduce(monkeypatch):
+    monkeypatch.setenv("CMS_CHUNK_MAX_TOKENS", "1500")
+    text = build_contract()
+    chunks = chunk_document(text, max_tokens=1500)
+    requests = []
+
+    async def fake_acreate(model, messages, **kwargs):
+        system = messages[0]["content"]
+        user = messages[-1]["content"]
+        requests.append((system, user))
+        reply = "ok"
+        if system == m11_prompt:
+            reply = "0"
+        elif system == m13_prompt:
+            reply = "1. 2012. évi I. törvény (Mt.) 69. §" if "69. §-a" in user else ""
+        elif system == m26_prompt:
+            reply = "1"
+        return {"choices": [{"message": {"content": reply}}]}
+
+    async def fake_detection(first_words, last_words, **kwargs):
+        return "hu"
+
+    with patch("cms_main.openai.ChatCompletion.acreate", side_effect=fake_acreate), \
+        patch("cms_main.run_language_detection_async", side_effect=fake_detection):
+        result = cms_main.analyze_document(text, "key", store_conversation=False)
+
+    assert result["document_chunks"] == len(chunks)
+    calls = {}
+    for system, _ in requests:
+        calls[system] = calls.get(system, 0) + 1
+    assert calls[m13_prompt] == len(chunks)
+    assert calls[m30_prompt] == len(chunks) + 1
+    m26_inputs = [user for system, user in requests if system == m26_prompt]
+    assert len(m26_inputs) == 1
+    assert "69. §-a" in m26_inputs[0] and len(m26_inputs[0]) < len(text) / 2
+    assert all(text not in user for _, user in requests)
+
+
+def test_single_chunk_keeps_m13_references_as_listed(monkeypatch):
+    references = []
+
+    async def fake_acreate(model, messages, **kwargs):
+        system = messages[0]["content"]
+        reply = "ok"
+        if system == m11_prompt:
+            reply = "0"
+        elif system == m13_prompt:
+            reply = "1. Mt. 45. §\n2. mt. 45. §"
+        elif system == m26_prompt:
+            references.append(messages[-1]["content"])
+            reply = "1"
+        return {"choices": [{"message": {"content": reply}}]}
+
+    async def fake_detection(first_words, last_words, **kwargs):
+        return "hu"
+
+    with patch("cms_main.openai.ChatCompletion.acreate", side_effect=fake_acreate), \
+        patch("cms_main.run_language_detection_async", side_effect=fake_detection):
+        result = cms_main.analyze_document("Rövid szerződés. (Mt. 45. §)", "key", store_conversation=False)
+
+    assert result["document_chunks"] == 1
+    assert len(references) == 2
+
+
+def test_m13_drops_only_references_an_earlier_chunk_listed(monkeypatch):
+    monkeypatch.setenv("CMS_CHUNK_MAX_TOKENS", "1500")
+    text = build_contract()
+    chunks = chunk_document(text, max_tokens=1500)
+    references = []
+
+    async def fake_acreate(model, messages, **kwargs):
+        system = messages[0]["content"]
+        user = messages[-1]["content"]
+        reply = "ok"
+        if system == m11_prompt:
+            reply = "0"
+        elif system == m13_prompt:
+            reply = "1. Mt. 45. §\n2. mt. 45. §" if chunks[0] in user else "1. Mt. 45. §\n2. Ptk. 6:1"
+        elif system == m26_prompt:
+            references.append(user.rsplit("Legal reference: ", 1)[-1].strip())
+            reply = "0"
+        return {"choices": [{"message": {"content": reply}}]}
+
+    async def fake_detection(first_words, last_words, **kwargs):
+        return "hu"
+
+    with patch("cms_main.openai.ChatCompletion.acreate", side_effect=fake_acreate), \
+        patch("cms_main.run_language_detection_async", side_effect=fake_detection):
+        cms_main.analyze_document(text, "key", store_conversation=False)
+
+    assert sorted(references) == ["Mt. 45. §", "Ptk. 6:1", "mt. 45. §"]
+
+
+def test_document_first_reference_checks_reuse_the_chunk_prefix(monkeypatch):
+    monkeypatch.setenv("CMS_CHUNK_MAX_TOKENS", "1500")
+    monkeypatch.setenv("CMS_PROMPT_LAYOUT", "document_first")
+    text = build_contract()
+    chunks = chunk_document(text, max_tokens=1500)
+    cited = chunks_for_reference(chunks, "Rendelkezés 1")
+    requests = {}
+
+    async def fake_acreate(model, messages, **kwargs):
+        system = [message["content"] for message in messages if message["role"] == "system"][-1]
+        requests.setdefault(system, []).append(messages)
+        reply = "ok"
+        if system == m11_prompt:
+            reply = "0"
+        elif system == m13_prompt:
+            reply = "1. Rendelkezés 1" if messages[1]["content"] == f"Document: {chunks[0]}" else ""
+        elif system == m26_prompt:
+            reply = "1"
+        return {"choices": [{"message": {"content": reply}}]}
+
+    async def fake_detection(first_words, last_words, **kwargs):
+        return "hu"
+
+    with patch("cms_main.openai.ChatCompletion.acreate", side_effect=fake_acreate), \
+        patch("cms_main.run_language_detection_async", side_effect=fake_detection):
+        cms_main.analyze_document(text, "key", store_conversation=False)
+
+    assert len(cited) == 2
+    [m26_messages] = requests[m26_prompt]
+    assert m26_messages[:2] in [messages[:2] for messages in requests[m13_prompt]]
+    assert m26_messages[1]["content"] == f"Document: {cited[0]}"
+    assert m26_messages[-1]["content"] == f"Further excerpt: {cited[1]}\nLegal reference: Rendelkezés 1"
@@ -0,0 +1,83 @@
+import sys
+from pathlib import Path
+
+import docx
+from docx.enum.text import WD_BREAK
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from docx_text import iter_docx_pages  # noqa: E402
+
+
+def _python_docx_pages(path):
+    """The python-docx object-graph extraction the streaming parser replaces."""
+    document = docx.Document(path)
+    pages, parts = [], []
+
+    def push_page():
+        page = '\n'.join(parts).strip()
+        if page:
+            pages.append(page)
+        parts.clear()
+
+    for child in document.element.body.iterchildren():
+        if child.tag.endswith('}p'):
+            paragraph = Paragraph(child, document)
+            if paragraph.text.strip():
+                parts.append(paragraph.text.strip())
+            if child.xpath('./w:r/w:br[@w:type="page"]'):
+                push_page()
+        elif child.tag.endswith('}tbl'):
+            lines = []
+            for row in Table(child, document).rows:
+                cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+                if cells:
+                    lines.append(' | '.join(cells))
+            if lines:
+                parts.append('\n'.join(lines))
+    push_page()
+    return pages
+
+
+def _contract(path):
+    document = docx.Document()
+    document.add_heading('MUNKASZERZŐDÉS', level=1)
+    intro = document.add_paragraph('Felek:\t')
+    intro.add_run('Példa Kft.').add_break()
+    intro.add_run('  és Kovács Anna  ')
+    document.add_paragraph('   ')
+
+    table = document.add_table(rows=4, cols=3)
+    for row_index, row in enumerate(table.rows):
+        for col_index, cell in enumerate(row.cells):
+            cell.text = f'r{row_index}c{col_index}'
+    table.cell(0, 0).merge(table.cell(0, 1)).text = 'Megnevezés'
+    table.cell(1, 2).merge(table.cell(3, 2)).text = 'Összesen\n1 000 Ft'
+    table.cell(2, 0).text = ''
+    table.cell(3, 1).add_table(rows=1, cols=1).cell(0, 0).text = 'nested'
+
+    page_end = document.add_paragraph('1. oldal vége')
+    page_end.add_run().add_break(WD_BREAK.PAGE)
+    document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.add_paragraph('2. A munkavállaló feladatai')
+    document.add_paragraph('Employer – employee agreement').runs[0].add_break(WD_BREAK.COLUMN)
+    document.save(path)
+
+
+def test_streaming_pages_match_python_docx(tmp_path):
+    path = tmp_path / 'contract.docx'
+    _contract(path)
+
+    pages = list(iter_docx_pages(path))
+
+    assert pages == _python_docx_pages(path)
+    assert len(pages) == 2
+    assert 'Megnevezés | Megnevezés | r0c2' in pages[0]
+    assert 'r1c0 | r1c1 | Összesen\n1 000 Ft' in pages[0]
+    assert 'r3c0 | r3c1 | Összesen\n1 000 Ft' in pages[0]
+    assert 'nested' not in pages[0]
+    assert pages[0].splitlines()[1:3] == ['Felek:\tPélda Kft.', '  és Kovács Anna']
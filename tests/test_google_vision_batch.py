@@ -0,0 +1,109 @@
+import base64
+import importlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+os.environ.setdefault('OCR_CACHE_ENABLED', 'false')
+
+FAKED_GOOGLE_MODULES = (
+    'google',
+    'google.cloud',
+    'google.cloud.vision',
+    'google.oauth2',
+    'google.oauth2.service_account',
+)
+
+
+class FakeVisionHandler(BaseHTTPRequestHandler):
+    """Answers images:annotate with the byte length and language hints of every image."""
+
+    batches = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.batches.append(len(body['requests']))
+        responses = []
+        for item in body['requests']:
+            content = base64.b64decode(item['image']['content'])
+            hints = ','.join(item.get('imageContext', {}).get('languageHints', []))
+            if content.startswith(b'\xff\xd8'):
+                kind = 'jpeg'
+            elif content.startswith(b'\x89PNG'):
+                kind = 'png'
+            else:
+                kind = 'other'
+            responses.append({'fullTextAnnotation': {'text': f'{kind} page {hints}'}})
+        payload = json.dumps({'responses': responses}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_vision_server():
+    pytest.importorskip('google.cloud.vision')
+    FakeVisionHandler.batches = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeVisionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+
+
+def load_ocr_module_with_real_vision():
+    # Other OCR tests install stand-in google modules; drop them so the real client loads.
+    for name in FAKED_GOOGLE_MODULES:
+        module = sys.modules.get(name)
+        if module is not None and getattr(module, '__spec__', None) is None:
+            del sys.modules[name]
+    sys.modules.pop('ocr_processor', None)
+    return importlib.import_module('ocr_processor')
+
+
+def test_pages_are_batched_into_few_requests(monkeypatch, fake_vision_server):
+    monkeypatch.setenv('OCR_GOOGLE_VISION_ENDPOINT', fake_vision_server)
+    monkeypatch.setenv('OCR_GOOGLE_VISION_BATCH_SIZE', '4')
+    monkeypatch.setenv('OCR_GOOGLE_VISION_BATCH_LINGER_MS', '500')
+    monkeypatch.setenv('OCR_GOOGLE_VISION_IMAGE_FORMAT', 'jpeg')
+    ocr = load_ocr_module_with_real_vision()
+
+    page = Image.new('L', (64, 64), 255)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: ocr.run_google_vision_ocr(page, 'hun+eng'), range(8)))
+
+    assert [text for text, _ in results] == ['jpeg page hu,en'] * 8
+    assert all(meta['status'] == 'ok' for _, meta in results)
+    assert sum(FakeVisionHandler.batches) == 8
+    assert len(FakeVisionHandler.batches) <= 3
+    assert ocr.get_google_vision_batcher().stats == {'requests': len(FakeVisionHandler.batches), 'images': 8}
+
+
+def test_single_page_requests_without_batching(monkeypatch, fake_vision_server):
+    monkeypatch.setenv('OCR_GOOGLE_VISION_ENDPOINT', fake_vision_server)
+    monkeypatch.delenv('OCR_GOOGLE_VISION_BATCH_SIZE', raising=False)
+    monkeypatch.delenv('OCR_GOOGLE_VISION_IMAGE_FORMAT', raising=False)
+    ocr = load_ocr_module_with_real_vision()
+
+    text, meta = ocr.run_google_vision_ocr(Image.new('1', (32, 32), 1), 'eng')
+
+    assert (text, meta['status']) == ('png page en', 'ok')
+    assert FakeVisionHandler.batches == [1]
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from llm_client import run_llm  # noqa: E402
+
+
+def test_completions_reuse_pooled_keep_alive_connections(monkeypatch):
+    client_ports = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            client_ports.add(self.client_address[1])
+            body = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(openai, "api_base", f"http://127.0.0.1:{server.server_port}/v1")
+
+    async def ask():
+        response = await openai.ChatCompletion.acreate(
+            model="gpt-4.1-mini", messages=[{"role": "user", "content": "hi"}], api_key="sk-test"
+        )
+        return response["choices"][0]["message"]["content"]
+
+    try:
+        answers = [run_llm(ask()) for _ in range(5)]
+    finally:
+        server.shutdown()
+
+    assert answers == ["ok"] * 5
+    assert len(client_ports) == 1
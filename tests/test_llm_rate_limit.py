@@ -0,0 +1,178 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import openai
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from llm_rate_limit import (  # noqa: E402
+    MemoryBucketStore,
+    RateLimiter,
+    RedisBucketStore,
+    SQLiteBucketStore,
+    create_chat_completion,
+    get_model_limits,
+)
+
+
+def test_buckets_take_all_or_nothing():
+    store = MemoryBucketStore()
+    buckets = [("r", 1, 2, 1.0), ("t", 60, 100, 10.0)]
+
+    assert store.take(buckets) == 0
+    wait = store.take(buckets)
+    # Requests still fit, tokens lack 20 at 10/s.
+    assert wait == pytest.approx(2.0, abs=0.05)
+    assert store.take([("r", 1, 2, 1.0)]) == 0
+
+
+def test_sqlite_buckets_are_shared_between_stores(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+
+    assert first.take([("openai:m:requests", 3, 3, 0.01)]) == 0
+    assert second.take([("openai:m:requests", 1, 3, 0.01)]) > 0
+    second.give("openai:m:requests", 1, 3, 0.01)
+    assert first.take([("openai:m:requests", 1, 3, 0.01)]) == 0
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def bucket_store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    if request.param == "sqlite":
+        return SQLiteBucketStore(str(tmp_path / "limits.sqlite3"))
+    redis = pytest.importorskip("redis")
+    store = RedisBucketStore(os.environ.get("REDIS_URL", "redis://localhost:6379/15"))
+    try:
+        store._client.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip("no Redis server")
+    store._client.delete("openai:give-test:tokens")
+    return store
+
+
+def test_give_charges_overage_and_clamps_refunds(bucket_store):
+    bucket = ("openai:give-test:tokens", 10, 10, 0.01)
+    assert bucket_store.take([bucket]) == 0
+
+    # A call used 5 tokens more than it reserved from the drained bucket.
+    bucket_store.give(bucket[0], -5, 10, 0.01)
+    assert bucket_store.take([("openai:give-test:tokens", 1, 10, 0.01)]) == pytest.approx(600, rel=0.01)
+
+    bucket_store.give(bucket[0], 100, 10, 0.01)
+    assert bucket_store.take([bucket]) == 0
+    assert bucket_store.take([("openai:give-test:tokens", 1, 10, 0.01)]) > 0
+
+
+def test_model_limits_come_from_environment(monkeypatch):
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "gpt-4.1=100/20000, custom=5/0")
+    assert get_model_limits("gpt-4.1") == (100, 20000)
+    assert get_model_limits("custom") == (5, 0)
+    # Models without a configured budget are not throttled.
+    assert get_model_limits("gpt-4.1-mini") == (0, 0)
+
+
+def test_queued_calls_are_released_by_priority(monkeypatch):
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "queue-model=600/0")
+    limiter = RateLimiter(MemoryBucketStore())
+    released = []
+
+    async def scenario():
+        # Use up the burst so the next calls have to queue (ten per second).
+        for _ in range(600):
+            await limiter.acquire("queue-model", 1)
+
+        async def call(name, priority):
+            await limiter.acquire("queue-model", 1, priority)
+            released.append(name)
+
+        tasks = [asyncio.ensure_future(call(name, priority)) for name, priority in [("m11", -11), ("m50", -50)]]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+
+    asyncio.run(scenario())
+    assert released == ["m50", "m11"]
+
+
+def test_rate_limited_call_honours_retry_after(monkeypatch):
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "retry-model=600/0")
+    monkeypatch.setenv("OPENAI_BACKOFF_BASE_SECONDS", "0.01")
+    calls = []
+
+    async def fake_acreate(**kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise openai.error.RateLimitError("slow down", headers={"retry-after": "0.3"})
+        return {"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 10}}
+
+    with patch("llm_rate_limit.openai.ChatCompletion.acreate", side_effect=fake_acreate):
+        response = asyncio.run(create_chat_completion(model="retry-model", messages=[{"role": "user", "content": "x"}]))
+
+    assert response["choices"][0]["message"]["content"] == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.3
+
+
+def test_invalid_requests_are_not_retried(monkeypatch):
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "invalid-model=600/0")
+    attempts = []
+
+    async def fake_acreate(**kwargs):
+        attempts.append(kwargs)
+        raise openai.error.InvalidRequestError("bad", param=None)
+
+    with patch("llm_rate_limit.openai.ChatCompletion.acreate", side_effect=fake_acreate):
+        with pytest.raises(openai.error.InvalidRequestError):
+            asyncio.run(create_chat_completion(model="invalid-model", messages=[]))
+    assert len(attempts) == 1
+
+
+def test_shared_store_calls_run_off_the_event_loop(monkeypatch):
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "thread-model=600/0")
+    threads = []
+
+    class SlowStore(MemoryBucketStore):
+        blocking = True
+
+        def take(self, buckets):
+            threads.append(threading.get_ident())
+            return super().take(buckets)
+
+    limiter = RateLimiter(SlowStore())
+
+    async def scenario():
+        await limiter.acquire("thread-model", 1)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert threads and loop_thread not in threads
+
+
+def test_tokens_are_only_counted_off_the_loop_for_token_budgets(monkeypatch):
+    counted = []
+
+    def fake_estimate(model, messages, max_tokens=None):
+        counted.append((model, threading.get_ident()))
+        return 10
+
+    async def fake_acreate(**kwargs):
+        return {"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 10}}
+
+    async def call(model):
+        await create_chat_completion(model=model, messages=[{"role": "user", "content": "x"}])
+        return threading.get_ident()
+
+    monkeypatch.setenv("OPENAI_RATE_LIMITS", "tpm-model=0/100000")
+    monkeypatch.setattr("llm_rate_limit.estimate_tokens", fake_estimate)
+    with patch("llm_rate_limit.openai.ChatCompletion.acreate", side_effect=fake_acreate):
+        asyncio.run(call("unlimited-model"))
+        loop_thread = asyncio.run(call("tpm-model"))
+
+    assert [model for model, _ in counted] == ["tpm-model"]
+    assert counted[0][1] != loop_thread
@@ -0,0 +1,113 @@
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from test_ocr_processor import load_ocr_module  # noqa: E402
+
+import ocr_cache  # noqa: E402
+
+
+def test_cache_round_trip_counts_hits_and_misses(tmp_path):
+    cache = ocr_cache.OCRResultCache(str(tmp_path / 'ocr.sqlite3'), max_bytes=1024 * 1024)
+    key = ocr_cache.make_cache_key(Image.new('L', (8, 8), 255), 'hun+eng', ['tesseract'])
+
+    assert cache.get(key) is None
+    cache.put(key, 'Szerződés szövege', {'provider': 'tesseract', 'quality_score': 0.8})
+
+    text, meta = cache.get(key)
+    assert text == 'Szerződés szövege'
+    assert meta['provider'] == 'tesseract'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_cache_key_depends_on_pixels_language_and_chain():
+    white = Image.new('L', (8, 8), 255)
+    black = Image.new('L', (8, 8), 0)
+    base = ocr_cache.make_cache_key(white, 'hun', ['tesseract'])
+
+    assert base == ocr_cache.make_cache_key(white.copy(), 'hun', ['tesseract'])
+    assert base != ocr_cache.make_cache_key(black, 'hun', ['tesseract'])
+    assert base != ocr_cache.make_cache_key(white, 'eng', ['tesseract'])
+    assert base != ocr_cache.make_cache_key(white, 'hun', ['google_vision', 'tesseract'])
+    assert base != ocr_cache.make_cache_key(white, 'hun', ['tesseract'], ('psm=4', 'oem=3', 'engine=cli'))
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = ocr_cache.OCRResultCache(str(tmp_path / 'ocr.sqlite3'), max_bytes=600)
+    for key in ('a' * 64, 'b' * 64, 'c' * 64):
+        cache.put(key, 'x' * 40, {'provider': 'tesseract'})
+        if key == 'b' * 64:
+            cache.get('a' * 64)
+
+    assert cache.get('a' * 64) is not None
+    assert cache.get('b' * 64) is None
+    assert cache.stats()['bytes'] <= 600
+
+
+def test_cached_page_skips_providers(monkeypatch, tmp_path):
+    ocr = load_ocr_module()
+    calls = []
+
+    def fake_run(image, lang, providers):
+        calls.append(lang)
+        return 'page text', {
+            'provider': 'tesseract',
+            'quality_score': 0.7,
+            'reason': 'quality_threshold_met',
+            'upload_bytes': 2048,
+            'encode_ms': 12.5,
+            'encode_cached': False,
+            'race': {'tesseract': 'won'},
+        }
+
+    monkeypatch.setattr(ocr_cache, '_CACHE', None)
+    monkeypatch.setenv('OCR_CACHE_ENABLED', 'true')
+    monkeypatch.setenv('OCR_CACHE_PATH', str(tmp_path / 'ocr.sqlite3'))
+    monkeypatch.setattr(ocr, 'run_ocr_with_fallback', fake_run)
+
+    page = Image.new('L', (16, 16), 255)
+    first = ocr.run_cached_ocr(page, 'hun+eng', ['tesseract'])
+    second = ocr.run_cached_ocr(page.copy(), 'hun+eng', ['tesseract'])
+
+    assert first[0] == second[0] == 'page text'
+    assert second[1]['cache'] == 'hit'
+    assert (second[1]['encode_ms'], second[1]['upload_bytes']) == (0.0, 0)
+    assert 'race' not in second[1] and 'encode_cached' not in second[1]
+    assert second[1]['quality_score'] == 0.7
+    assert first[1]['upload_bytes'] == 2048
+    assert calls == ['hun+eng']
+
+
+def test_rotated_key_entries_are_misses_and_dropped(monkeypatch, tmp_path):
+    cache = ocr_cache.OCRResultCache(str(tmp_path / 'ocr.sqlite3'), max_bytes=1024 * 1024)
+    cache.put('a' * 64, 'Szerződés szövege', {'provider': 'tesseract'})
+    monkeypatch.setattr(ocr_cache, 'decrypt_value', lambda token: '')
+
+    assert cache.get('a' * 64) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_below_threshold_fallback_is_not_cached(monkeypatch, tmp_path):
+    ocr = load_ocr_module()
+    calls = []
+
+    def fake_run(image, lang, providers):
+        calls.append(lang)
+        return 'zaj', {'provider': 'tesseract', 'quality_score': 0.1, 'reason': 'success'}
+
+    monkeypatch.setattr(ocr_cache, '_CACHE', None)
+    monkeypatch.setenv('OCR_CACHE_ENABLED', 'true')
+    monkeypatch.setenv('OCR_CACHE_PATH', str(tmp_path / 'ocr.sqlite3'))
+    monkeypatch.setattr(ocr, 'run_ocr_with_fallback', fake_run)
+
+    page = Image.new('L', (16, 16), 255)
+    ocr.run_cached_ocr(page, 'hun', ['google_vision', 'tesseract'])
+    ocr.run_cached_ocr(page, 'hun', ['google_vision', 'tesseract'])
+
+    assert len(calls) == 2
@@ -0,0 +1,128 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app import app, db
+from models import User, Document, Analysis, OcrPageCheckpoint
+from ocr_checkpoints import claim_stalled_analysis, find_stalled_analyses
+from routes import process_document
+from encryption_utils import decrypt_value
+
+
+def _create_pdf_document(tmp_path):
+    user = User(username="u", email="u@e", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    doc = Document(filename="f.pdf", original_filename="f.pdf", file_type="pdf", user_id=user.id)
+    db.session.add(doc)
+    db.session.commit()
+    db.session.add(Analysis(document_id=doc.id))
+    db.session.commit()
+    path = tmp_path / "f.pdf"
+    path.write_bytes(b"%PDF-1.4 three pages")
+    return doc, str(path)
+
+
+def test_interrupted_ocr_resumes_from_checkpointed_pages(tmp_path):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doc, path = _create_pdf_document(tmp_path)
+
+        def crashing_pages(file_path, completed_pages=None):
+            yield 0, "első oldal", None
+            yield 1, "második oldal", None
+            raise RuntimeError("worker died")
+
+        with patch("routes.iter_pdf_page_texts", side_effect=crashing_pages), \
+            patch("routes.analyze_document", return_value={}), \
+            patch("routes.PlatformSetting.get", return_value="false"):
+            process_document(doc.id, path, "pdf")
+
+        analysis = Analysis.query.filter_by(document_id=doc.id).first()
+        assert analysis.pages_done == 2
+        assert OcrPageCheckpoint.query.filter_by(document_id=doc.id).count() == 2
+
+        seen = {}
+
+        def remaining_pages(file_path, completed_pages=None):
+            seen.update(completed_pages)
+            yield 2, "harmadik oldal", None
+            for index, text in sorted(completed_pages.items()):
+                yield index, text, 3
+
+        with patch("routes.iter_pdf_page_texts", side_effect=remaining_pages), \
+            patch("routes.analyze_document", return_value={}), \
+            patch("routes.PlatformSetting.get", return_value="false"):
+            process_document(doc.id, path, "pdf")
+
+        assert seen == {0: "első oldal", 1: "második oldal"}
+        db.session.expire_all()
+        analysis = Analysis.query.filter_by(document_id=doc.id).first()
+        assert analysis.status == "completed"
+        assert (analysis.pages_done, analysis.pages_total) == (3, 3)
+        text = decrypt_value(analysis.encrypted_extracted_text)
+        assert text.index("első") < text.index("második") < text.index("harmadik")
+        assert OcrPageCheckpoint.query.filter_by(document_id=doc.id).count() == 0
+
+
+def test_stalled_analysis_is_claimed_once(tmp_path):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doc, _ = _create_pdf_document(tmp_path)
+        analysis = Analysis.query.filter_by(document_id=doc.id).first()
+        analysis.status = "ocr"
+        analysis.progress_at = datetime.utcnow() - timedelta(minutes=30)
+        db.session.commit()
+
+        stalled = find_stalled_analyses()
+        assert [a.id for a in stalled] == [analysis.id]
+        assert claim_stalled_analysis(stalled[0]) is True
+        assert claim_stalled_analysis(stalled[0]) is False
+        assert find_stalled_analyses() == []
+
+
+def test_deleting_failed_pdf_removes_its_checkpoints(tmp_path):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doc, path = _create_pdf_document(tmp_path)
+
+        def crashing_pages(file_path, completed_pages=None):
+            yield 0, "első oldal", None
+            raise RuntimeError("vision outage")
+
+        with patch("routes.iter_pdf_page_texts", side_effect=crashing_pages), \
+            patch("routes.PlatformSetting.get", return_value="false"):
+            process_document(doc.id, path, "pdf")
+        assert OcrPageCheckpoint.query.filter_by(document_id=doc.id).count() == 1
+        doc_id, user_id = doc.id, doc.user_id
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+            sess["_csrf_token"] = "token"
+        client.post(f"/documents/{doc_id}/delete", data={"csrf_token": "token"})
+
+    with app.app_context():
+        assert db.session.get(Document, doc_id) is None
+        assert OcrPageCheckpoint.query.count() == 0
+
+
+def test_image_jobs_are_not_treated_as_stalled(tmp_path):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doc, _ = _create_pdf_document(tmp_path)
+        doc.file_type = "png"
+        analysis = Analysis.query.filter_by(document_id=doc.id).first()
+        analysis.status = "ocr"
+        analysis.progress_at = datetime.utcnow() - timedelta(minutes=30)
+        db.session.commit()
+
+        assert find_stalled_analyses() == []
@@ -0,0 +1,57 @@
+import sys
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from ocr_image_encoding import encode_page, is_bilevel, share_encodings  # noqa: E402
+
+
+def _binarized_page():
+    page = Image.new('L', (600, 800), 255)
+    draw = ImageDraw.Draw(page)
+    for top in range(40, 760, 30):
+        draw.text((30, top), 'Munkaszerződés / employment agreement 2024', fill=0)
+    return page.point(lambda value: 255 if value > 128 else 0)
+
+
+def test_bilevel_page_is_encoded_once_as_one_bit_png():
+    page = _binarized_page()
+    grayscale_png = BytesIO()
+    page.save(grayscale_png, format='PNG')
+
+    first, first_cached = encode_page(page, 'png')
+    second, second_cached = encode_page(page, 'png')
+
+    assert is_bilevel(page)
+    assert (first_cached, second_cached) == (False, True)
+    assert second is first
+    assert isinstance(first.view, memoryview)
+    assert first.size < len(grayscale_png.getvalue())
+    decoded = Image.open(BytesIO(first.view))
+    assert decoded.mode == '1'
+    assert decoded.convert('L').tobytes() == page.tobytes()
+    assert second.report(second_cached) == {
+        'upload_format': 'png',
+        'upload_bytes': first.size,
+        'encode_ms': 0.0,
+        'encode_cached': True,
+    }
+
+
+def test_copies_share_encodings_and_formats_are_kept_apart():
+    page = _binarized_page()
+    copy = page.copy()
+    share_encodings(page, copy)
+
+    png, _ = encode_page(page, 'png')
+    shared_png, cached = encode_page(copy, 'png')
+    jpeg, jpeg_cached = encode_page(copy, 'jpg', quality=70)
+
+    assert cached and shared_png is png
+    assert not jpeg_cached and jpeg.mime_type == 'image/jpeg'
+    assert not is_bilevel(Image.new('L', (4, 4), 128))
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import ocr_preprocessing  # noqa: E402
+
+
+def _noisy_page(seed=0, size=(96, 64)):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), 'RGB')
+
+
+def test_fixed_threshold_matches_pil_chain():
+    page = _noisy_page()
+    expected = ImageEnhance.Contrast(page.convert('L')).enhance(1.6)
+    expected = expected.filter(ImageFilter.MedianFilter(size=3))
+    expected = expected.point(lambda p: 255 if p > 170 else 0)
+
+    result, steps = ocr_preprocessing.preprocess_grayscale(page, contrast_factor=1.6, threshold=170)
+
+    assert result.mode == 'L'
+    assert np.array_equal(np.asarray(result), np.asarray(expected))
+    assert steps == ['grayscale', 'contrast_1.6', 'median_denoise', 'binarize_170']
+
+
+def test_median_network_matches_pil_median_filter():
+    gray = _noisy_page(seed=3).convert('L')
+    expected = np.asarray(gray.filter(ImageFilter.MedianFilter(size=3)))
+
+    assert np.array_equal(ocr_preprocessing.median3x3(np.asarray(gray)), expected)
+
+
+def test_otsu_and_adaptive_modes_binarize():
+    page = Image.new('RGB', (40, 40), (200, 200, 200))
+    page.paste((40, 40, 40), (10, 10, 30, 30))
+
+    for mode in ('otsu', 'adaptive'):
+        result, steps = ocr_preprocessing.preprocess_grayscale(page, mode=mode, denoise=False)
+        values = set(np.unique(np.asarray(result)).tolist())
+        assert values <= {0, 255}
+        assert np.asarray(result)[20, 20] == 0
+        assert np.asarray(result)[2, 2] == 255
+        assert steps[-1].startswith(f'binarize_{mode}')
@@ -1,4 +1,5 @@
 import importlib
+import os
 import sys
 import types
 from pathlib import Path
@@ -9,6 +10,10 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+# Keep OCR tests independent of the persistent page cache and of a locally installed tesserocr.
+os.environ.setdefault('OCR_CACHE_ENABLED', 'false')
+os.environ.setdefault('OCR_TESSERACT_ENGINE', 'cli')
+
 
 def load_ocr_module():
     fake_google = types.ModuleType('google')
@@ -45,6 +50,9 @@ def load_ocr_module():
     sys.modules['google.oauth2'] = fake_google_oauth2
     sys.modules['google.oauth2.service_account'] = fake_service_account
 
+    import ocr_health
+
+    ocr_health.reset_circuit_breakers()
     if 'ocr_processor' in sys.modules:
         return importlib.reload(sys.modules['ocr_processor'])
     return importlib.import_module('ocr_processor')
@@ -55,7 +63,7 @@ def test_pdf_uses_filename_language_hint(monkeypatch):
     seen = {}
 
     monkeypatch.setattr(ocr, 'convert_from_path', lambda *args, **kwargs: [Image.new('RGB', (10, 10), 'white')])
-    monkeypatch.setattr(ocr, 'preprocess_image', lambda img: img)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
 
     def fake_run(image, lang, providers):
         seen['lang'] = lang
@@ -97,3 +105,615 @@ def test_google_vision_is_accepted_without_quality_gate(monkeypatch):
     assert text == 'tiny'
     assert meta['provider'] == 'google_vision'
     assert not called['tesseract']
+
+
+def test_pdf_text_layer_skips_ocr_for_digital_pages(monkeypatch):
+    ocr = load_ocr_module()
+    digital_page = 'This employment agreement is entered into between the employer and the employee.'
+    rendered = []
+    ocr_calls = []
+
+    monkeypatch.setattr(ocr, 'extract_pdf_text_layer', lambda path: [digital_page, '   '])
+
+    def fake_convert(path, **kwargs):
+        rendered.append((kwargs.get('first_page'), kwargs.get('last_page')))
+        return [Image.new('RGB', (10, 10), 'white')]
+
+    def fake_run(image, lang, providers):
+        ocr_calls.append(lang)
+        return 'scanned signature page', {'provider': 'tesseract', 'quality_score': 0.9}
+
+    monkeypatch.setattr(ocr, 'convert_from_path', fake_convert)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
+    monkeypatch.setattr(ocr, 'run_ocr_with_fallback', fake_run)
+    monkeypatch.setattr(ocr, 'get_ocr_provider_chain', lambda: ['tesseract'])
+
+    text = ocr.extract_text_from_pdf('contract.pdf')
+
+    assert text == f'{digital_page}\n\nscanned signature page'
+    assert rendered == [(2, 2)]
+    assert len(ocr_calls) == 1
+
+
+def test_pdf_rasterization_is_windowed_and_bounded(monkeypatch):
+    ocr = load_ocr_module()
+    total_pages = 10
+    state = {'alive': 0, 'peak': 0}
+    windows = []
+
+    class FakePage:
+        def __init__(self, number):
+            self.number = number
+            state['alive'] += 1
+            state['peak'] = max(state['peak'], state['alive'])
+
+        def close(self):
+            state['alive'] -= 1
+
+    def fake_convert(path, dpi=300, first_page=None, last_page=None):
+        windows.append((first_page, last_page))
+        return [FakePage(n) for n in range(first_page, min(last_page, total_pages) + 1)]
+
+    monkeypatch.setenv('OCR_PDF_MAX_IN_FLIGHT_PAGES', '3')
+    monkeypatch.setattr(ocr, 'extract_pdf_text_layer', lambda path: None)
+    monkeypatch.setattr(ocr, 'convert_from_path', fake_convert)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
+    monkeypatch.setattr(ocr, 'get_ocr_provider_chain', lambda: ['tesseract'])
+    monkeypatch.setattr(
+        ocr,
+        'run_ocr_with_fallback',
+        lambda image, lang, providers: (f'page {image.number}', {'provider': 'tesseract', 'quality_score': 0.9}),
+    )
+
+    text = ocr.extract_text_from_pdf('scan.pdf')
+
+    assert text == '\n\n'.join(f'page {n}' for n in range(1, total_pages + 1))
+    assert windows == [(1, 3), (4, 6), (7, 9), (10, 12)]
+    assert state['alive'] == 0
+    assert state['peak'] <= 3
+
+
+def test_process_pool_mode_hands_pages_over_by_path(monkeypatch):
+    ocr = load_ocr_module()
+    from concurrent.futures import ThreadPoolExecutor
+
+    spooled = []
+    seen_sizes = []
+
+    def fake_convert(path, dpi=300, first_page=None, last_page=None, output_folder=None, paths_only=False, fmt=None):
+        assert paths_only and output_folder
+        paths = []
+        for number in range(first_page, min(last_page, 2) + 1):
+            page_path = Path(output_folder) / f'page-{number}.ppm'
+            Image.new('RGB', (12 + number, 10), 'white').save(page_path)
+            paths.append(str(page_path))
+        spooled.extend(paths)
+        return paths
+
+    def fake_run(image, lang, providers):
+        seen_sizes.append(image.size)
+        return f'page width {image.size[0]}', {'provider': 'tesseract', 'quality_score': 0.9}
+
+    stand_in_pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setenv('OCR_EXECUTOR', 'process')
+    monkeypatch.setenv('OCR_PROCESS_POOL_WORKERS', '2')
+    monkeypatch.setattr(ocr, 'get_ocr_process_pool', lambda: stand_in_pool)
+    monkeypatch.setattr(ocr, 'extract_pdf_text_layer', lambda path: None)
+    monkeypatch.setattr(ocr, 'convert_from_path', fake_convert)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
+    monkeypatch.setattr(ocr, 'run_ocr_with_fallback', fake_run)
+    monkeypatch.setattr(ocr, 'get_ocr_provider_chain', lambda: ['tesseract'])
+
+    text = ocr.extract_text_from_pdf('scan.pdf')
+    stand_in_pool.shutdown()
+
+    assert text == 'page width 13\n\npage width 14'
+    assert sorted(seen_sizes) == [(13, 10), (14, 10)]
+    assert spooled and not any(Path(path).exists() for path in spooled)
+
+
+def _text_like_page(width=1240, height=1754):
+    page = Image.new('RGB', (width, height), 'white')
+    for top in range(120, height - 120, 60):
+        for left in range(100, width - 160, 90):
+            page.paste((20, 20, 20), (left, top, left + 70, top + 22))
+    return page
+
+
+def test_layout_check_distinguishes_upright_and_sideways_pages():
+    ocr = load_ocr_module()
+    page = _text_like_page()
+
+    assert ocr.estimate_text_layout(page) == 'upright'
+    assert ocr.estimate_text_layout(page.rotate(90, expand=True)) == 'sideways'
+    assert ocr.estimate_text_layout(Image.new('RGB', (400, 600), 'white')) == 'blank'
+
+
+def test_auto_orient_checks_upside_down_pages_on_a_sample(monkeypatch):
+    ocr = load_ocr_module()
+    osd_calls = []
+    answers = {}
+
+    def fake_osd(image):
+        osd_calls.append(image.size)
+        return answers.get(image.size)
+
+    monkeypatch.setattr(ocr, 'detect_orientation_with_osd', fake_osd)
+    hint = ocr.OrientationHint()
+    upright = _text_like_page()
+    sample_size = ocr._osd_sample(upright).size
+    assert max(sample_size) <= 1024
+
+    # Profiles say "upright" for both 0° and 180°; the sample OSD tells them apart.
+    answers[sample_size] = 180
+    flipped = ocr.auto_orient_image(upright.rotate(180), hint)
+    assert osd_calls == [sample_size]
+    assert flipped.size == upright.size and hint.get() == 180
+
+    # A sample answer that contradicts the line direction falls back to full-page OSD.
+    osd_calls.clear()
+    answers[sample_size] = 90
+    answers[upright.size] = 0
+    assert ocr.auto_orient_image(upright, hint) is upright
+    assert osd_calls == [sample_size, upright.size]
+
+
+def test_inherited_angle_is_only_used_when_the_page_agrees(monkeypatch):
+    ocr = load_ocr_module()
+    monkeypatch.setattr(ocr, 'detect_orientation_with_osd', lambda image: None)
+    hint = ocr.OrientationHint()
+    hint.set(90)
+    upright = _text_like_page()
+    sideways = upright.rotate(-90, expand=True)
+
+    assert ocr.auto_orient_image(upright, hint) is upright
+    assert ocr.auto_orient_image(sideways, hint).size == upright.size
+
+
+def test_adaptive_dpi_rerenders_only_low_quality_pages(monkeypatch):
+    ocr = load_ocr_module()
+    renders = []
+
+    def large_print_page(number, dpi):
+        page = Image.new('RGB', (620, 880), 'white')
+        for top in range(60, 820, 80):
+            page.paste((20, 20, 20), (50, top, 570, top + 40))
+        page.info.update(page_number=number, dpi=dpi)
+        return page
+
+    def fake_convert(path, dpi=300, first_page=None, last_page=None):
+        renders.append((dpi, first_page, last_page))
+        return [large_print_page(n, dpi) for n in range(first_page, min(last_page, 2) + 1)]
+
+    def fake_run(image, lang, providers):
+        # Page 2 is a faint scan that only reads well from 200 DPI upwards.
+        number, dpi = image.info['page_number'], image.info['dpi']
+        quality = 0.2 if number == 2 and dpi < 200 else 0.9
+        return f'page {number} at {dpi}', {'provider': 'tesseract', 'quality_score': quality}
+
+    monkeypatch.setenv('OCR_PDF_DPI_MODE', 'adaptive')
+    monkeypatch.setenv('OCR_PDF_DPI_LADDER', '300,150,200')
+    monkeypatch.setenv('OCR_PDF_MAX_IN_FLIGHT_PAGES', '2')
+    monkeypatch.setattr(ocr, 'extract_pdf_text_layer', lambda path: None)
+    monkeypatch.setattr(ocr, 'convert_from_path', fake_convert)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
+    monkeypatch.setattr(ocr, 'run_ocr_with_fallback', fake_run)
+    monkeypatch.setattr(ocr, 'get_ocr_provider_chain', lambda: ['tesseract'])
+
+    text = ocr.extract_text_from_pdf('scan.pdf')
+
+    assert text == 'page 1 at 150\n\npage 2 at 200'
+    assert {dpi for dpi, _, _ in renders} == {150, 200}
+    assert [render for render in renders if render[0] != 150] == [(200, 2, 2)]
+
+
+def test_adaptive_dpi_starts_higher_for_small_print():
+    ocr = load_ocr_module()
+    plan = ocr.AdaptiveDpiPlan('scan.pdf', 1, [150, 200, 300])
+    small_print = _text_like_page()
+
+    assert ocr.estimate_line_height(small_print) == 22
+    assert plan.choose_initial_dpi(small_print) == 300
+    assert plan.choose_initial_dpi(Image.new('RGB', (400, 600), 'white')) == 150
+    assert plan.next_dpi(200) == 300 and plan.next_dpi(300) is None
+
+
+def test_race_mode_returns_first_acceptable_provider(monkeypatch):
+    ocr = load_ocr_module()
+    import threading
+    import time
+
+    release_vision = threading.Event()
+
+    def slow_vision(image, lang):
+        release_vision.wait(5)
+        return 'vision text', {'provider': 'google_vision', 'status': 'ok', 'reason': 'success', 'error': ''}
+
+    monkeypatch.setenv('OCR_PROVIDER_MODE', 'race')
+    monkeypatch.setattr(ocr, 'verify_google_vision_configuration', lambda: {'ok': True})
+    monkeypatch.setattr(ocr, 'run_google_vision_ocr', slow_vision)
+    monkeypatch.setattr(
+        ocr,
+        'run_tesseract_ocr',
+        lambda image, lang: ('tesseract text', {'provider': 'tesseract', 'status': 'ok', 'reason': 'success', 'error': ''}),
+    )
+    monkeypatch.setattr(ocr, 'calculate_text_quality', lambda text: 0.8)
+
+    started = time.perf_counter()
+    text, meta = ocr.run_ocr_with_fallback(Image.new('L', (10, 10)), 'eng', ['google_vision', 'tesseract'])
+    release_vision.set()
+
+    assert text == 'tesseract text'
+    assert meta['provider'] == 'tesseract'
+    assert meta['race'] == {'tesseract': 'won', 'google_vision': 'abandoned'}
+    assert time.perf_counter() - started < 2
+
+
+def test_race_mode_enforces_provider_deadlines(monkeypatch):
+    ocr = load_ocr_module()
+    import threading
+
+    release_vision = threading.Event()
+
+    def hanging_vision(image, lang):
+        release_vision.wait(5)
+        return 'late', {'provider': 'google_vision', 'status': 'ok', 'reason': 'success', 'error': ''}
+
+    monkeypatch.setenv('OCR_PROVIDER_MODE', 'race')
+    monkeypatch.setenv('OCR_PROVIDER_DEADLINE_GOOGLE_VISION', '0.2')
+    monkeypatch.setattr(ocr, 'verify_google_vision_configuration', lambda: {'ok': True})
+    monkeypatch.setattr(ocr, 'run_google_vision_ocr', hanging_vision)
+    monkeypatch.setattr(
+        ocr,
+        'run_tesseract_ocr',
+        lambda image, lang: ('t3xt', {'provider': 'tesseract', 'status': 'ok', 'reason': 'success', 'error': ''}),
+    )
+    monkeypatch.setattr(ocr, 'calculate_text_quality', lambda text: 0.1)
+
+    text, meta = ocr.run_ocr_with_fallback(Image.new('L', (10, 10)), 'eng', ['google_vision', 'tesseract'])
+    release_vision.set()
+
+    assert text == 't3xt'
+    assert meta['provider'] == 'tesseract'
+    assert meta['race'] == {'tesseract': 'ok', 'google_vision': 'deadline_exceeded'}
+
+
+def test_race_deadline_starts_when_the_provider_runs(monkeypatch):
+    ocr = load_ocr_module()
+    import time
+
+    timeouts = []
+
+    def slow_empty_vision(image, lang):
+        time.sleep(0.4)
+        return '', {'provider': 'google_vision', 'status': 'ok', 'reason': 'empty_text', 'error': ''}
+
+    def fast_tesseract(image, lang):
+        timeouts.append(ocr._call_timeout(40))
+        return 'tesseract text', {'provider': 'tesseract', 'status': 'ok', 'reason': 'success', 'error': ''}
+
+    monkeypatch.setenv('OCR_PROVIDER_MODE', 'race')
+    monkeypatch.setenv('OCR_PROVIDER_RACE_WORKERS', '1')
+    monkeypatch.setenv('OCR_PROVIDER_DEADLINE_TESSERACT', '0.3')
+    monkeypatch.setattr(ocr, 'verify_google_vision_configuration', lambda: {'ok': True})
+    monkeypatch.setattr(ocr, 'run_google_vision_ocr', slow_empty_vision)
+    monkeypatch.setattr(ocr, 'run_tesseract_ocr', fast_tesseract)
+    monkeypatch.setattr(ocr, 'calculate_text_quality', lambda text: 0.8 if text else 0.0)
+
+    text, meta = ocr.run_ocr_with_fallback(Image.new('L', (10, 10)), 'eng', ['google_vision', 'tesseract'])
+
+    # Tesseract waited 0.4 s behind Vision in the single worker, longer than its deadline.
+    assert text == 'tesseract text'
+    assert meta['race'] == {'google_vision': 'ok', 'tesseract': 'won'}
+    assert timeouts == [0.3]
+    assert ocr._call_timeout(40) == 40
+
+
+def test_race_prefers_chain_order_among_calls_finishing_together(monkeypatch):
+    ocr = load_ocr_module()
+    import time
+    from concurrent.futures import ALL_COMPLETED
+
+    real_wait = ocr.wait
+
+    def wait_for_both(futures, timeout=None, return_when=None):
+        # Hand every call to the race loop in one round.
+        return real_wait(futures, timeout=5, return_when=ALL_COMPLETED)
+
+    def slower_vision(image, lang):
+        time.sleep(0.1)
+        return 'vision text', {'provider': 'google_vision', 'status': 'ok', 'reason': 'success', 'error': ''}
+
+    monkeypatch.setenv('OCR_PROVIDER_MODE', 'race')
+    monkeypatch.setattr(ocr, 'wait', wait_for_both)
+    monkeypatch.setattr(ocr, 'verify_google_vision_configuration', lambda: {'ok': True})
+    monkeypatch.setattr(ocr, 'run_google_vision_ocr', slower_vision)
+    monkeypatch.setattr(
+        ocr,
+        'run_tesseract_ocr',
+        lambda image, lang: ('tesseract text', {'provider': 'tesseract', 'status': 'ok', 'reason': 'success', 'error': ''}),
+    )
+    monkeypatch.setattr(ocr, 'calculate_text_quality', lambda text: 0.8)
+
+    text, meta = ocr.run_ocr_with_fallback(Image.new('L', (10, 10)), 'eng', ['google_vision', 'tesseract'])
+
+    assert text == 'vision text'
+    assert meta['race'] == {'google_vision': 'won', 'tesseract': 'ok'}
+
+
+def test_open_circuit_skips_failing_provider_until_probe(monkeypatch):
+    ocr = load_ocr_module()
+    import ocr_health
+
+    vision_calls = []
+
+    def failing_vision(image, lang):
+        vision_calls.append(lang)
+        return '', {'provider': 'google_vision', 'status': 'timeout', 'reason': 'exception', 'error': 'deadline'}
+
+    monkeypatch.setenv('OCR_BREAKER_MIN_CALLS', '3')
+    monkeypatch.setenv('OCR_BREAKER_COOLDOWN_SECONDS', '60')
+    monkeypatch.setattr(ocr_health, '_BREAKERS', {})
+    monkeypatch.setattr(ocr, 'verify_google_vision_configuration', lambda: {'ok': True})
+    monkeypatch.setattr(ocr, 'run_google_vision_ocr', failing_vision)
+    monkeypatch.setattr(
+        ocr,
+        'run_tesseract_ocr',
+        lambda image, lang: ('tesseract text', {'provider': 'tesseract', 'status': 'ok', 'reason': 'success', 'error': ''}),
+    )
+    monkeypatch.setattr(ocr, 'calculate_text_quality', lambda text: 0.8)
+
+    for _ in range(6):
+        text, meta = ocr.run_ocr_with_fallback(Image.new('L', (10, 10)), 'eng', ['google_vision', 'tesseract'])
+        assert meta['provider'] == 'tesseract'
+
+    breaker = ocr_health.get_circuit_breaker('google_vision')
+    assert len(vision_calls) == 3
+    assert breaker.snapshot()['state'] == 'open'
+
+    breaker._opened_at -= 61
+    ocr.run_ocr_with_fallback(Image.new('L', (10, 10)), 'eng', ['google_vision', 'tesseract'])
+    assert len(vision_calls) == 4
+    assert breaker.snapshot()['state'] == 'open'
+    assert breaker.snapshot()['times_opened'] == 2
+
+
+def test_text_quality_report_exposes_signals():
+    ocr = load_ocr_module()
+    text = 'A munkáltató és a munkavállaló megállapodnak.\n#@% e.e.c ~~~ 000\n'
+
+    report = ocr.analyze_text_quality(text, per_line=True)
+
+    assert report['score'] == ocr.calculate_text_quality(text)
+    assert report['chars'] == len(text.strip())
+    assert report['diacritics'] == 6
+    assert report['garbage_hits'] == 4
+    assert [line['line'] for line in report['lines']] == [1, 2]
+    assert report['lines'][0]['score'] > report['lines'][1]['score']
+    assert ocr.analyze_text_quality('   ')['score'] == 0.0
+
+
+def test_extracted_pages_settle_edge_words_before_all_pages_arrive():
+    ocr = load_ocr_module()
+    pages = ocr.ExtractedPages()
+    first_page = ' '.join(f'first{n}' for n in range(20))
+
+    pages.add(3, 'closing words of the contract', None)
+    assert pages.leading_words(15) is None
+
+    pages.add(0, first_page, None)
+    assert pages.leading_words(15) == first_page.split()[:15]
+    assert pages.trailing_words(5) is None
+
+    pages.add(4, '   ', 5)
+    assert pages.trailing_words(5) == 'closing words of the contract'.split()
+
+    pages.add(1, 'middle', 5)
+    pages.add(2, '', 5)
+    text = pages.text()
+    assert text == f'{first_page}\n\nmiddle\n\nclosing words of the contract'
+    assert pages.leading_words(15) == text.split()[:15]
+    assert pages.trailing_words(15) == text.split()[-15:]
+
+
+def test_pdf_pages_stream_in_completion_order(monkeypatch):
+    ocr = load_ocr_module()
+    monkeypatch.setattr(ocr, 'extract_pdf_text_layer', lambda path: ['', 'Digital page text ' * 5, ''])
+    monkeypatch.setattr(
+        ocr,
+        'convert_from_path',
+        lambda path, dpi=300, first_page=None, last_page=None: [
+            Image.new('RGB', (10 + n, 10), 'white') for n in range(first_page, last_page + 1)
+        ],
+    )
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
+    monkeypatch.setattr(ocr, 'get_ocr_provider_chain', lambda: ['tesseract'])
+    monkeypatch.setattr(
+        ocr,
+        'run_ocr_with_fallback',
+        lambda image, lang, providers: (f'scan {image.size[0]}', {'provider': 'tesseract', 'quality_score': 0.9}),
+    )
+
+    streamed = list(ocr.iter_text_from_file('scan.pdf', 'pdf'))
+
+    assert streamed[0] == (1, ('Digital page text ' * 5).strip(), 3)
+    assert sorted(streamed[1:]) == [(0, 'scan 11', 3), (2, 'scan 13', 3)]
+
+
+def test_ocr_space_uploads_shared_page_encoding(monkeypatch):
+    ocr = load_ocr_module()
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    received = []
+
+    class FakeOCRSpace(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append(body)
+            payload = json.dumps({'ParsedResults': [{'ParsedText': 'parsed page'}]}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOCRSpace)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('OCR_SPACE_API_KEY', 'key')
+    monkeypatch.setenv('OCR_SPACE_ENDPOINT', f'http://127.0.0.1:{server.server_port}/parse')
+
+    page = Image.new('L', (64, 64), 255)
+    page.info['bilevel'] = True
+    try:
+        first_text, first_meta = ocr.run_ocr_space_ocr(page, 'hun')
+        second_text, second_meta = ocr.run_ocr_space_ocr(page, 'hun')
+    finally:
+        server.shutdown()
+
+    assert first_text == second_text == 'parsed page'
+    assert first_meta['encode_cached'] is False and second_meta['encode_cached'] is True
+    assert first_meta['upload_bytes'] == second_meta['upload_bytes'] > 0
+    assert b'Content-Type: image/png\r\n\r\n\x89PNG' in received[0]
+    assert received[0].endswith(b'--\r\n') and received[0] == received[1]
+
+
+def test_multi_frame_and_tall_images_are_ocred_page_by_page(tmp_path, monkeypatch):
+    ocr = load_ocr_module()
+    monkeypatch.setenv('OCR_IMAGE_TILE_MAX_SIDE', '1000')
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda img, **kwargs: img)
+    monkeypatch.setattr(ocr, 'get_ocr_provider_chain', lambda: ['tesseract'])
+    monkeypatch.setattr(
+        ocr,
+        'run_ocr_with_fallback',
+        lambda image, lang, providers: (f'page {image.size}', {'provider': 'tesseract', 'quality_score': 0.9}),
+    )
+
+    fax = tmp_path / 'fax.tiff'
+    frames = [Image.new('1', (400, 200 + 10 * n), 1) for n in range(3)]
+    frames[0].save(fax, save_all=True, append_images=frames[1:], dpi=(200, 100))
+    assert ocr.extract_text_from_image(str(fax)) == 'page (400, 400)\n\npage (400, 420)\n\npage (400, 440)'
+
+    receipt = Image.new('L', (300, 2500), 255)
+    for top in range(20, 2500, 40):
+        receipt.paste(0, (20, top, 280, top + 20))
+    receipt.save(tmp_path / 'receipt.png')
+    tiles = sorted(ocr.iter_image_page_texts(str(tmp_path / 'receipt.png')))
+    assert [total for _, _, total in tiles] == [3, 3, 3]
+    heights = [int(text.split(', ')[1].rstrip(')')) for _, text, _ in tiles]
+    assert sum(heights) == 2500 and max(heights) <= 1000
+    # Cuts land in the blank gaps between the 20 px text lines.
+    assert all((cut - 20) % 40 >= 20 for cut in (heights[0], heights[0] + heights[1]))
+
+
+def test_large_jpeg_is_decoded_at_reduced_size(tmp_path, monkeypatch):
+    ocr = load_ocr_module()
+    photo = tmp_path / 'photo.jpg'
+    Image.new('RGB', (6000, 4000), 'white').save(photo, quality=80)
+
+    with Image.open(photo) as image:
+        frame = ocr.load_image_at_useful_resolution(image, 1000)
+        assert image.size == (1500, 1000)  # libjpeg decoded at 1/4 scale via draft
+    assert frame.size == (1500, 1000)
+
+
+def test_vision_configuration_failure_is_rechecked_after_reset(monkeypatch):
+    ocr = load_ocr_module()
+    checks = []
+
+    def verify():
+        checks.append(len(checks))
+        return {'ok': len(checks) > 1, 'error': 'missing credentials'}
+
+    monkeypatch.setattr(ocr, 'verify_google_vision_configuration', verify)
+
+    assert ocr.ensure_google_vision_configuration()['ok'] is False
+    assert ocr.ensure_google_vision_configuration()['ok'] is False
+    ocr.reset_google_vision_configuration()
+    assert ocr.ensure_google_vision_configuration()['ok'] is True
+    assert len(checks) == 2
+
+
+def test_broken_process_pool_is_replaced_mid_document(monkeypatch):
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    ocr = load_ocr_module()
+
+    class DeadPool:
+        def __init__(self):
+            self.broken = False
+
+        def submit(self, fn, *args):
+            if self.broken:
+                raise BrokenProcessPool('a worker died')
+            self.broken = True
+            future = Future()
+            future.set_exception(BrokenProcessPool('a worker died'))
+            return future
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    replacement = ThreadPoolExecutor(max_workers=1)
+    pools = [DeadPool(), replacement]
+    started = []
+
+    def start_pool(max_workers, mp_context):
+        started.append(pools.pop(0))
+        return started[-1]
+
+    monkeypatch.setenv('OCR_EXECUTOR', 'process')
+    monkeypatch.setattr(ocr, 'ProcessPoolExecutor', start_pool)
+    monkeypatch.setattr(ocr, 'preprocess_image', lambda image, orientation_hint=None: image)
+    monkeypatch.setattr(ocr, 'run_cached_ocr', lambda image, lang, providers: ('text', {'quality_score': 0.9}))
+
+    def open_pages(spool_dir, make_room):
+        for number in (1, 2, 3):
+            path = os.path.join(spool_dir, f'{number}.png')
+            Image.new('L', (8, 8), 255).save(path)
+            yield number, path
+
+    pages = sorted(ocr.iter_ocr_page_results(
+        open_pages, 'hun', ['tesseract'], kind='PDF', page_label='3', max_in_flight=3
+    ))
+
+    assert [(index, text) for index, text, _ in pages] == [(0, ''), (1, 'text'), (2, 'text')]
+    assert len(started) == 2
+    assert ocr.get_ocr_process_pool() is replacement
+    replacement.shutdown()
+
+
+def test_process_workers_share_the_document_orientation(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    ocr = load_ocr_module()
+    known_angles = []
+
+    def fake_preprocess(image, orientation_hint=None):
+        known_angles.append(orientation_hint.get())
+        orientation_hint.set(90)
+        return image
+
+    stand_in_pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setenv('OCR_EXECUTOR', 'process')
+    monkeypatch.setattr(ocr, 'get_ocr_process_pool', lambda: stand_in_pool)
+    monkeypatch.setattr(ocr, 'preprocess_image', fake_preprocess)
+    monkeypatch.setattr(ocr, 'run_cached_ocr', lambda image, lang, providers: ('text', {'quality_score': 0.9}))
+
+    def open_pages(spool_dir, make_room):
+        for number in (1, 2):
+            path = os.path.join(spool_dir, f'{number}.png')
+            Image.new('L', (8, 8), 255).save(path)
+            yield number, path
+
+    pages = list(ocr.iter_ocr_page_results(
+        open_pages, 'hun', ['tesseract'], kind='PDF', page_label='2', max_in_flight=1
+    ))
+    stand_in_pool.shutdown()
+
+    assert [index for index, _, _ in pages] == [0, 1]
+    assert known_angles == [None, 90]
@@ -0,0 +1,59 @@
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cms_main  # noqa: E402
+from cms_variables import m11_prompt, m13_prompt, m26_prompt  # noqa: E402
+
+DOCUMENT = "MUNKASZERZŐDÉS\n1. A munkavállaló havi bruttó bére 850 000 Ft. (Mt. 45. §)"
+
+
+def run_analysis(monkeypatch, layout):
+    monkeypatch.setenv("CMS_PROMPT_LAYOUT", layout)
+    requests = []
+    replies = {m11_prompt: "0", m13_prompt: "1. Mt. 45. §\n2. Ptk. 6:1", m26_prompt: "0"}
+
+    async def fake_acreate(model, messages, **kwargs):
+        requests.append(messages)
+        system = [message["content"] for message in messages if message["role"] == "system"][-1]
+        usage = {"prompt_tokens": 2000, "completion_tokens": 50, "prompt_tokens_details": {"cached_tokens": 1024}}
+        return {"choices": [{"message": {"content": replies.get(system, "ok")}}], "usage": usage}
+
+    async def fake_detection(first_words, last_words, **kwargs):
+        return "hu"
+
+    with patch("cms_main.openai.ChatCompletion.acreate", side_effect=fake_acreate), \
+        patch("cms_main.run_language_detection_async", side_effect=fake_detection):
+        result = cms_main.analyze_document(DOCUMENT, "key", store_conversation=False)
+    return requests, result
+
+
+def test_document_first_layout_shares_one_prefix(monkeypatch):
+    requests, result = run_analysis(monkeypatch, "document_first")
+
+    with_document = [messages for messages in requests if any(DOCUMENT in m["content"] for m in messages)]
+    # m11, m12, m13, m21-m25, two m26 calls and m30
+    assert len(with_document) == 11
+    assert all(messages[:2] == with_document[0][:2] for messages in with_document)
+    assert with_document[0][1]["content"] == f"Document: {DOCUMENT}"
+    assert all(DOCUMENT not in "".join(m["content"] for m in messages[2:]) for messages in with_document)
+
+    usage = result["per_stage_token_usage"]
+    assert usage["m26"] == {"calls": 2, "prompt_tokens": 4000, "cached_tokens": 2048, "completion_tokens": 100}
+    assert set(usage) >= {"m11", "m12", "m13", "m21", "m28", "m30", "m50"}
+
+
+def test_prompt_first_layout_is_unchanged(monkeypatch):
+    requests, _ = run_analysis(monkeypatch, "prompt_first")
+
+    assert all(len(messages) == 2 and messages[0]["role"] == "system" for messages in requests)
+    assert [m11_prompt, f"Document: {DOCUMENT}"] in [[m["content"] for m in messages] for messages in requests]
+
+
+def test_layout_is_part_of_pipeline_fingerprint(monkeypatch):
+    monkeypatch.setenv("CMS_PROMPT_LAYOUT", "prompt_first")
+    prompt_first = cms_main.get_pipeline_fingerprint()
+    monkeypatch.setenv("CMS_PROMPT_LAYOUT", "document_first")
+    assert cms_main.get_pipeline_fingerprint() != prompt_first
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cms_main  # noqa: E402
+from cms_variables import m11_prompt, m13_prompt, m26_prompt, m50_prompt  # noqa: E402
+from stage_graph import Stage, critical_path, run_stage_graph, topological_order  # noqa: E402
+
+
+def test_independent_stages_overlap_and_dependencies_wait():
+    order = []
+
+    async def scenario():
+        a_started = asyncio.Event()
+
+        async def run_a():
+            a_started.set()
+            await asyncio.sleep(0.01)
+            order.append("a")
+            return "a"
+
+        async def run_b():
+            # Only finishes if "a" runs at the same time.
+            await asyncio.wait_for(a_started.wait(), timeout=5)
+            order.append("b")
+            return "b"
+
+        async def join(a, b):
+            order.append("join")
+            return a + b
+
+        return await run_stage_graph(
+            [Stage("join", join, ("a", "b")), Stage("b", run_b), Stage("a", run_a)],
+            max_workers=2,
+        )
+
+    outputs = asyncio.run(scenario())
+
+    assert outputs["join"] == "ab"
+    assert order == ["b", "a", "join"]
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="unknown inputs"):
+        topological_order([Stage("a", lambda x: x, ("x",))])
+    with pytest.raises(ValueError, match="cycle"):
+        topological_order([Stage("a", lambda b: b, ("b",)), Stage("b", lambda a: a, ("a",))])
+
+
+def test_failing_stage_cancels_dependents():
+    ran = []
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def record(a):
+        ran.append(a)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(run_stage_graph([Stage("a", fail), Stage("b", record, ("a",))], max_workers=2))
+    assert ran == []
+
+
+def test_critical_path_of_analysis_graph():
+    stages = [Stage(name, None, inputs) for name, inputs in cms_main.ANALYSIS_STAGE_INPUTS.items()]
+    durations = {name: 1.0 for name in cms_main.ANALYSIS_STAGE_INPUTS}
+    length, path = critical_path(stages, durations)
+    assert path == ["m11", "m12", "m21", "m28", "m30", "m31", "m42"]
+    assert length == 7.0
+
+
+def test_analyze_document_runs_m11_and_m13_side_by_side(monkeypatch):
+    m13_started = threading.Event()
+    replies = {m11_prompt: "1", m13_prompt: "1. Ptk. 6:1", m26_prompt: "0", m50_prompt: "összefoglaló"}
+
+    async def fake_acreate(model, messages, **kwargs):
+        system = messages[0]["content"]
+        if system == m13_prompt:
+            m13_started.set()
+        elif system == m11_prompt:
+            # m11 only answers once m13 is in flight too.
+            for _ in range(500):
+                if m13_started.is_set():
+                    break
+                await asyncio.sleep(0.01)
+            assert m13_started.is_set()
+        content = replies.get(system, f"out:{system[:10]}")
+        return {"choices": [{"message": {"content": content}}]}
+
+    async def fake_detection(first_words, last_words, **kwargs):
+        return "hu"
+
+    with patch("cms_main.openai.ChatCompletion.acreate", side_effect=fake_acreate), \
+        patch("cms_main.run_language_detection_async", side_effect=fake_detection):
+        result = cms_main.analyze_document("Szerződés szövege", "key", store_conversation=False)
+
+    assert result["contract_type"] == cms_main.contract_types[1]
+    assert result["detected_language"] == "hu"
+    assert result["summary_doc_language"] == "összefoglaló"
+    stages = {entry["stage"] for entry in result["per_stage_request_times"]}
+    assert {"m10", "m11", "m12", "m13", "m21", "m25", "m26", "m28", "m30", "m43", "m50"} <= stages
+    assert "m27" not in stages
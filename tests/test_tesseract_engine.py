@@ -0,0 +1,94 @@
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import tesseract_engine  # noqa: E402
+
+
+def make_fake_tesserocr():
+    state = {'started': [], 'active': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    class FakeAPI:
+        def __init__(self, lang, oem):
+            state['started'].append((lang, oem))
+            self.lang = lang
+            self.psm = None
+
+        def SetPageSegMode(self, psm):
+            self.psm = psm
+
+        def SetImage(self, image):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            self.image = image
+
+        def GetUTF8Text(self):
+            threading.Event().wait(0.01)
+            with lock:
+                state['active'] -= 1
+            return f'{self.lang} psm={self.psm} width={self.image.size[0]}'
+
+        def DetectOrientationScript(self):
+            with lock:
+                state['active'] -= 1
+            return {'orient_deg': 90, 'orient_conf': 12.0}
+
+        def Clear(self):
+            pass
+
+        def End(self):
+            state['started'].remove((self.lang, 0 if self.lang == 'osd' else 3))
+
+    fake = types.ModuleType('tesserocr')
+    fake.PyTessBaseAPI = FakeAPI
+    fake.PSM = types.SimpleNamespace(OSD_ONLY=0)
+    return fake, state
+
+
+def test_warm_engines_are_reused_across_pages(monkeypatch):
+    fake, state = make_fake_tesserocr()
+    monkeypatch.setattr(tesseract_engine, 'tesserocr', fake)
+    pool = tesseract_engine.TesserocrEnginePool(max_instances=2)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        texts = list(
+            executor.map(
+                lambda width: pool.image_to_string(Image.new('L', (width, 5)), 'hun+eng', '6', '3'),
+                range(10, 22),
+            )
+        )
+
+    assert texts == [f'hun+eng psm=6 width={width}' for width in range(10, 22)]
+    assert state['started'] == [('hun+eng', 3), ('hun+eng', 3)]
+    assert state['peak'] <= 2
+    assert pool.stats()['calls'] == 12
+
+
+def test_osd_engine_replaces_idle_language_engine(monkeypatch):
+    fake, state = make_fake_tesserocr()
+    monkeypatch.setattr(tesseract_engine, 'tesserocr', fake)
+    pool = tesseract_engine.TesserocrEnginePool(max_instances=1)
+
+    pool.image_to_string(Image.new('L', (8, 8)), 'hun+eng', '6', '3')
+    assert pool.detect_rotation(Image.new('L', (8, 8))) == 270
+    assert state['started'] == [('osd', 0)]
+
+
+def test_engine_selection_falls_back_to_cli(monkeypatch):
+    monkeypatch.setattr(tesseract_engine, 'tesserocr', None)
+    monkeypatch.setenv('OCR_TESSERACT_ENGINE', 'tesserocr')
+    tesseract_engine.reset_tesseract_engine()
+    try:
+        assert tesseract_engine.get_tesseract_engine().name == 'cli'
+    finally:
+        tesseract_engine.reset_tesseract_engine()
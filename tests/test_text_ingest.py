@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from text_ingest import iter_text_chunks, normalize_whitespace, sniff_encoding  # noqa: E402
+
+HUNGARIAN = "Árvíztűrő tükörfúrógép – „munkaszerződés” hatálya: 2024. szeptember 1."
+
+
+@pytest.mark.parametrize(
+    'encoding, payload, expected',
+    [
+        ('utf-8', HUNGARIAN.encode('utf-8'), 'utf-8'),
+        ('utf-8-sig', HUNGARIAN.encode('utf-8-sig'), 'utf-8'),
+        ('utf-16', HUNGARIAN.encode('utf-16'), 'utf-16-le'),
+        ('utf-16-be', HUNGARIAN.encode('utf-16-be'), 'utf-16-be'),
+        ('cp1250', HUNGARIAN.encode('cp1250'), 'cp1250'),
+        ('iso-8859-2', HUNGARIAN.replace('–', '-').replace('„', '"').replace('”', '"').encode('iso-8859-2'), 'iso-8859-2'),
+    ],
+)
+def test_hungarian_text_is_decoded_in_its_own_encoding(tmp_path, encoding, payload, expected):
+    path = tmp_path / f'{encoding}.txt'
+    path.write_bytes(payload)
+
+    assert sniff_encoding(payload)[0] == expected
+    text = ''.join(iter_text_chunks(path))
+    assert 'Árvíztűrő tükörfúrógép' in text
+    assert text == text.strip() and '\ufeff' not in text
+
+
+def test_chunked_normalization_matches_single_pass(tmp_path):
+    block = 'Első  sor\t\t vége \r\n\r\n\r\n\r\n   második sor ő\r\n'
+    raw = (block * 40000).encode('utf-8')
+    path = tmp_path / 'large.txt'
+    path.write_bytes(raw)
+
+    chunks = list(iter_text_chunks(path, chunk_bytes=4093, max_bytes=0))
+
+    assert len(chunks) > 10
+    assert ''.join(chunks) == normalize_whitespace(raw.decode('utf-8')).strip()
+    assert ''.join(chunks).startswith('Első sor vége\n\nmásodik sor ő\nElső')
+
+
+def test_oversized_text_file_is_rejected(tmp_path, monkeypatch):
+    path = tmp_path / 'huge.txt'
+    path.write_bytes(b'a' * 2048)
+    monkeypatch.setenv('TXT_MAX_BYTES', '1024')
+
+    with pytest.raises(ValueError, match='1 KB limit'):
+        list(iter_text_chunks(path))
+
+
+def test_legacy_bytes_after_an_ascii_sample_switch_the_encoding(tmp_path):
+    path = tmp_path / 'late.txt'
+    path.write_bytes(b'MUNKASZERZODES\n' + b'a' * 70000 + b'\n' + HUNGARIAN.encode('cp1250'))
+
+    text = ''.join(iter_text_chunks(path, chunk_bytes=4096))
+
+    assert text.endswith(HUNGARIAN)
+    assert '\ufffd' not in text
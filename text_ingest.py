@@ -0,0 +1,141 @@
+"""Chunked plain-text ingestion with encoding sniffing and on-the-fly whitespace cleanup."""
+
+import codecs
+import os
+import re
+
+CHUNK_BYTES = 1024 * 1024
+SAMPLE_BYTES = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+# In ISO-8859-2 0x80-0x9F are C1 control codes; in cp1250 they hold the typographic
+# quotes and dashes (e.g. „ ” –) that Windows editors put into Hungarian text.
+_CP1250_ONLY = re.compile(rb'[\x80-\x9f]')
+
+_HORIZONTAL_SPACE = re.compile(r'[ \t\f\v\u00a0\u2000-\u200a\u202f\u205f\u3000]+')
+_LINE_EDGE_SPACE = re.compile(r' *\n *')
+_BLANK_LINES = re.compile(r'\n{3,}')
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0e-\x1f\x7f\ufeff]')
+
+
+def get_txt_max_bytes():
+    return int(os.environ.get('TXT_MAX_BYTES', str(20 * 1024 * 1024)))
+
+
+def sniff_encoding(sample):
+    """
+    Return ``(encoding, bom_length)`` for the first bytes of a text file.
+
+    A byte-order mark wins; otherwise UTF-16 without a BOM is recognised by its NUL
+    bytes, valid UTF-8 is taken as UTF-8, and any other 8-bit text is read as cp1250
+    when it uses the Windows-only 0x80-0x9F range and as ISO-8859-2 when it does not.
+    Both cover the Hungarian ő/ű that latin-1 would turn into õ/û.
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+
+    if sample:
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        half = max(len(sample) // 2, 1)
+        if odd_nuls > half * 0.3 and even_nuls < half * 0.05:
+            return 'utf-16-le', 0
+        if even_nuls > half * 0.3 and odd_nuls < half * 0.05:
+            return 'utf-16-be', 0
+
+    try:
+        # final=False tolerates a multi-byte sequence cut off at the end of the sample.
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8', 0
+    except UnicodeDecodeError:
+        pass
+    if _CP1250_ONLY.search(sample):
+        return 'cp1250', 0
+    return 'iso-8859-2', 0
+
+
+def _legacy_encoding(file):
+    """cp1250 when any byte of the file is in the Windows-only range, else ISO-8859-2."""
+    file.seek(0)
+    while True:
+        raw = file.read(CHUNK_BYTES)
+        if not raw:
+            return 'iso-8859-2'
+        if _CP1250_ONLY.search(raw):
+            return 'cp1250'
+
+
+def _format_size(size):
+    for unit, scale in (('MB', 1024 * 1024), ('KB', 1024)):
+        if size >= scale:
+            return f"{size / scale:.1f}".rstrip('0').rstrip('.') + f" {unit}"
+    return f"{size} bytes"
+
+
+def normalize_whitespace(text):
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = _CONTROL_CHARS.sub('', text)
+    text = _HORIZONTAL_SPACE.sub(' ', text)
+    text = _LINE_EDGE_SPACE.sub('\n', text)
+    return _BLANK_LINES.sub('\n\n', text)
+
+
+def _decoded_chunks(file, encoding, start, chunk_bytes, errors='replace'):
+    file.seek(start)
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    pending = ''
+    started = False
+    raw = file.read(chunk_bytes)
+    while True:
+        final = not raw
+        text = pending + decoder.decode(raw, final=final)
+        cut = len(text.rstrip()) if final or text[-1:].isspace() else len(text)
+        emit, pending = text[:cut], text[cut:]
+        if not started:
+            emit = emit.lstrip()
+            started = bool(emit)
+        if emit:
+            yield normalize_whitespace(emit)
+        if final:
+            return
+        raw = file.read(chunk_bytes)
+
+
+def iter_text_chunks(file_path, chunk_bytes=CHUNK_BYTES, max_bytes=None):
+    """
+    Yield normalized text from ``file_path`` chunk by chunk.
+
+    The file is decoded once with an incremental decoder for the sniffed encoding.
+    When only the 64 KB sample was seen to be UTF-8, the decode is strict and its
+    chunks are held back until the end of the file: legal texts often open with a
+    plain-ASCII header, so an invalid byte further on means a cp1250 or ISO-8859-2
+    file, which is then decoded again from the start. Only those files pay for a
+    second pass. Trailing whitespace of each chunk is held back until the next one
+    arrives, so whitespace runs that straddle a chunk boundary collapse exactly as
+    they would in one pass. Files larger than ``max_bytes`` (``TXT_MAX_BYTES``,
+    default 20 MB) are rejected with ``ValueError``.
+    """
+    max_bytes = get_txt_max_bytes() if max_bytes is None else max_bytes
+    file_size = os.path.getsize(file_path)
+    if max_bytes and file_size > max_bytes:
+        raise ValueError(f"Text file exceeds the {_format_size(max_bytes)} limit")
+
+    with open(file_path, 'rb') as file:
+        encoding, bom_length = sniff_encoding(file.read(SAMPLE_BYTES))
+        if encoding == 'utf-8' and not bom_length and file_size > SAMPLE_BYTES:
+            try:
+                chunks = list(_decoded_chunks(file, 'utf-8', 0, chunk_bytes, errors='strict'))
+            except UnicodeDecodeError:
+                encoding = _legacy_encoding(file)
+            else:
+                yield from chunks
+                return
+        yield from _decoded_chunks(file, encoding, bom_length, chunk_bytes)